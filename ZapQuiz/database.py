@@ -0,0 +1,74 @@
+"""Database profiles selected from the environment (used by settings.DATABASES).
+
+``ZAPQUIZ_DB=sqlite`` (default)
+    One file (``ZAPQUIZ_SQLITE_PATH``, default ``db.sqlite3``) tuned for many
+    concurrent writers: WAL journal so readers never wait for a writer,
+    ``synchronous=NORMAL`` (safe with WAL, fsyncs only at checkpoints), a busy
+    timeout so writers queue instead of failing with "database is locked",
+    memory-mapped reads and ``BEGIN IMMEDIATE`` transactions, which take the
+    write lock up front instead of failing when a read turns into a write.
+
+``ZAPQUIZ_DB=postgres``
+    ``ZAPQUIZ_PG_NAME``/``_USER``/``_PASSWORD``/``_HOST``/``_PORT``. With
+    ``ZAPQUIZ_PG_POOL=<size>`` connections come from psycopg's pool (needs
+    ``psycopg[pool]``); otherwise each worker thread keeps its connection for
+    ``ZAPQUIZ_DB_CONN_MAX_AGE`` seconds.
+"""
+import os
+
+
+def _int(env, name, default):
+    value = env.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def sqlite_config(env, base_dir):
+    timeout = _int(env, 'ZAPQUIZ_SQLITE_TIMEOUT', 20)
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={timeout * 1000}',
+        f"PRAGMA mmap_size={_int(env, 'ZAPQUIZ_SQLITE_MMAP', 256 * 1024 * 1024)}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('ZAPQUIZ_SQLITE_PATH') or base_dir / 'db.sqlite3',
+        'CONN_MAX_AGE': _int(env, 'ZAPQUIZ_DB_CONN_MAX_AGE', 60),
+        'OPTIONS': {
+            'timeout': timeout,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': '; '.join(pragmas),
+        },
+    }
+
+
+def postgres_config(env):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('ZAPQUIZ_PG_NAME', 'zapquiz'),
+        'USER': env.get('ZAPQUIZ_PG_USER', 'zapquiz'),
+        'PASSWORD': env.get('ZAPQUIZ_PG_PASSWORD', ''),
+        'HOST': env.get('ZAPQUIZ_PG_HOST', 'localhost'),
+        'PORT': env.get('ZAPQUIZ_PG_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    pool_size = _int(env, 'ZAPQUIZ_PG_POOL', 0)
+    if pool_size:
+        # Django refuses persistent connections together with a pool
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {'min_size': min(2, pool_size), 'max_size': pool_size, 'timeout': 10}
+    else:
+        config['CONN_MAX_AGE'] = _int(env, 'ZAPQUIZ_DB_CONN_MAX_AGE', 60)
+    return config
+
+
+def database_config(base_dir, env=None):
+    env = os.environ if env is None else env
+    profile = env.get('ZAPQUIZ_DB', 'sqlite')
+    if profile == 'sqlite':
+        return sqlite_config(env, base_dir)
+    if profile in ('postgres', 'postgresql'):
+        return postgres_config(env)
+    raise ValueError(f'Unknown ZAPQUIZ_DB profile: {profile!r}')
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.middleware.QueryProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +62,8 @@ ROOT_URLCONF = 'ZapQuiz.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also times renders for QUERY_PROFILING (users/middleware.py)
+        'BACKEND': 'users.middleware.ProfilingTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,13 +82,86 @@ WSGI_APPLICATION = 'ZapQuiz.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Chosen with ZAPQUIZ_DB=sqlite|postgres, see ZapQuiz/database.py
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMem is per process; point this at a file or Redis cache when running
+# several workers so they share compiled quizzes.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'zapquiz',
     }
 }
 
+# How long a compiled quiz (see quiz/compiled.py) stays cached, in seconds.
+# Edits invalidate it immediately, this only bounds memory for idle quizzes.
+COMPILED_QUIZ_CACHE_TIMEOUT = 60 * 60
+
+# Quiz catalogue pages (quiz/catalogue.py). Edits invalidate them right away;
+# the timeout only bounds how stale the player counts get.
+QUIZ_CATALOGUE_CACHE_TIMEOUT = 30
+
+# Join-code lookups (quiz/codes.py): a process-local LRU in front of the cache.
+# Local entries are trusted for JOIN_CODE_LOCAL_TTL seconds, which bounds how
+# long another worker may still see a changed code; unknown codes are
+# remembered for JOIN_CODE_NEGATIVE_TIMEOUT seconds.
+JOIN_CODE_CACHE = True
+JOIN_CODE_LRU_SIZE = 10000
+JOIN_CODE_LOCAL_TTL = 5
+JOIN_CODE_CACHE_TIMEOUT = 60 * 60
+JOIN_CODE_NEGATIVE_TIMEOUT = 30
+# New codes are reserved JOIN_CODE_BLOCK at a time per process; lobby codes of
+# closed games are reused after JOIN_CODE_RECYCLE_AFTER seconds.
+JOIN_CODE_BLOCK = 100
+JOIN_CODE_RECYCLE_AFTER = 24 * 60 * 60
+
+# Pub/sub used to push hosted lobby events over websockets (see quiz/realtime.py).
+# The in-memory broker only reaches clients of the same process; use
+# 'quiz.realtime.RedisBroker' with LOBBY_BROKER_OPTIONS = {'url': 'redis://...'}
+# when running several workers.
+LOBBY_BROKER = 'quiz.realtime.InMemoryBroker'
+LOBBY_BROKER_OPTIONS = {}
+
+# Hosted game rounds (quiz/rounds.py): seconds per question when the quiz has
+# no time limit, how late an answer may arrive after the deadline, and how many
+# running games each process keeps the last seen round of.
+HOSTED_ROUND_SECONDS = 20
+HOSTED_ROUND_GRACE = 1.0
+HOSTED_ROUND_LRU_SIZE = 1000
+# The host's live dashboard (quiz/dashboard.py) gets at most one update per
+# DASHBOARD_PUSH_INTERVAL seconds, however many players answer meanwhile.
+DASHBOARD_PUSH_INTERVAL = 0.5
+
+# Write-behind buffer for answer submissions (results/ingest.py). Answers are
+# acknowledged at once and written in batches of ANSWER_BUFFER_BATCH or every
+# ANSWER_BUFFER_DELAY seconds; the journal makes them survive a crash.
+ANSWER_BUFFER = os.environ.get('ZAPQUIZ_ANSWER_BUFFER') == '1'
+ANSWER_BUFFER_BATCH = 200
+ANSWER_BUFFER_DELAY = 0.2
+ANSWER_BUFFER_JOURNAL_DIR = BASE_DIR / 'var' / 'answer-journal'
+ANSWER_BUFFER_FSYNC = False
+
+# Column files of exported answers for the quiz stats page (results/analytics.py,
+# `manage.py export_analytics`). Needs NumPy.
+ANALYTICS_DIR = BASE_DIR / 'var' / 'analytics'
+# Rows younger than this many seconds wait for the next export, so one whose
+# transaction is still open can't be skipped (see results/analytics.py).
+ANALYTICS_EXPORT_LAG = 60
+
+# Per-view query/latency profiling (users/middleware.py, users/profiling.py).
+# Off unless ZAPQUIZ_QUERY_PROFILING=1; cheap enough to leave on in production.
+# Reports: /users/profiling/ (staff) and `manage.py query_report`.
+QUERY_PROFILING = os.environ.get('ZAPQUIZ_QUERY_PROFILING') == '1'
+QUERY_PROFILING_BUFFER = 1000
+QUERY_PROFILING_FLUSH_EVERY = 100
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,6 +203,13 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Responsive copies of question/answer images (quiz/images.py): widths written
+# as WebP and JPEG, the cap applied to the largest copy, and the threads that
+# build them after upload (0 builds them inline, e.g. in tests).
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_MAX_DIMENSION = 1920
+IMAGE_VARIANT_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
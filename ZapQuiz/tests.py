@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from .database import database_config
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_profile_is_tuned_for_concurrent_writers(self):
+        config = database_config(Path('/srv'), env={'ZAPQUIZ_SQLITE_TIMEOUT': '5'})
+        self.assertEqual(config['NAME'], Path('/srv/db.sqlite3'))
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=5000', config['OPTIONS']['init_command'])
+
+    def test_postgres_pool_replaces_persistent_connections(self):
+        config = database_config(Path('/srv'), env={'ZAPQUIZ_DB': 'postgres', 'ZAPQUIZ_PG_POOL': '20'})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+        config = database_config(Path('/srv'), env={'ZAPQUIZ_DB': 'postgres'})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertNotIn('pool', config['OPTIONS'])
+        with self.assertRaises(ValueError):
+            database_config(Path('/srv'), env={'ZAPQUIZ_DB': 'mysql'})
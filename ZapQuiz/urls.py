@@ -15,14 +15,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from quiz.views import media_blob
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('quiz.urls')),
     path('users/', include('users.urls')),
+    # content-addressed files never change, so they're served with immutable
+    # cache headers (quiz/storage.py). Images only, with nosniff; a front-end
+    # server serving /media/ in production should send the same headers.
+    re_path(r'^%s(?P<path>(?:blobs|questions/variants|answers/variants)/.+)$' % settings.MEDIA_URL.lstrip('/'), media_blob),
 ]
 
 if settings.DEBUG:
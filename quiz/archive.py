@@ -0,0 +1,371 @@
+"""Streaming quiz archives used by the export/import commands and views.
+
+An archive is a gzip-compressed tar stream::
+
+    manifest.json                 {"format": "zapquiz", "version": 1}
+    blobs/<sha256><ext>           image data, each distinct file stored once
+    quizzes/000001.json           one quiz with its questions and answers
+    ...
+
+Blobs are written before the first quiz that references them, so both
+directions work on a stream: export is a generator of byte chunks and import
+reads the archive front to back. Neither side holds more than one quiz (and one
+image) in memory at a time, whatever the archive size.
+"""
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models.functions import Upper
+from PIL import Image
+
+from .catalogue import invalidate_catalogue
+from .codes import invalidate as invalidate_codes
+from .forms import IMAGE_EXTENSIONS, MAX_IMAGE_SIZE
+from .images import schedule_variants
+from .storage import blob_name, blob_storage
+from .models import Quiz, Question, Answer
+
+
+FORMAT = 'zapquiz'
+VERSION = 1
+CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class _ChunkBuffer:
+    """Write-only file object collecting what tarfile writes until it's drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _file_sha256(field_file):
+    digest = hashlib.sha256()
+    with field_file.open('rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, BytesIO(data))
+
+
+def _quiz_record(quiz):
+    return {
+        'title': quiz.title,
+        'description': quiz.description,
+        'code': quiz.code,
+        'access_type': quiz.access_type,
+        'is_active': quiz.is_active,
+        'time_limit': quiz.time_limit.total_seconds() if quiz.time_limit is not None else None,
+        'scoring_mode': quiz.scoring_mode,
+        'creator': quiz.creator.username if quiz.creator else None,
+        'questions': [],
+    }
+
+
+def _text(record, key, optional=False):
+    value = record.get(key)
+    if optional and value is None:
+        return None
+    if not isinstance(value, str) or not (optional or value):
+        raise ArchiveError(f'Bad {key} in quiz record')
+    return value
+
+
+def _list_of_records(record, key):
+    value = record.get(key)
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise ArchiveError(f'Bad {key} in quiz record')
+    return value
+
+
+def _clean_record(record):
+    """Check a quiz record read from an archive and return it in the form `_Importer.flush` expects.
+
+    Records come from uploaded files, so anything off raises ArchiveError
+    instead of failing halfway through the insert.
+    """
+    if not isinstance(record, dict):
+        raise ArchiveError('Bad quiz record')
+    time_limit = record.get('time_limit')
+    if time_limit is not None:
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or time_limit < 0:
+            raise ArchiveError('Bad time_limit in quiz record')
+    access_type = record.get('access_type', 'open')
+    if access_type not in dict(Quiz.ACCESS_CHOICES):
+        raise ArchiveError('Bad access_type in quiz record')
+    scoring_mode = record.get('scoring_mode', 'flat')
+    if scoring_mode not in dict(Quiz.SCORING_CHOICES):
+        raise ArchiveError('Bad scoring_mode in quiz record')
+    questions = []
+    for question in _list_of_records(record, 'questions'):
+        order = question.get('order')
+        if isinstance(order, bool) or not isinstance(order, int) or order < 0:
+            raise ArchiveError('Bad order in quiz record')
+        questions.append({
+            'text': _text(question, 'text'),
+            'order': order,
+            'image': _text(question, 'image', optional=True),
+            'answers': [
+                {
+                    'text': _text(answer, 'text'),
+                    'is_correct': bool(answer.get('is_correct', False)),
+                    'image': _text(answer, 'image', optional=True),
+                }
+                for answer in _list_of_records(question, 'answers')
+            ],
+        })
+    return {
+        'title': _text(record, 'title'),
+        'description': _text(record, 'description', optional=True) or '',
+        'code': _text(record, 'code', optional=True),
+        'access_type': access_type,
+        'is_active': bool(record.get('is_active', True)),
+        'time_limit': time_limit,
+        'scoring_mode': scoring_mode,
+        'creator': _text(record, 'creator', optional=True),
+        'questions': questions,
+    }
+
+
+def iter_archive(quizzes):
+    """Yield the archive for `quizzes` (a queryset) as byte chunks."""
+    buffer = _ChunkBuffer()
+    tar = tarfile.open(fileobj=buffer, mode='w|gz')
+    _add_bytes(tar, 'manifest.json', json.dumps({'format': FORMAT, 'version': VERSION}).encode())
+    yield buffer.drain()
+
+    written = set()
+
+    def blob(field_file):
+        """Add `field_file` to the archive once; return its archive name."""
+        if not field_file:
+            return None
+        name = _file_sha256(field_file) + os.path.splitext(field_file.name)[1].lower()
+        if name not in written:
+            info = tarfile.TarInfo(f'blobs/{name}')
+            info.size = field_file.size
+            info.mtime = int(time.time())
+            with field_file.open('rb') as fh:
+                tar.addfile(info, fh)
+            written.add(name)
+        return name
+
+    quizzes = quizzes.select_related('creator').prefetch_related('questions__answers').order_by('id')
+    for number, quiz in enumerate(quizzes.iterator(chunk_size=100), start=1):
+        record = _quiz_record(quiz)
+        for question in quiz.questions.all():
+            record['questions'].append({
+                'text': question.text,
+                'order': question.order,
+                'image': blob(question.image),
+                'answers': [
+                    {'text': a.text, 'is_correct': a.is_correct, 'image': blob(a.image)}
+                    for a in question.answers.all()
+                ],
+            })
+            yield buffer.drain()
+        _add_bytes(tar, f'quizzes/{number:06d}.json', json.dumps(record, ensure_ascii=False).encode())
+        yield buffer.drain()
+
+    tar.close()
+    yield buffer.drain()
+
+
+def write_archive(quizzes, fileobj):
+    for chunk in iter_archive(quizzes):
+        if chunk:
+            fileobj.write(chunk)
+
+
+class _Importer:
+    def __init__(self, creator=None, keep_authors=True, batch_size=200):
+        self.default_creator = creator
+        self.keep_authors = keep_authors
+        self.batch_size = batch_size
+        self.blobs = {}
+        self.pending = []
+        self.stats = {'quizzes': 0, 'questions': 0, 'answers': 0, 'blobs_written': 0, 'blobs_reused': 0, 'codes_dropped': 0}
+
+    def add_blob(self, name, fileobj, size=None):
+        sha, ext = os.path.splitext(name)
+        # archives come from anybody who can log in: only the images an upload
+        # could be, or the media URL would serve whatever else they contain
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            raise ArchiveError(f'Not an image in archive: {name}')
+        if size is not None and size > MAX_IMAGE_SIZE:
+            raise ArchiveError(f'Image too large in archive: {name}')
+        digest = hashlib.sha256()
+        with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 4) as data:
+            read = 0
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                read += len(chunk)
+                if read > MAX_IMAGE_SIZE:
+                    raise ArchiveError(f'Image too large in archive: {name}')
+                digest.update(chunk)
+                data.write(chunk)
+            if digest.hexdigest() != sha:
+                raise ArchiveError(f'Corrupt image in archive: {name}')
+            data.seek(0)
+            try:
+                with Image.open(data) as image:
+                    image.verify()
+            except Exception:
+                raise ArchiveError(f'Not an image in archive: {name}')
+            # the same content always maps to the same file, so repeated imports
+            # (and uploads of the same picture) share it
+            path = blob_name(sha, ext)
+            if blob_storage.exists(path):
+                self.stats['blobs_reused'] += 1
+            else:
+                data.seek(0)
+                path = blob_storage.save(path, File(data))
+                self.stats['blobs_written'] += 1
+        self.blobs[name] = path
+
+    def add_quiz(self, record):
+        self.pending.append(_clean_record(record))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def image(self, name):
+        if not name:
+            return None
+        try:
+            return self.blobs[name]
+        except KeyError:
+            raise ArchiveError(f'Missing image in archive: {name}')
+
+    def flush(self):
+        if not self.pending:
+            return
+        records, self.pending = self.pending, []
+
+        # one query each for code clashes and creators of the whole batch
+        codes = [r['code'].upper() for r in records if r.get('code')]
+        taken = set(
+            Quiz.objects.alias(code_upper=Upper('code')).filter(code_upper__in=codes)
+            .values_list(Upper('code'), flat=True)
+        )
+        users = {}
+        if self.keep_authors:
+            usernames = {r['creator'] for r in records if r.get('creator')}
+            users = {u.username: u for u in User.objects.filter(username__in=usernames)}
+
+        quizzes = []
+        for record in records:
+            code = record.get('code')
+            if code and code.upper() in taken:
+                self.stats['codes_dropped'] += 1
+                code = None
+            if code:
+                taken.add(code.upper())
+            time_limit = record.get('time_limit')
+            quizzes.append(Quiz(
+                title=record['title'],
+                title_key=record['title'].lower(),  # bulk_create skips save()
+                description=record.get('description', ''),
+                code=code,
+                access_type=record.get('access_type', 'open'),
+                is_active=record.get('is_active', True),
+                time_limit=timedelta(seconds=time_limit) if time_limit is not None else None,
+                scoring_mode=record.get('scoring_mode', 'flat'),
+                creator=users.get(record.get('creator')) or self.default_creator,
+            ))
+
+        with transaction.atomic():
+            quizzes = Quiz.objects.bulk_create(quizzes)
+            questions = Question.objects.bulk_create([
+                Question(quiz=quiz, text=q['text'], order=q['order'], image=self.image(q.get('image')))
+                for quiz, record in zip(quizzes, records)
+                for q in record['questions']
+            ])
+            all_questions = (q for record in records for q in record['questions'])
+            answers = Answer.objects.bulk_create([
+                Answer(question=question, text=a['text'], is_correct=a.get('is_correct', False), image=self.image(a.get('image')))
+                for question, q in zip(questions, all_questions)
+                for a in q['answers']
+            ])
+            # bulk_create sends no signals
+            transaction.on_commit(invalidate_catalogue)
+            new_codes = [quiz.code for quiz in quizzes if quiz.code]
+            if new_codes:
+                # they may be remembered as unknown
+                invalidate_codes('quiz', *new_codes)
+                transaction.on_commit(lambda: invalidate_codes('quiz', *new_codes))
+            for question in questions:
+                if question.image:
+                    schedule_variants(Question, question.id)
+            for answer in answers:
+                if answer.image:
+                    schedule_variants(Answer, answer.id)
+
+        self.stats['quizzes'] += len(quizzes)
+        self.stats['questions'] += len(questions)
+        self.stats['answers'] += len(answers)
+
+
+def import_archive(fileobj, creator=None, keep_authors=True, batch_size=200):
+    """Import every quiz in the archive read from `fileobj`.
+
+    Quizzes are inserted in bulk, `batch_size` at a time. With `keep_authors`
+    quiz authors are matched by username, otherwise (and when there is no such
+    user) quizzes belong to `creator`. Join codes already in use are dropped.
+    Returns counters describing what was imported.
+    """
+    importer = _Importer(creator=creator, keep_authors=keep_authors, batch_size=batch_size)
+    try:
+        tar = tarfile.open(fileobj=fileobj, mode='r|gz')
+    except tarfile.TarError:
+        raise ArchiveError('Not a quiz archive')
+    with tar:
+        seen_manifest = False
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                data = tar.extractfile(member)
+                if member.name == 'manifest.json':
+                    manifest = json.load(data)
+                    if not isinstance(manifest, dict) or manifest.get('format') != FORMAT or manifest.get('version') != VERSION:
+                        raise ArchiveError('Unsupported archive version')
+                    seen_manifest = True
+                elif not seen_manifest:
+                    raise ArchiveError('Not a quiz archive')
+                elif member.name.startswith('blobs/'):
+                    importer.add_blob(member.name[len('blobs/'):], data, member.size)
+                elif member.name.startswith('quizzes/'):
+                    importer.add_quiz(json.load(data))
+            importer.flush()
+        except (tarfile.TarError, EOFError, ValueError, KeyError) as e:
+            raise ArchiveError(f'Broken quiz archive: {e}')
+    return importer.stats
@@ -0,0 +1,130 @@
+"""Small helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the real database: they run inside `isolated_database`,
+which creates (and afterwards drops) a migrated test database the same way
+``manage.py test`` does.
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+
+@contextmanager
+def isolated_database(verbosity=0, on_disk=False):
+    """Run the block against a fresh test database.
+
+    SQLite test databases live in memory, where concurrent writers fail at once
+    instead of waiting; pass ``on_disk=True`` for benchmarks and tests that use
+    threads.
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_name = test_settings.get('NAME')
+    tmpdir = None
+    outer = None
+    if on_disk and connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='zapquiz-bench-db-')
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+        if connection.is_in_memory_db():
+            # inside the test suite: Django never closes an in-memory connection
+            # (that would drop its database), so this thread gets a new one for
+            # the file and the suite's gets back afterwards
+            outer = connections[DEFAULT_DB_ALIAS]
+            connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        # the test client talks to "testserver"
+        with override_settings(ALLOWED_HOSTS=['testserver', 'localhost', '127.0.0.1']):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        if tmpdir is not None:
+            test_settings['NAME'] = old_name
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        if outer is not None:
+            connections[DEFAULT_DB_ALIAS] = outer
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements run inside the block (``counter.count``)."""
+    counter = _QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def run_concurrently(func, jobs, threads):
+    """Call `func(job)` for every job from `threads` threads released at the same moment.
+
+    `func` returns truthy on success. Returns ``(seconds per call, failed calls)``;
+    exceptions count as failures. Every thread closes its DB connection at the end.
+    """
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    gate = threading.Barrier(threads)
+
+    def worker(share):
+        mine, failed = [], 0
+        gate.wait()
+        try:
+            for job in share:
+                start = time.perf_counter()
+                try:
+                    ok = func(job)
+                except Exception:
+                    ok = False
+                mine.append(time.perf_counter() - start)
+                failed += not ok
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(mine)
+            failures.append(failed)
+
+    workers = [threading.Thread(target=worker, args=(jobs[i::threads],)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, sum(failures)
+
+
+def timed(func, *args, **kwargs):
+    """Run `func` once and return ``(seconds, result)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(seconds):
+    """Median/p95/max of a list of durations, in milliseconds."""
+    return {
+        'median_ms': statistics.median(seconds) * 1000 if seconds else 0.0,
+        'p95_ms': percentile(seconds, 95) * 1000,
+        'max_ms': max(seconds) * 1000 if seconds else 0.0,
+    }
@@ -0,0 +1,83 @@
+"""The public quiz catalogue shown by `QuizListView`.
+
+A page is one query: active quizzes newest first, with question and player
+counts as correlated subqueries, keyset-paginated on the id (``?before=<id>``)
+so deep pages cost the same as the first (``quiz_catalogue`` index). Title
+search is a prefix range over the indexed ``title_key``, author search an exact
+username match.
+
+Pages are cached for `QUIZ_CATALOGUE_CACHE_TIMEOUT` seconds under a global
+version that `quiz.signals` bumps whenever a quiz or question changes; player
+counts only refresh when the entry expires.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from results.models import QuizSession
+from .models import Quiz, Question
+
+
+PAGE_SIZE = 24
+VERSION_KEY = 'quiz-catalogue:version'
+PAGE_KEY = 'quiz-catalogue:v{version}:{query}:{author}:{before}:{size}'
+FIELDS = ('id', 'title', 'description', 'code', 'time_limit', 'creator__username')
+
+
+def _count(queryset):
+    return Coalesce(
+        Subquery(queryset.order_by().values('quiz').annotate(n=Count('id')).values('n'), output_field=IntegerField()),
+        Value(0),
+    )
+
+
+def query_page(query='', author='', before=None, size=PAGE_SIZE):
+    """Return ``(rows, next_before)`` straight from the database.
+
+    Rows are dicts with `FIELDS` plus ``question_count`` and ``player_count``;
+    `next_before` is the cursor of the following page or None on the last one.
+    """
+    quizzes = Quiz.objects.filter(is_active=True)
+    if query:
+        # a range instead of LIKE, which can't use the index
+        prefix = query.lower()
+        quizzes = quizzes.filter(title_key__gte=prefix, title_key__lt=prefix + '\uffff')
+    if author:
+        quizzes = quizzes.filter(creator__username=author)
+    if before is not None:
+        quizzes = quizzes.filter(id__lt=before)
+    rows = list(
+        quizzes.annotate(
+            question_count=_count(Question.objects.filter(quiz=OuterRef('pk'))),
+            player_count=_count(QuizSession.objects.filter(quiz=OuterRef('pk'))),
+        )
+        .values(*FIELDS, 'question_count', 'player_count')
+        .order_by('-id')[:size + 1]
+    )
+    next_before = rows[size - 1]['id'] if len(rows) > size else None
+    return rows[:size], next_before
+
+
+def get_page(query='', author='', before=None, size=PAGE_SIZE):
+    """Cached `query_page`."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    key = PAGE_KEY.format(version=version, query=query.lower().encode('utf-8').hex(), author=author.encode('utf-8').hex(), before=before, size=size)
+    page = cache.get(key)
+    if page is None:
+        page = query_page(query, author, before, size)
+        cache.set(key, page, timeout=settings.QUIZ_CATALOGUE_CACHE_TIMEOUT)
+    return page
+
+
+def invalidate_catalogue():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
@@ -0,0 +1,294 @@
+"""Join codes: looking them up for `JoinView` (quiz codes) and `join_hosted`
+(lobby codes), and handing out new ones.
+
+Lookups
+-------
+
+A code is normalized (stripped, upper-cased) and resolved to an id through two
+layers:
+
+* a process-local LRU of `JOIN_CODE_LRU_SIZE` entries, each trusted for
+  `JOIN_CODE_LOCAL_TTL` seconds, so a burst of players typing the same code
+  doesn't even reach the cache;
+* Django's cache, shared by all workers, under ``join-code:<kind>:<CODE>``.
+
+Only a miss in both asks the database. Codes that don't exist are remembered
+too (for `JOIN_CODE_NEGATIVE_TIMEOUT` seconds), so a mistyped code costs at
+most one query per process and interval. `quiz.signals` drops the old and the
+new code of every quiz or hosted game that changes, once the change is
+committed; other processes see it when their local entry expires.
+
+Allocation
+----------
+
+New codes come from a shared counter (`CodeSequence`). Every number maps to a
+different 6-character code through a keyed permutation (a Feistel network
+walked until it lands in the code space), so codes never repeat and still
+look random. Each process reserves `JOIN_CODE_BLOCK` numbers with one short
+transaction and hands them out from memory: `allocate` makes no query at all
+most of the time. Lobby codes of closed or finished games are given back
+(`retire`) and handed out again once they've rested for
+`JOIN_CODE_RECYCLE_AFTER` seconds.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.utils import timezone
+from django.utils.http import int_to_base36
+
+from .models import Quiz, HostedGame, CodeSequence, RecycledCode
+
+
+CACHE_KEY = 'join-code:{kind}:{code}'
+# stored for codes that don't exist, ids are never 0
+MISSING = 0
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+SEQUENCE = 'join-codes'
+# run codes of retired games, can't be typed in as a code that resolves
+RETIRED_PREFIX = '~'
+
+
+def _quiz_id(code):
+    return Quiz.objects.alias(code_upper=Upper('code')).filter(code_upper=code, is_active=True).values_list('id', flat=True).first()
+
+
+def _hosted_id(code):
+    if code.startswith(RETIRED_PREFIX):
+        return None
+    return HostedGame.objects.alias(run_code_upper=Upper('run_code')).filter(run_code_upper=code).values_list('id', flat=True).first()
+
+
+KINDS = {
+    'quiz': (_quiz_id, Quiz._meta.get_field('code').max_length),
+    'hosted': (_hosted_id, HostedGame._meta.get_field('run_code').max_length),
+}
+
+
+class _LocalCodes:
+    """A small thread-safe LRU of ``(kind, code) -> (id, expires at)``."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (value, now + settings.JOIN_CODE_LOCAL_TTL)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.JOIN_CODE_LRU_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_local = _LocalCodes()
+
+
+def normalize(code):
+    return (code or '').strip().upper()
+
+
+def resolve(kind, code):
+    """Id of the active quiz (``kind='quiz'``) or hosted game (``'hosted'``) with `code`, or None."""
+    lookup, max_length = KINDS[kind]
+    code = normalize(code)
+    if not code or len(code) > max_length:
+        return None
+    if not settings.JOIN_CODE_CACHE:
+        return lookup(code)
+    key = (kind, code)
+    now = time.monotonic()
+    found = _local.get(key, now)
+    if found is None:
+        cache_key = CACHE_KEY.format(kind=kind, code=code)
+        found = cache.get(cache_key)
+        if found is None:
+            found = lookup(code) or MISSING
+            timeout = settings.JOIN_CODE_CACHE_TIMEOUT if found else settings.JOIN_CODE_NEGATIVE_TIMEOUT
+            cache.set(cache_key, found, timeout)
+        _local.set(key, found, now)
+    return found or None
+
+
+def invalidate(kind, *codes):
+    """Forget `codes` of `kind` in this process and in the shared cache."""
+    codes = {normalize(c) for c in codes if c}
+    for code in codes:
+        _local.discard((kind, code))
+    cache.delete_many([CACHE_KEY.format(kind=kind, code=code) for code in codes])
+
+
+def clear_local():
+    """Empty this process's LRU (tests, benchmarks)."""
+    _local.discard()
+
+
+def _feistel_round(key, number, half):
+    digest = hmac.new(key, bytes((number,)) + half.to_bytes(2, 'big'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:2], 'big')
+
+
+def permute(number, key):
+    """Map `number` in ``range(CODE_SPACE)`` to another number of that range, one to one."""
+    value = number
+    while True:
+        # four Feistel rounds shuffle all 32-bit numbers; repeating them until the
+        # result is small enough keeps it a one-to-one map of the code space
+        left, right = value >> 16, value & 0xFFFF
+        for i in range(4):
+            left, right = right, left ^ _feistel_round(key, i, right)
+        value = (left << 16) | right
+        if value < CODE_SPACE:
+            return value
+
+
+def encode(number):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def _reserve_numbers(count):
+    """Take `count` numbers off the shared sequence; returns ``(first, key)``."""
+    CodeSequence.objects.get_or_create(name=SEQUENCE, defaults={'key': secrets.token_hex(32)})
+    with transaction.atomic():
+        sequence = CodeSequence.objects.select_for_update().get(name=SEQUENCE)
+        if sequence.next_value + count > CODE_SPACE:
+            raise RuntimeError('Join codes are used up')
+        CodeSequence.objects.filter(name=SEQUENCE).update(next_value=F('next_value') + count)
+    return sequence.next_value, bytes.fromhex(sequence.key)
+
+
+def _claim_recycled(count):
+    """Take up to `count` codes that retired games gave back long enough ago."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOIN_CODE_RECYCLE_AFTER)
+    with transaction.atomic():
+        free = RecycledCode.objects.filter(released_at__lt=cutoff).order_by('released_at')
+        if connection.features.has_select_for_update_skip_locked:
+            # SQLite needs nothing here, its transactions take the write lock up front
+            free = free.select_for_update(skip_locked=True)
+        claimed = list(free.values_list('code', flat=True)[:count])
+        if claimed:
+            RecycledCode.objects.filter(code__in=claimed).delete()
+    return claimed
+
+
+class CodeAllocator:
+    """Hands out join codes from blocks reserved `block_size` at a time; thread-safe."""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or settings.JOIN_CODE_BLOCK
+        self._lock = threading.Lock()
+        self._codes = deque()
+        self._pid = os.getpid()
+
+    def allocate(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked worker must not hand out its parent's codes
+                self._codes.clear()
+                self._pid = os.getpid()
+            if not self._codes:
+                self._codes.extend(self._refill())
+            return self._codes.popleft()
+
+    def _refill(self):
+        recycled = _claim_recycled(self.block_size)
+        if recycled:
+            return recycled
+        first, key = _reserve_numbers(self.block_size)
+        return [encode(permute(number, key)) for number in range(first, first + self.block_size)]
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def allocate():
+    """A join code nobody else has been given."""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = CodeAllocator()
+    return _allocator.allocate()
+
+
+def reset_allocator():
+    """Drop this process's reserved codes (tests, benchmarks)."""
+    global _allocator
+    with _allocator_lock:
+        _allocator = None
+
+
+def save_with_code(instance, field, attempts=5):
+    """Save the new `instance` with a newly allocated code in `field`.
+
+    Allocated codes never repeat, so this only retries when the code was
+    taken by hand or before the allocator existed.
+    """
+    for attempt in range(attempts):
+        setattr(instance, field, allocate())
+        try:
+            with transaction.atomic():
+                instance.save(force_insert=True)
+            return instance
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def create_with_code(model, field, attempts=5, **fields):
+    """Create a `model` row with a newly allocated code in `field` (see `save_with_code`)."""
+    return save_with_code(model(**fields), field, attempts)
+
+
+def retire(hosted_id):
+    """Take the lobby code away from a closed or finished game and put it up for reuse."""
+    with transaction.atomic():
+        code = (
+            HostedGame.objects.filter(id=hosted_id).exclude(run_code__startswith=RETIRED_PREFIX)
+            .values_list('run_code', flat=True).first()
+        )
+        if code is None:
+            return False
+        retired = RETIRED_PREFIX + int_to_base36(hosted_id)
+        HostedGame.objects.filter(id=hosted_id, run_code=code).update(run_code=retired)
+        if len(code) == CODE_LENGTH and all(c in ALPHABET for c in code.upper()):
+            RecycledCode.objects.get_or_create(code=code.upper())
+    invalidate('hosted', code)
+    return True
+
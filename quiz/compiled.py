@@ -0,0 +1,170 @@
+"""Read-only, cached snapshot of a quiz used by the play loop.
+
+Playing a quiz only needs its ordered questions, their answers and which answers
+are correct. That content almost never changes while people are playing, so it is
+built once per quiz and kept in Django's cache. Every cache entry is stored under
+a per-quiz version number; changing a quiz, question or answer bumps the version
+(see `quiz.signals`) and the next reader builds a fresh snapshot.
+"""
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Quiz, Question, Answer
+
+
+VERSION_KEY = 'compiled-quiz:{quiz_id}:version'
+DATA_KEY = 'compiled-quiz:{quiz_id}:v{version}'
+
+
+@dataclass(frozen=True)
+class CompiledAnswer:
+    id: int
+    question_id: int
+    text: str
+    image_url: str = ''
+    image_variants: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class CompiledQuestion:
+    id: int
+    order: int
+    text: str
+    image_url: str = ''
+    image_variants: dict = field(default_factory=dict)
+    answers: tuple = ()
+
+
+@dataclass(frozen=True)
+class CompiledQuiz:
+    id: int
+    version: int
+    title: str
+    time_limit: object = None
+    scoring_mode: str = 'flat'
+    questions: tuple = ()
+    # lookups derived from `questions`, filled in by `compile_quiz`
+    by_order: dict = field(default_factory=dict, repr=False)
+    by_id: dict = field(default_factory=dict, repr=False)
+    answers: dict = field(default_factory=dict, repr=False)
+    correct: dict = field(default_factory=dict, repr=False)
+    next_orders: dict = field(default_factory=dict, repr=False)
+
+    def question(self, order):
+        return self.by_order.get(order)
+
+    def is_correct(self, answer):
+        return answer.id in self.correct.get(answer.question_id, ())
+
+    def next_order(self, order):
+        """Order of the question after `order`.
+
+        Past the last question this points one beyond it, which is where the
+        play view shows the results.
+        """
+        return self.next_orders.get(order, order + 1)
+
+    def following(self, order):
+        """The question after `order`, None after the last one."""
+        return self.by_order.get(self.next_order(order))
+
+
+def _image_url(image):
+    return image.url if image else ''
+
+
+def compile_quiz(quiz_id, version=0):
+    """Build a `CompiledQuiz` from the database (three queries)."""
+    quiz = Quiz.objects.get(id=quiz_id)
+    questions = list(Question.objects.filter(quiz_id=quiz_id).order_by('order', 'id'))
+    answers_by_question = {}
+    for answer in Answer.objects.filter(question__quiz_id=quiz_id).order_by('id'):
+        answers_by_question.setdefault(answer.question_id, []).append(answer)
+
+    compiled_questions = []
+    answers = {}
+    correct = {}
+    for question in questions:
+        compiled_answers = []
+        for answer in answers_by_question.get(question.id, []):
+            ca = CompiledAnswer(
+                id=answer.id, question_id=question.id, text=answer.text,
+                image_url=_image_url(answer.image), image_variants=answer.image_variants,
+            )
+            compiled_answers.append(ca)
+            answers[answer.id] = ca
+            if answer.is_correct:
+                correct.setdefault(question.id, set()).add(answer.id)
+        compiled_questions.append(CompiledQuestion(
+            id=question.id,
+            order=question.order,
+            text=question.text,
+            image_url=_image_url(question.image),
+            image_variants=question.image_variants,
+            answers=tuple(compiled_answers),
+        ))
+
+    by_order = {}
+    for q in compiled_questions:
+        # keep the first question when two share an order, like `.filter(order=n).first()` did
+        by_order.setdefault(q.order, q)
+    orders = sorted(by_order)
+    next_orders = {order: nxt for order, nxt in zip(orders, orders[1:])}
+    if orders:
+        next_orders[orders[-1]] = orders[-1] + 1
+
+    return CompiledQuiz(
+        id=quiz.id,
+        version=version,
+        title=quiz.title,
+        time_limit=quiz.time_limit,
+        scoring_mode=quiz.scoring_mode,
+        questions=tuple(compiled_questions),
+        by_order=by_order,
+        by_id={q.id: q for q in compiled_questions},
+        answers=answers,
+        correct={qid: frozenset(ids) for qid, ids in correct.items()},
+        next_orders=next_orders,
+    )
+
+
+def _fresh_version():
+    # millisecond clock: a restarted version never collides with an older
+    # snapshot still sitting in the cache
+    return int(time.time() * 1000)
+
+
+def _current_version(quiz_id):
+    key = VERSION_KEY.format(quiz_id=quiz_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_compiled_quiz(quiz_id):
+    """Return the cached `CompiledQuiz` for `quiz_id`, building it on a miss.
+
+    Raises `Quiz.DoesNotExist` when the quiz is gone.
+    """
+    version = _current_version(quiz_id)
+    key = DATA_KEY.format(quiz_id=quiz_id, version=version)
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = compile_quiz(quiz_id, version)
+        cache.set(key, compiled, timeout=settings.COMPILED_QUIZ_CACHE_TIMEOUT)
+    return compiled
+
+
+def invalidate_compiled_quiz(quiz_id):
+    """Bump the quiz version so readers stop using the cached snapshot."""
+    key = VERSION_KEY.format(quiz_id=quiz_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # no version yet (or it was evicted)
+        cache.set(key, _fresh_version(), timeout=None)
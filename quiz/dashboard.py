@@ -0,0 +1,192 @@
+"""Live numbers for the host of a hosted game: who answered the current
+question, how the answers are spread and the running top 10.
+
+Every accepted answer of a hosted session is published as a small delta on the
+game's dashboard channel (`publish_answer`); nothing else ever reads
+`PlayerAnswer` for the dashboard. The host's websocket (see `quiz.websocket`)
+builds a `Board` from the database once when it connects (`load_board`, a few
+grouped queries), then only applies the deltas in memory and sends what changed
+at most every `DASHBOARD_PUSH_INTERVAL` seconds::
+
+    {"event": "dashboard", "question_id": 17, "players": 1000, "answered": 0,
+     "distribution": {"51": 0, ...}, "top": [{"username": .., "score": ..}, ...]}
+    {"event": "tally", "question_id": 17, "answered": 412, "distribution": {"51": 3, "52": 9},
+     "top": [...]}
+
+``distribution`` of a ``tally`` holds increments since the previous message;
+``top`` is only sent when a score changed. A 1,000-player room therefore costs
+the host a few messages per second however fast the answers come in.
+
+Hosts whose browser can't keep the websocket open poll `polled_snapshot`
+instead. Every delta is also logged in the cache under a sequence number, and
+the poll keeps its own cached `Board` that it brings up to date with the deltas
+logged since the previous poll; the database is only read again when the round
+moves on or deltas expired.
+"""
+import heapq
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from results import ingest
+from results.models import PlayerAnswer, QuizSession
+from .compiled import get_compiled_quiz
+from .models import HostedGame
+from .realtime import get_broker
+from .rounds import current_round
+
+
+TOP_SIZE = 10
+DELTA_SEQ_KEY = 'dashboard:{hosted_id}:seq'
+DELTA_KEY = 'dashboard:{hosted_id}:delta:{number}'
+POLL_BOARD_KEY = 'dashboard:{hosted_id}:board'
+DELTA_TIMEOUT = 10 * 60
+
+
+def dashboard_channel(hosted_id):
+    return f'dashboard:{hosted_id}'
+
+
+def _log_delta(hosted_id, message):
+    key = DELTA_SEQ_KEY.format(hosted_id=hosted_id)
+    cache.add(key, 0, DELTA_TIMEOUT)
+    try:
+        number = cache.incr(key)
+    except ValueError:
+        # expired in between; the next poll finds the log restarted and reloads
+        return
+    cache.set(DELTA_KEY.format(hosted_id=hosted_id, number=number), message, DELTA_TIMEOUT)
+
+
+def publish_answer(hosted_id, session_id, question_id, answer_id, score):
+    """Tell the host's dashboard about an answer, once it's committed."""
+    message = {'session_id': session_id, 'question_id': question_id, 'answer_id': answer_id, 'score': score}
+
+    def publish():
+        _log_delta(hosted_id, message)
+        get_broker().publish(dashboard_channel(hosted_id), message)
+
+    transaction.on_commit(publish)
+
+
+class Board:
+    """Counters of one hosted game's current question, kept up to date from answer deltas."""
+
+    def __init__(self, question_id, answer_ids, players, scores, answered):
+        self.question_id = question_id
+        # session id -> username
+        self.players = players
+        self.scores = scores
+        # session id -> answer id, for the current question
+        self.answered = answered
+        self.distribution = Counter({answer_id: 0 for answer_id in answer_ids})
+        self.distribution.update(answered.values())
+        self._changes = Counter()
+        self._top_changed = False
+
+    def apply(self, message):
+        """Count one answer delta; False if it was counted already or isn't for this question."""
+        session_id = message['session_id']
+        if message['question_id'] != self.question_id or session_id in self.answered or session_id not in self.players:
+            return False
+        answer_id = message['answer_id']
+        self.answered[session_id] = answer_id
+        self.distribution[answer_id] += 1
+        self._changes[answer_id] += 1
+        if message['score']:
+            self.scores[session_id] = self.scores.get(session_id, 0) + message['score']
+            self._top_changed = True
+        return True
+
+    def top(self):
+        best = heapq.nlargest(TOP_SIZE, self.scores.items(), key=lambda item: (item[1], -item[0]))
+        return [{'username': self.players[session_id], 'score': score} for session_id, score in best if score]
+
+    def snapshot(self):
+        return {
+            'event': 'dashboard',
+            'question_id': self.question_id,
+            'players': len(self.players),
+            'answered': len(self.answered),
+            'distribution': {str(answer_id): n for answer_id, n in self.distribution.items()},
+            'top': self.top(),
+        }
+
+    def take_changes(self):
+        """A ``tally`` message with what changed since the last call, or None."""
+        if not self._changes:
+            return None
+        message = {
+            'event': 'tally',
+            'question_id': self.question_id,
+            'answered': len(self.answered),
+            'distribution': {str(answer_id): n for answer_id, n in self._changes.items()},
+        }
+        if self._top_changed:
+            message['top'] = self.top()
+        self._changes = Counter()
+        self._top_changed = False
+        return message
+
+
+def load_board(hosted_id):
+    """Build the `Board` of a game from the database, None if there's no such game."""
+    quiz_id = HostedGame.objects.filter(id=hosted_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is None:
+        return None
+    buffer = ingest.get_buffer()
+    if buffer is not None:
+        # answers of this process still waiting in the write-behind buffer
+        buffer.flush()
+    state = current_round(hosted_id)
+    question = None
+    if state is not None and not state.finished:
+        question = get_compiled_quiz(quiz_id).question(state.order)
+
+    players = dict(QuizSession.objects.filter(hosted_game_id=hosted_id).values_list('id', 'user__username'))
+    answers = PlayerAnswer.objects.filter(session__hosted_game_id=hosted_id)
+    # summed from the answers rather than total_score, so an answer whose delta
+    # is already queued is counted exactly once (`Board.apply` skips it)
+    scores = dict(answers.values('session_id').annotate(total=Sum('score')).values_list('session_id', 'total'))
+    answered = {}
+    if question is not None:
+        answered = dict(answers.filter(question_id=question.id).values_list('session_id', 'selected_answer_id'))
+    return Board(
+        question.id if question else None,
+        [answer.id for answer in question.answers] if question else [],
+        players, scores, answered,
+    )
+
+
+def polled_snapshot(hosted_id):
+    """The dashboard snapshot for a host polling over HTTP, None if there's no such game.
+
+    The cached board remembers the last delta it counted; a poll applies the
+    ones logged since and only rebuilds the board (`load_board`) when it is for
+    another round or some of those deltas are gone.
+    """
+    state = current_round(hosted_id)
+    order = state.order if state is not None and not state.finished else None
+    # read before loading, so a board built now can't miss a delta (`Board.apply` skips repeats)
+    last = cache.get(DELTA_SEQ_KEY.format(hosted_id=hosted_id), 0)
+    board = None
+    cached = cache.get(POLL_BOARD_KEY.format(hosted_id=hosted_id))
+    if cached is not None and cached[1] == order and cached[0] <= last:
+        counted, _, board = cached
+        keys = [DELTA_KEY.format(hosted_id=hosted_id, number=n) for n in range(counted + 1, last + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) == len(keys):
+            for key in keys:
+                board.apply(deltas[key])
+            # only the snapshot is read from this board
+            board.take_changes()
+        else:
+            board = None
+    if board is None:
+        board = load_board(hosted_id)
+        if board is None:
+            return None
+    cache.set(POLL_BOARD_KEY.format(hosted_id=hosted_id), (last, order, board), DELTA_TIMEOUT)
+    return board.snapshot()
@@ -1,4 +1,7 @@
+import os
+
 from django import forms
+from . import codes
 from .models import Quiz, Question, Answer
 from datetime import timedelta
 
@@ -13,7 +16,15 @@ class QuizCreateForm(forms.ModelForm):
 
     class Meta:
         model = Quiz
-        fields = ['title', 'description', 'time_limit', 'code']
+        fields = ['title', 'description', 'time_limit', 'scoring_mode', 'code']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # older clients don't send it, they get the model default
+        self.fields['scoring_mode'].required = False
+
+    def clean_scoring_mode(self):
+        return self.cleaned_data.get('scoring_mode') or Quiz._meta.get_field('scoring_mode').default
 
     def clean_time_limit(self):
         raw = self.cleaned_data.get('time_limit')
@@ -45,21 +56,34 @@ class QuizCreateForm(forms.ModelForm):
         # The cleaned time_limit is a timedelta or None and matches the model field
         instance = super().save(commit=False)
         instance.time_limit = self.cleaned_data.get('time_limit')
-        # ensure code is set (if user left it blank, generate one)
-        if not instance.code:
-            # generate a short alphanumeric code
-            import secrets, string
-            alphabet = string.ascii_uppercase + string.digits
-            for _ in range(10):
-                candidate = ''.join(secrets.choice(alphabet) for _ in range(6))
-                if not Quiz.objects.filter(code=candidate).exists():
-                    instance.code = candidate
-                    break
         if commit:
-            instance.save()
+            if instance.code:
+                instance.save()
+            else:
+                # left blank: hand out one, retried if it turns out to be taken
+                codes.save_with_code(instance, 'code')
+            self._save_m2m()
         return instance
 
 
+# what an uploaded image (or one in an imported archive, see quiz/archive.py) may be
+MAX_IMAGE_SIZE = int(2.5 * 1024 * 1024)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def validate_image(img):
+    """Reject uploads that are too big or not images. Empty values pass."""
+    if img:
+        # limit size to 2.5 MB
+        if img.size > MAX_IMAGE_SIZE:
+            raise forms.ValidationError('Файл занадто великий. Максимум 2.5 MB.')
+        # basic content-type check
+        if not getattr(img, 'content_type', '').startswith('image/'):
+            raise forms.ValidationError('Невірний формат файлу. Очікується зображення.')
+        if os.path.splitext(img.name or '')[1].lower() not in IMAGE_EXTENSIONS:
+            raise forms.ValidationError('Невірний формат файлу. Очікується зображення.')
+
+
 # Simple Question form for creation step (single question minimum)
 class QuestionForm(forms.ModelForm):
     class Meta:
@@ -68,14 +92,7 @@ class QuestionForm(forms.ModelForm):
 
     def clean_image(self):
         img = self.cleaned_data.get('image')
-        if img:
-            # limit size to 2.5 MB
-            max_size = 2.5 * 1024 * 1024
-            if img.size > max_size:
-                raise forms.ValidationError('Файл занадто великий. Максимум 2.5 MB.')
-            # basic content-type check
-            if not getattr(img, 'content_type', '').startswith('image/'):
-                raise forms.ValidationError('Невірний формат файлу. Очікується зображення.')
+        validate_image(img)
         return img
 
 
@@ -86,12 +103,7 @@ class AnswerForm(forms.ModelForm):
 
     def clean_image(self):
         img = self.cleaned_data.get('image')
-        if img:
-            max_size = 2.5 * 1024 * 1024
-            if img.size > max_size:
-                raise forms.ValidationError('Файл занадто великий. Максимум 2.5 MB.')
-            if not getattr(img, 'content_type', '').startswith('image/'):
-                raise forms.ValidationError('Невірний формат файлу. Очікується зображення.')
+        validate_image(img)
         return img
 
 # Answer formset for adding answers to the initial question
@@ -0,0 +1,175 @@
+"""Responsive variants of question and answer images.
+
+After an image is uploaded it is decoded once, turned upright (EXIF), capped at
+`IMAGE_MAX_DIMENSION` and written as WebP and JPEG at each of
+`IMAGE_VARIANT_WIDTHS` that is not wider than the picture::
+
+    questions/variants/<sha256 of the upload>-640.webp
+    questions/variants/<sha256 of the upload>-640.jpg
+
+Names are derived from the content, so re-uploading the same picture reuses the
+files. The result is stored in the row's ``image_variants``::
+
+    {"source": "<image name>", "width": 1280, "height": 960,
+     "webp": [[320, "<name>"], ...], "jpeg": [[320, "<name>"], ...]}
+
+and templates turn it into ``srcset`` with the ``responsive_image`` tag. The
+work runs on a small thread pool after the upload commits, so requests don't
+wait for it; until it's done pages fall back to the original file.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .compiled import invalidate_compiled_quiz
+from .models import Question
+from .storage import keep_alive
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# `sizes` of the play pages' images; prefetching must use the same values or
+# the browser picks a different candidate than the page later asks for
+SIZES = {
+    'question': '(max-width: 768px) 100vw, 720px',
+    'answer': '160px',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _variant_dir(model):
+    return 'questions/variants' if model is Question else 'answers/variants'
+
+
+def build_variants(field_file, directory):
+    """Decode `field_file` and write its variants under `directory`; returns the ``image_variants`` dict."""
+    with field_file.open('rb') as fh:
+        data = fh.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    max_dimension = settings.IMAGE_MAX_DIMENSION
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        opaque = Image.new('RGB', image.size, (255, 255, 255))
+        opaque.paste(image, mask=image.getchannel('A'))
+    else:
+        opaque = image
+
+    width, height = image.size
+    widths = sorted({w for w in settings.IMAGE_VARIANT_WIDTHS if w < width} | {width})
+    variants = {'source': field_file.name, 'width': width, 'height': height}
+    for key, pil_format, params in FORMATS:
+        source = image if key == 'webp' else opaque  # WebP keeps transparency, JPEG can't
+        variants[key] = []
+        for w in widths:
+            name = f'{directory}/{digest}-{w}.{EXTENSIONS[key]}'
+            if not keep_alive(default_storage, name):
+                resized = source if w == width else source.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+                out = BytesIO()
+                resized.save(out, pil_format, **params)
+                name = default_storage.save(name, ContentFile(out.getvalue()))
+            variants[key].append([w, name])
+    return variants
+
+
+def generate_variants(model, pk):
+    """Build variants for one row and store them, unless its image changed meanwhile."""
+    row = model.objects.filter(pk=pk).first()
+    if row is None or not row.image:
+        return None
+    try:
+        variants = build_variants(row.image, _variant_dir(model))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning('Could not process %s', row.image.name, exc_info=True)
+        variants = {'source': row.image.name, 'error': True}
+    if model.objects.filter(pk=pk, image=row.image.name).update(image_variants=variants):
+        quiz_id = row.quiz_id if model is Question else row.question.quiz_id
+        # .update() sends no signals; play pages read variants from the compiled quiz
+        invalidate_compiled_quiz(quiz_id)
+    return variants
+
+
+def _run(model, pk):
+    try:
+        generate_variants(model, pk)
+    except Exception:
+        logger.exception('Generating image variants for %s %s failed', model.__name__, pk)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(model, pk):
+    """Generate variants for the row once the current transaction commits.
+
+    With ``IMAGE_VARIANT_WORKERS = 0`` the work happens inline (tests, scripts).
+    """
+    if settings.IMAGE_VARIANT_WORKERS:
+        transaction.on_commit(lambda: _get_executor().submit(_run, model, pk))
+    else:
+        transaction.on_commit(lambda: generate_variants(model, pk))
+
+
+def needs_variants(instance):
+    """Whether `instance` has an image whose variants are missing or belong to a previous image."""
+    return bool(instance.image) and (instance.image_variants or {}).get('source') != instance.image.name
+
+
+def _srcset(entries):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in entries)
+
+
+def image_sources(url, variants, sizes):
+    """What the browser needs to pick a candidate: ``src``, WebP/JPEG srcsets and ``sizes``."""
+    variants = variants or {}
+    webp, jpeg = variants.get('webp'), variants.get('jpeg')
+    if not webp or not jpeg:
+        return {'src': url, 'webp': '', 'jpeg': '', 'sizes': ''}
+    return {
+        'src': default_storage.url(jpeg[-1][1]),
+        'webp': _srcset(webp),
+        'jpeg': _srcset(jpeg),
+        'sizes': SIZES.get(sizes, sizes),
+    }
+
+
+def question_media(question):
+    """Image sources of a compiled question and its answers, as the play pages render them."""
+    if not question:
+        return []
+    media = []
+    if question.image_url:
+        media.append(image_sources(question.image_url, question.image_variants, 'question'))
+    for answer in question.answers:
+        if answer.image_url:
+            media.append(image_sources(answer.image_url, answer.image_variants, 'answer'))
+    return media
@@ -0,0 +1,316 @@
+"""Scenario load generator used by ``manage.py loadtest``.
+
+Virtual users are threads, each with its own cookie jar, that run scripted
+scenarios over real HTTP against a live server (by default one started in
+process on a throwaway database, see the command). Every request is timed
+under a step name such as ``play:answer`` and the run is summarised as JSON::
+
+    {"meta": {...}, "totals": {...}, "steps": {"play:answer": {"count": .., "errors": ..,
+     "error_rate": .., "rps": .., "p50_ms": .., "p90_ms": .., "p95_ms": .., "p99_ms": .., "max_ms": ..}}}
+
+`compare` lines two of those files up, so runs from different commits can be
+put side by side.
+"""
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .bench import percentile
+from .models import Quiz, Question, Answer
+
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+RUN_CODE_RE = re.compile(r'Код лобі: <strong>([A-Z0-9]+)</strong>')
+HOSTED_ID_RE = re.compile(r'/host/(\d+)/status/')
+STATE_RE = re.compile(r'<script id="play-state" type="application/json">(.*?)</script>', re.S)
+
+
+class ScenarioError(Exception):
+    """A response that doesn't look like what a real player would get."""
+
+
+def seed(quizzes=5, questions=10, players=200, hosts=5):
+    """Create the data the scenarios play with; returns ``(quizzes, players, hosts)``."""
+    hosts = [User.objects.create_user(f'load-host-{i}') for i in range(hosts)]
+    players = User.objects.bulk_create([User(username=f'load-player-{i}') for i in range(players)], batch_size=500)
+    created = []
+    for n in range(quizzes):
+        quiz = Quiz.objects.create(title=f'Навантаження {n}', code=f'LOAD{n:02d}', creator=hosts[n % len(hosts)])
+        qs = Question.objects.bulk_create([Question(quiz=quiz, text=f'Питання {i}', order=i) for i in range(1, questions + 1)])
+        Answer.objects.bulk_create([
+            Answer(question=q, text=f'Відповідь {a}', is_correct=a == 0) for q in qs for a in range(4)
+        ])
+        created.append(quiz)
+    return created, players, hosts
+
+
+class Recorder:
+    """Thread-safe store of ``(step, seconds, ok)`` samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_examples = {}
+        self.scenarios = defaultdict(lambda: {'runs': 0, 'failed': 0})
+
+    def record(self, step, seconds, ok, error=None):
+        with self._lock:
+            self.samples[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+                self.error_examples.setdefault(step, error)
+
+    def scenario_done(self, name, ok):
+        with self._lock:
+            self.scenarios[name]['runs'] += 1
+            self.scenarios[name]['failed'] += not ok
+
+    def report(self, elapsed, meta):
+        steps = {}
+        total = errors = 0
+        for step in sorted(self.samples):
+            seconds = self.samples[step]
+            failed = self.errors.get(step, 0)
+            total += len(seconds)
+            errors += failed
+            steps[step] = {
+                'count': len(seconds),
+                'errors': failed,
+                'error_rate': round(failed / len(seconds), 4),
+                'rps': round(len(seconds) / elapsed, 2),
+                **{f'p{p}_ms': round(percentile(seconds, p) * 1000, 2) for p in (50, 90, 95, 99)},
+                'max_ms': round(max(seconds) * 1000, 2),
+            }
+            if step in self.error_examples:
+                steps[step]['first_error'] = self.error_examples[step]
+        return {
+            'meta': {**meta, 'elapsed_s': round(elapsed, 2)},
+            'totals': {
+                'requests': total,
+                'errors': errors,
+                'error_rate': round(errors / total, 4) if total else 0.0,
+                'rps': round(total / elapsed, 2),
+            },
+            'scenarios': {name: dict(counts) for name, counts in sorted(self.scenarios.items())},
+            'steps': steps,
+        }
+
+
+class Browser:
+    """One logged-in user talking HTTP to `base_url`."""
+
+    def __init__(self, base_url, user, recorder, timeout=30):
+        self.user = user
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar))
+        self.csrf = None
+        client = Client()
+        client.force_login(user)
+        cookie = client.cookies['sessionid']
+        host = urllib.parse.urlsplit(self.base_url).hostname
+        self.jar.set_cookie(http.cookiejar.Cookie(
+            0, 'sessionid', cookie.value, None, False, host, False, False, '/', True,
+            False, None, True, None, None, {},
+        ))
+
+    def request(self, step, path, data=None, json_body=None, expect=None):
+        """Fetch `path` (following redirects) as `step`; returns ``(final url, body)``."""
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers = {'Content-Type': 'application/json', 'X-CSRFToken': self.csrf or ''}
+        elif data is not None:
+            body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': self.csrf or ''}).encode()
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                content = response.read().decode()
+                url = response.geturl()
+        except urllib.error.HTTPError as e:
+            self.recorder.record(step, time.perf_counter() - start, False, f'HTTP {e.code}')
+            raise ScenarioError(f'{step}: HTTP {e.code}')
+        except OSError as e:
+            self.recorder.record(step, time.perf_counter() - start, False, type(e).__name__)
+            raise ScenarioError(f'{step}: {e}')
+        seconds = time.perf_counter() - start
+        if expect is not None and not re.search(expect, url + '\n' + content):
+            self.recorder.record(step, seconds, False, f'unexpected response from {urllib.parse.urlsplit(url).path}')
+            raise ScenarioError(f'{step}: unexpected response')
+        self.recorder.record(step, seconds, True)
+        token = CSRF_RE.search(content)
+        if token:
+            self.csrf = token.group(1)
+        return url, content
+
+
+def _play_json(ctx, browser, page, prefix):
+    """Play a session through the single-page player's API, starting from its page."""
+    match = STATE_RE.search(page)
+    if not match:
+        raise ScenarioError(f'{prefix}: no player state')
+    state = json.loads(match.group(1))
+    _, payload = browser.request(f'{prefix}:payload', state['payload_url'])
+    quiz = json.loads(payload)
+    for question in quiz['questions']:
+        answer = ctx['rng'].choice(question['answers'])
+        browser.request(f'{prefix}:answer', state['answer_url'], json_body={'question_id': question['id'], 'answer_id': answer['id']})
+    browser.request(f'{prefix}:finish', state['finish_url'], expect='Результати')
+
+
+def join_by_code(ctx, browser):
+    quiz = ctx['rng'].choice(ctx['quizzes'])
+    browser.request('join:index', reverse('index'))
+    browser.request('join:code', reverse('index'), data={'code': quiz.code.lower()}, expect='play-state')
+
+
+def play_quiz(ctx, browser):
+    quiz = ctx['rng'].choice(ctx['quizzes'])
+    browser.request('play:detail', reverse('quiz_detail', args=[quiz.id]))
+    _, page = browser.request('play:start', reverse('start_quiz', args=[quiz.id]), data={}, expect='play-state')
+    _play_json(ctx, browser, page, 'play')
+
+
+def play_quiz_pages(ctx, browser):
+    """The page-per-question fallback flow."""
+    quiz = ctx['rng'].choice(ctx['quizzes'])
+    browser.request('pages:detail', reverse('quiz_detail', args=[quiz.id]))
+    _, page = browser.request('pages:start', reverse('start_quiz', args=[quiz.id]), data={}, expect='play-state')
+    state = json.loads(STATE_RE.search(page).group(1))
+    url, page = browser.request('pages:question', state['fallback_url'])
+    while True:
+        form = re.search(r'<form method="post" action="([^"]+)"', page)
+        answers = re.findall(r'name="answer_id" id="a\d+" value="(\d+)"', page)
+        if not form or not answers:
+            break
+        url, page = browser.request('pages:answer', form.group(1), data={'answer_id': ctx['rng'].choice(answers)})
+    if 'Результати' not in page:
+        raise ScenarioError('pages: did not finish')
+
+
+def hosted_game(ctx, browser):
+    """A host opens a lobby, a few players join and poll, the host starts and plays it through."""
+    quiz = ctx['rng'].choice(ctx['quizzes'])
+    host = ctx['browser_for'](quiz.creator)
+    _, lobby = host.request('hosted:open', reverse('host_quiz', args=[quiz.id]), expect='Код лобі')
+    run_code = RUN_CODE_RE.search(lobby).group(1)
+    hosted_id = int(HOSTED_ID_RE.search(lobby).group(1))
+    status_url = reverse('host_status', args=[hosted_id])
+
+    others = [u for u in ctx['rng'].sample(ctx['players'], ctx['lobby_size']) if u.id != browser.user.id]
+    players = [browser] + [ctx['browser_for'](user) for user in others[:ctx['lobby_size'] - 1]]
+    for player in players:
+        player.request('hosted:join_page', reverse('join_hosted'))
+        player.request('hosted:join', reverse('join_hosted'), data={'run_code': run_code})
+        player.request('hosted:poll', status_url)
+    host.request('hosted:start', reverse('host_lobby', args=[hosted_id]), data={'action': 'start'})
+    for player in players:
+        _, status = player.request('hosted:poll', status_url, expect='"is_started": true')
+        if not json.loads(status)['participant_session_id']:
+            raise ScenarioError('hosted: no session after start')
+
+    play_url = reverse('hosted_play', args=[hosted_id])
+    while True:
+        finished = False
+        for player in players:
+            url, page = player.request('hosted:round', play_url)
+            if urllib.parse.urlsplit(url).path != play_url:
+                # past the last round the play page sends players to their results
+                finished = True
+                continue
+            form = re.search(r'<form method="post" action="([^"]+)" id="answerForm"', page)
+            answers = re.findall(r'name="answer_id" id="a\d+" value="(\d+)"', page)
+            if form and answers:
+                player.request('hosted:answer', form.group(1), data={'answer_id': ctx['rng'].choice(answers)})
+        if finished:
+            break
+        host.request('hosted:next', reverse('host_lobby', args=[hosted_id]), data={'action': 'next'})
+
+
+def leaderboards(ctx, browser):
+    quiz = ctx['rng'].choice(ctx['quizzes'])
+    browser.request('boards:catalogue', reverse('quiz_list'))
+    browser.request('boards:leaderboard', reverse('quiz_leaderboard', args=[quiz.id]))
+    browser.request('boards:code', reverse('quiz_code_leaderboard', args=[quiz.id]))
+
+
+SCENARIOS = {
+    'join': join_by_code,
+    'play': play_quiz,
+    'pages': play_quiz_pages,
+    'hosted': hosted_game,
+    'boards': leaderboards,
+}
+
+
+def run(base_url, scenarios, users, duration, quizzes, players, lobby_size=5, seed_value=None):
+    """Run `scenarios` (``{name: weight}``) with `users` threads for `duration` seconds.
+
+    Returns the `Recorder` and the elapsed time.
+    """
+    recorder = Recorder()
+    names = list(scenarios)
+    weights = [scenarios[n] for n in names]
+    deadline = time.monotonic() + duration
+
+    def worker(number):
+        rng = random.Random(None if seed_value is None else seed_value + number)
+        browsers = {}
+
+        def browser_for(user):
+            # one cookie jar per user and thread, logging in is not what we measure
+            if user.id not in browsers:
+                browsers[user.id] = Browser(base_url, user, recorder)
+            return browsers[user.id]
+
+        browser = browser_for(players[number % len(players)])
+        ctx = {'quizzes': quizzes, 'players': players, 'lobby_size': lobby_size, 'browser_for': browser_for, 'rng': rng}
+        try:
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                try:
+                    SCENARIOS[name](ctx, browser)
+                    recorder.scenario_done(name, True)
+                except ScenarioError:
+                    recorder.scenario_done(name, False)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), name=f'vu-{i}') for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, time.perf_counter() - start
+
+
+def compare(previous, current):
+    """Rows ``(step, metric, before, after, change %)`` for steps in both reports."""
+    rows = []
+    for step, now in current['steps'].items():
+        before = previous.get('steps', {}).get(step)
+        if before is None:
+            continue
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+            old, new = before.get(metric, 0), now.get(metric, 0)
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((step, metric, old, new, change))
+    return rows
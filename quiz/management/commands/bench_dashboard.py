@@ -0,0 +1,106 @@
+import asyncio
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz import dashboard
+from quiz.bench import count_queries, isolated_database, run_concurrently, summarize, timed
+from quiz.compiled import get_compiled_quiz
+from quiz.models import Quiz, Question, Answer, HostedGame, HostedParticipant
+from quiz.realtime import get_broker
+from quiz.rounds import current_round
+from quiz.views import start_hosted_game, store_answer
+from quiz.websocket import serve_dashboard
+from results.models import QuizSession
+
+
+class HostSocket:
+    """Stands in for the host's websocket: keeps what the dashboard sends."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.messages = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        if message['type'] == 'websocket.send':
+            self.messages.append((time.perf_counter(), message['text']))
+
+
+class Command(BaseCommand):
+    help = (
+        'Answer one round of a hosted game with N players while the host watches the live '
+        'dashboard; reports answer latency, what the host was sent and what re-reading the '
+        'answers for every refresh would cost instead (runs on a throwaway database).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1000)
+        parser.add_argument('--answers', type=int, default=4, help='Answers per question')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--interval', type=float, default=0.5, help='Dashboard push interval, seconds')
+
+    def handle(self, *args, **options):
+        with isolated_database(on_disk=True):
+            self.run(options)
+
+    def run(self, options):
+        host = User.objects.create_user('bench-host')
+        quiz = Quiz.objects.create(title='bench', creator=host)
+        question = Question.objects.create(quiz=quiz, text='Q', order=1)
+        answers = Answer.objects.bulk_create(
+            [Answer(question=question, text=f'a{i}', is_correct=i == 0) for i in range(options['answers'])],
+        )
+        players = User.objects.bulk_create([User(username=f'bench-{i}') for i in range(options['players'])], batch_size=1000)
+        hosted = HostedGame.objects.create(quiz=quiz, host=host, run_code='BENCH01')
+        HostedParticipant.objects.bulk_create([HostedParticipant(hosted_game=hosted, user=u) for u in players], batch_size=1000)
+        start_hosted_game(hosted)
+
+        compiled = get_compiled_quiz(quiz.id)
+        shown_at = current_round(hosted.id).started_at
+        rng = random.Random(1)
+        jobs = [(session, compiled.answers[rng.choice(answers).id]) for session in QuizSession.objects.filter(hosted_game=hosted)]
+
+        def answer(job):
+            session, picked = job
+            store_answer(session, compiled, picked, shown_at)
+            return True
+
+        async def watch():
+            socket = HostSocket()
+            queue = get_broker().subscribe(dashboard.dashboard_channel(hosted.id))
+            board = await sync_to_async(dashboard.load_board)(hosted.id)
+            task = asyncio.ensure_future(serve_dashboard(hosted.id, board, socket.receive, socket.send, queue, options['interval']))
+            loop = asyncio.get_running_loop()
+            latencies, failed = await loop.run_in_executor(None, run_concurrently, answer, jobs, options['threads'])
+            finished = time.perf_counter()
+            while len(board.answered) < len(jobs) - failed:
+                await asyncio.sleep(0.01)
+            # let the last tally go out
+            await asyncio.sleep(options['interval'] + 0.1)
+            socket.incoming.put_nowait({'type': 'websocket.disconnect'})
+            await task
+            return latencies, failed, finished, socket.messages, board
+
+        latencies, failed, finished, messages, board = asyncio.run(watch())
+        stats = summarize(latencies)
+        sent_bytes = sum(len(text) for _, text in messages)
+        lag = (messages[-1][0] - finished) * 1000 if messages else 0.0
+        self.stdout.write(f'players: {len(jobs)}, failed answers: {failed}')
+        self.stdout.write(f"answer latency: p50 {stats['median_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+        self.stdout.write(
+            f'host was sent {len(messages)} messages ({sent_bytes} bytes), last one {lag:.0f} ms after the last answer; '
+            f"final count {board.snapshot()['answered']}"
+        )
+
+        with count_queries() as counter:
+            seconds, snapshot = timed(dashboard.load_board, hosted.id)
+        self.stdout.write(
+            f're-reading the answers instead: {counter.count} queries, {seconds * 1000:.1f} ms per refresh '
+            f"(answered {snapshot.snapshot()['answered']})"
+        )
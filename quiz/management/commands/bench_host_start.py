@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz.bench import count_queries, isolated_database, summarize, timed
+from quiz.models import Quiz, HostedGame, HostedParticipant
+from quiz.views import start_hosted_game
+from results.models import QuizSession
+
+
+def legacy_start(hosted):
+    """The old start loop: one INSERT and one UPDATE per participant, in autocommit."""
+    for p in hosted.participants.select_related('user'):
+        if p.session is None:
+            p.session = QuizSession.objects.create(user=p.user, quiz=hosted.quiz, source='hosted')
+            p.save()
+    hosted.is_started = True
+    hosted.save()
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-row and bulk start of a hosted game for different lobby sizes (runs on a throwaway database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000], help='Participants per game')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        host = User.objects.create_user('bench-host')
+        quiz = Quiz.objects.create(title='bench', creator=host)
+        players = User.objects.bulk_create([User(username=f'bench-{i}') for i in range(max(options['sizes']))], batch_size=1000)
+        runs = 0
+
+        self.stdout.write(f"{'players':>8} {'path':>7} {'queries':>8} {'median ms':>10} {'max ms':>9}")
+        for size in options['sizes']:
+            for label, start in (('legacy', legacy_start), ('bulk', start_hosted_game)):
+                durations = []
+                queries = 0
+                for _ in range(options['repeat']):
+                    runs += 1
+                    hosted = HostedGame.objects.create(quiz=quiz, host=host, run_code=f'B{runs:07d}')
+                    HostedParticipant.objects.bulk_create(
+                        [HostedParticipant(hosted_game=hosted, user=u) for u in players[:size]], batch_size=1000,
+                    )
+                    with count_queries() as counter:
+                        seconds, _ = timed(start, hosted)
+                    durations.append(seconds)
+                    queries = counter.count
+                stats = summarize(durations)
+                self.stdout.write(f"{size:>8} {label:>7} {queries:>8} {stats['median_ms']:>10.1f} {stats['max_ms']:>9.1f}")
@@ -0,0 +1,80 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from quiz import codes
+from quiz.bench import count_queries, isolated_database, run_concurrently, summarize, timed
+from quiz.models import Quiz, HostedGame
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare join-by-code with and without the join-code resolver: queries per join, lookup '
+        'latency and concurrent join latency (runs on a throwaway database).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quizzes', type=int, default=2000)
+        parser.add_argument('--lookups', type=int, default=20000, help='Code lookups per mode')
+        parser.add_argument('--joins', type=int, default=400, help='Joins through the view per mode')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--bad', type=float, default=0.1, help='Share of mistyped codes')
+
+    def handle(self, *args, **options):
+        with isolated_database(on_disk=True):
+            self.run(options)
+
+    def run(self, options):
+        rng = random.Random(1)
+        host = User.objects.create_user('bench-host')
+        quizzes = Quiz.objects.bulk_create(
+            [Quiz(title=f'bench {i}', title_key=f'bench {i}', code=f'J{i:05d}', creator=host) for i in range(options['quizzes'])],
+            batch_size=1000,
+        )
+        HostedGame.objects.bulk_create(
+            [HostedGame(quiz=q, host=host, run_code=f'H{i:05d}') for i, q in enumerate(quizzes[:100])],
+        )
+        # an event: most players type one of a few codes, some type rubbish
+        hot = [q.code for q in quizzes[:20]]
+
+        def pick():
+            if rng.random() < options['bad']:
+                return f'Z{rng.randrange(10 ** 5):05d}'
+            code = rng.choice(hot) if rng.random() < 0.8 else rng.choice(quizzes).code
+            return code.lower()
+
+        lookups = [pick() for _ in range(options['lookups'])]
+        joins = [pick() for _ in range(options['joins'])]
+        players = User.objects.bulk_create([User(username=f'bench-{i}') for i in range(options['threads'])])
+        clients = []
+        for player in players:
+            client = Client()
+            client.force_login(player)
+            clients.append(client)
+
+        self.stdout.write(f"{'mode':>9} {'lookups/s':>10} {'queries':>8} {'join p50 ms':>12} {'join p95 ms':>12} {'failed':>7}")
+        for enabled in (False, True):
+            with override_settings(JOIN_CODE_CACHE=enabled):
+                cache.clear()
+                codes.clear_local()
+                with count_queries() as counter:
+                    seconds, _ = timed(lambda: [codes.resolve('quiz', code) for code in lookups])
+                queries = counter.count
+
+                def join(job):
+                    index, code = job
+                    response = clients[index % len(clients)].post(reverse('index'), {'code': code})
+                    # a redirect to the player, or the form again for a bad code
+                    return response.status_code in (200, 302)
+
+                latencies, failed = run_concurrently(join, list(enumerate(joins)), options['threads'])
+            stats = summarize(latencies)
+            self.stdout.write(
+                f"{'resolver' if enabled else 'database':>9} {len(lookups) / seconds:>10.0f} {queries:>8} "
+                f"{stats['median_ms']:>12.2f} {stats['p95_ms']:>12.2f} {failed:>7}"
+            )
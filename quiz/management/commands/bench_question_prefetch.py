@@ -0,0 +1,190 @@
+import html
+import json
+import re
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from quiz.bench import isolated_database, summarize
+from quiz.models import Quiz, Question, Answer
+from results.models import QuizSession
+
+
+FORM_RE = re.compile(r'<form method="post" action="([^"]+)"')
+ANSWER_RE = re.compile(r'name="answer_id" id="a\d+" value="(\d+)"')
+PICTURE_RE = re.compile(r'<source type="image/webp" srcset="([^"]+)" sizes="([^"]+)">')
+PLAIN_IMG_RE = re.compile(r'<img src="([^"]+)" alt="[^"]*" loading=')
+MANIFEST_RE = re.compile(r'<script id="next-question-media" type="application/json">(.*?)</script>', re.S)
+
+
+def photo(width, height, seed):
+    """A smooth random picture that compresses roughly like a photo."""
+    channels = [Image.effect_noise((width // 8, height // 8), 60 + 10 * ((seed + i) % 5)) for i in range(3)]
+    small = Image.merge('RGB', channels)
+    data = BytesIO()
+    small.resize((width, height), Image.BICUBIC).save(data, 'JPEG', quality=92)
+    return data.getvalue()
+
+
+class Browser:
+    """Test client with a cache and a modelled network link.
+
+    A request costs the measured server time plus one round trip plus its bytes
+    over the link's bandwidth; images of one page load in parallel, so they
+    share one round trip and the bandwidth. Candidates are picked from srcset
+    the way browsers do: the smallest one covering the rendered width.
+    """
+
+    def __init__(self, client, rtt, bandwidth, viewport, dpr):
+        self.client = client
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.viewport = viewport
+        self.dpr = dpr
+        self.cache = set()
+
+    def request(self, method, url, data=None):
+        start = time.perf_counter()
+        response = getattr(self.client, method)(url, data or {})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        server = time.perf_counter() - start
+        return response, body, server + self.rtt + len(body) / self.bandwidth
+
+    def slot_width(self, sizes):
+        for entry in sizes.split(','):
+            entry = entry.strip()
+            match = re.match(r'\(max-width:\s*(\d+)px\)\s*(.+)', entry)
+            if match:
+                if self.viewport > int(match.group(1)):
+                    continue
+                entry = match.group(2)
+            if entry.endswith('vw'):
+                return self.viewport * float(entry[:-2]) / 100
+            if entry.endswith('px'):
+                return float(entry[:-2])
+        return self.viewport
+
+    def pick(self, srcset, sizes):
+        candidates = []
+        for item in html.unescape(srcset).split(','):
+            url, width = item.strip().rsplit(' ', 1)
+            candidates.append((int(width[:-1]), url))
+        candidates.sort()
+        wanted = self.slot_width(sizes) * self.dpr
+        return next((url for width, url in candidates if width >= wanted), candidates[-1][1])
+
+    def page_images(self, page):
+        urls = [self.pick(srcset, sizes) for srcset, sizes in PICTURE_RE.findall(page)]
+        urls += [html.unescape(src) for src in PLAIN_IMG_RE.findall(page)]
+        return urls
+
+    def manifest_images(self, page):
+        match = MANIFEST_RE.search(page)
+        if not match:
+            return []
+        items = json.loads(match.group(1))
+        return [self.pick(i['webp'], i['sizes']) if i['webp'] else i['src'] for i in items]
+
+    def fetch_images(self, urls):
+        """Load `urls` not cached yet in parallel; returns ``(seconds, bytes)``."""
+        missing = [u for u in dict.fromkeys(urls) if u not in self.cache]
+        if not missing:
+            return 0.0, 0
+        server = 0.0
+        size = 0
+        for url in missing:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            size += len(b''.join(response.streaming_content))
+            server += time.perf_counter() - start
+            self.cache.add(url)
+        return server + self.rtt + size / self.bandwidth, size
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure time to interactive between questions with and without prefetching the next '
+        "question's images, over a modelled network link (runs on a throwaway database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--answer-images', type=int, default=2, help='Answers with a picture per question')
+        parser.add_argument('--rtt', type=float, default=80, help='Round trip time, ms')
+        parser.add_argument('--bandwidth', type=float, default=8, help='Link speed, Mbit/s')
+        parser.add_argument('--think', type=float, default=4, help='Seconds a player spends on a question')
+        parser.add_argument('--viewport', type=int, default=412, help='CSS pixels')
+        parser.add_argument('--dpr', type=float, default=2, help='Device pixel ratio')
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp(prefix='zapquiz-bench-media-')
+        try:
+            with override_settings(MEDIA_ROOT=media, IMAGE_VARIANT_WORKERS=0), isolated_database():
+                self.run(options)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+    def run(self, options):
+        user = User.objects.create_user('bench-player')
+        quiz = Quiz.objects.create(title='bench', creator=user)
+        for n in range(1, options['questions'] + 1):
+            question = Question.objects.create(
+                quiz=quiz, text=f'Q{n}', order=n,
+                image=SimpleUploadedFile(f'q{n}.jpg', photo(1600, 1000, n), content_type='image/jpeg'),
+            )
+            for a in range(4):
+                image = None
+                if a < options['answer_images']:
+                    image = SimpleUploadedFile(f'a{n}-{a}.jpg', photo(600, 600, n * 10 + a), content_type='image/jpeg')
+                Answer.objects.create(question=question, text=f'A{a}', is_correct=a == 0, image=image)
+
+        self.stdout.write(f"{'mode':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'KB waited':>10} {'KB total':>9}")
+        for prefetch in (False, True):
+            client = Client()
+            client.force_login(user)
+            browser = Browser(client, options['rtt'] / 1000, options['bandwidth'] * 1_000_000 / 8, options['viewport'], options['dpr'])
+            session = QuizSession.objects.create(user=user, quiz=quiz)
+            transitions, waited, total = self.play(browser, session, prefetch, options['think'])
+            stats = summarize(transitions)
+            self.stdout.write(
+                f"{'prefetch' if prefetch else 'plain':>9} {stats['median_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                f"{stats['max_ms']:>8.1f} {waited / 1024:>10.0f} {total / 1024:>9.0f}"
+            )
+
+    def play(self, browser, session, prefetch, think):
+        """Answer every question; returns the per-transition times and bytes waited for / loaded."""
+        _, body, _ = browser.request('get', reverse('quiz_question', args=[session.id, 1]))
+        page = body.decode()
+        _, total = browser.fetch_images(browser.page_images(page))
+        transitions = []
+        waited = 0
+        backlog = 0.0
+        while True:
+            if prefetch:
+                # runs while the player reads; whatever doesn't fit in the think time delays the next question
+                seconds, size = browser.fetch_images(browser.manifest_images(page))
+                backlog = max(0.0, seconds - think)
+                total += size
+            form, answers = FORM_RE.search(page), ANSWER_RE.findall(page)
+            if not form or not answers:
+                break
+            response, _, post_seconds = browser.request('post', html.unescape(form.group(1)), {'answer_id': answers[0]})
+            response, body, get_seconds = browser.request('get', response['Location'])
+            page = body.decode()
+            if not FORM_RE.search(page):
+                # the results page, not a question
+                break
+            image_seconds, size = browser.fetch_images(browser.page_images(page))
+            transitions.append(backlog + post_seconds + get_seconds + image_seconds)
+            waited += size
+            total += size
+        return transitions, waited, total
@@ -0,0 +1,85 @@
+import base64
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from quiz.bench import count_queries, isolated_database, summarize, timed
+from quiz.models import Quiz, Question, Answer
+from quiz.views import parse_questions_payload, create_questions
+
+
+# 1x1 transparent PNG
+PIXEL = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+)
+
+
+def legacy_create(quiz, questions, files):
+    """The old per-row path: one INSERT (and autocommit) per question and answer."""
+    for idx, q in enumerate(questions, start=1):
+        question = Question.objects.create(quiz=quiz, text=q.get('text'), order=idx, image=files.get(f"q{idx-1}_image"))
+        for ai, a in enumerate(q.get('answers', [])):
+            if not a.get('text'):
+                continue
+            Answer.objects.create(question=question, text=a.get('text'), is_correct=bool(a.get('is_correct')), image=files.get(f"q{idx-1}_a{ai}_image"))
+
+
+def bulk_create(quiz, questions, files):
+    rows, error = parse_questions_payload(questions, files)
+    assert error is None, error
+    with transaction.atomic():
+        create_questions(quiz, rows)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row and bulk quiz creation for payloads of different sizes (runs on a throwaway database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='Questions per quiz')
+        parser.add_argument('--answers', type=int, default=4, help='Answers per question')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--images', action='store_true', help='Attach an image to every question')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp(prefix='zapquiz-bench-')
+        try:
+            with isolated_database(), override_settings(MEDIA_ROOT=media_root):
+                self.run(options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def run(self, options):
+        user = User.objects.create_user('bench')
+        self.stdout.write(f"{'questions':>9} {'path':>7} {'queries':>8} {'median ms':>10} {'max ms':>9}")
+        for size in options['sizes']:
+            questions = [
+                {
+                    'text': f'Question {i}',
+                    'answers': [{'text': f'Answer {j}', 'is_correct': j == 0} for j in range(options['answers'])],
+                }
+                for i in range(size)
+            ]
+            for label, create in (('legacy', legacy_create), ('bulk', bulk_create)):
+                durations = []
+                queries = 0
+                for _ in range(options['repeat']):
+                    files = self.files(size) if options['images'] else {}
+                    quiz = Quiz.objects.create(title='bench', creator=user)
+                    with count_queries() as counter:
+                        seconds, _ = timed(create, quiz, questions, files)
+                    durations.append(seconds)
+                    queries = counter.count
+                stats = summarize(durations)
+                self.stdout.write(f"{size:>9} {label:>7} {queries:>8} {stats['median_ms']:>10.1f} {stats['max_ms']:>9.1f}")
+
+    @staticmethod
+    def files(size):
+        return {
+            f'q{i}_image': SimpleUploadedFile(f'q{i}.png', PIXEL, content_type='image/png')
+            for i in range(size)
+        }
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from quiz.storage import collect_garbage, dedupe_legacy
+
+
+class Command(BaseCommand):
+    help = 'Move question and answer images into content-addressed blobs, sharing identical files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--gc', action='store_true', help='Also delete blobs and variants no question or answer uses')
+        parser.add_argument('--min-age', type=int, default=3600, help='Seconds a file must be old to be collected (default 3600)')
+
+    def handle(self, *args, **options):
+        stats = dedupe_legacy(dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            '{files} files, {rows} rows: {blobs_written} new blobs, {blobs_reused} duplicates '
+            '({bytes_freed} bytes freed); {missing} files missing'.format(**stats)
+        ))
+        if options['gc']:
+            removed, freed = collect_garbage(min_age=options['min_age'], dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(f'Collected {removed} unused files, {freed} bytes'))
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.archive import write_archive
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Export quizzes with their questions, answers and images into a single archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='Quizzes to export')
+        parser.add_argument('--all', action='store_true', help='Export every quiz')
+        parser.add_argument('-o', '--output', help='Archive path (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            quizzes = Quiz.objects.all()
+        elif options['quiz_ids']:
+            quizzes = Quiz.objects.filter(id__in=options['quiz_ids'])
+        else:
+            raise CommandError('Pass quiz ids or --all')
+
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                write_archive(quizzes, fh)
+            self.stderr.write(self.style.SUCCESS(f"Exported {quizzes.count()} quizzes to {options['output']}"))
+        else:
+            write_archive(quizzes, sys.stdout.buffer)
@@ -0,0 +1,37 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.archive import ArchiveError, import_archive
+
+
+class Command(BaseCommand):
+    help = 'Import quizzes from an archive made by export_quiz.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help="Archive path, '-' for stdin")
+        parser.add_argument('--creator', help='Username to own quizzes whose author does not exist here')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        creator = None
+        if options['creator']:
+            try:
+                creator = User.objects.get(username=options['creator'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user {options['creator']!r}")
+
+        try:
+            if options['archive'] == '-':
+                stats = import_archive(sys.stdin.buffer, creator=creator, batch_size=options['batch_size'])
+            else:
+                with open(options['archive'], 'rb') as fh:
+                    stats = import_archive(fh, creator=creator, batch_size=options['batch_size'])
+        except ArchiveError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {quizzes} quizzes, {questions} questions, {answers} answers; '
+            'images: {blobs_written} new, {blobs_reused} reused; {codes_dropped} join codes already taken'.format(**stats)
+        ))
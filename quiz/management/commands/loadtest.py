@@ -0,0 +1,116 @@
+import json
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.testcases import LiveServerThread, _StaticFilesHandler
+
+from quiz import loadtest
+from quiz.bench import isolated_database
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _scenario_weights(specs):
+    """``play=3 join`` -> ``{'play': 3, 'join': 1}``."""
+    weights = {}
+    for spec in specs:
+        name, _, weight = spec.partition('=')
+        if name not in loadtest.SCENARIOS:
+            raise CommandError(f"Unknown scenario {name!r}, choose from {', '.join(loadtest.SCENARIOS)}")
+        try:
+            weights[name] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f'Bad weight in {spec!r}')
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the scripted load scenarios (join, play, pages, hosted, boards) with concurrent virtual users '
+        'against an in-process live server on a throwaway seeded database, and write a JSON report.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', default=['play=4', 'join=2', 'boards=2', 'pages=1', 'hosted=1'],
+                            help='name[=weight] ... (default: %(default)s)')
+        parser.add_argument('--users', type=int, default=20, help='Virtual users (threads)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--quizzes', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--players', type=int, default=200, help='Seeded player accounts')
+        parser.add_argument('--lobby-size', type=int, default=5, help='Players per hosted game')
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable scenario mixes')
+        parser.add_argument('--output', help='Report path (default: var/loadtest/<commit>-<time>.json)')
+        parser.add_argument('--compare', help='Earlier report to compare this run with')
+
+    def handle(self, *args, **options):
+        weights = _scenario_weights(options['scenarios'])
+        previous = None
+        if options['compare']:
+            try:
+                previous = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        with isolated_database(on_disk=True):
+            quizzes, players, _ = loadtest.seed(options['quizzes'], options['questions'], options['players'])
+            server = LiveServerThread('127.0.0.1', _StaticFilesHandler)
+            server.daemon = True
+            server.start()
+            server.is_ready.wait()
+            if server.error:
+                raise server.error
+            try:
+                base_url = f'http://127.0.0.1:{server.port}'
+                self.stdout.write(f"{options['users']} users for {options['duration']:g}s against {base_url} ...")
+                recorder, elapsed = loadtest.run(
+                    base_url, weights, options['users'], options['duration'], quizzes, players,
+                    lobby_size=options['lobby_size'], seed_value=options['seed'],
+                )
+            finally:
+                server.terminate()
+            commit = _git_commit()
+            report = recorder.report(elapsed, {
+                'commit': commit,
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'users': options['users'],
+                'duration_s': options['duration'],
+                'scenarios': weights,
+                'seed': {k: options[k] for k in ('quizzes', 'questions', 'players', 'lobby_size', 'seed')},
+                'database': connection.vendor,
+                'python': platform.python_version(),
+            })
+
+        output = Path(options['output'] or settings.BASE_DIR / 'var' / 'loadtest' / f"{commit or 'run'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+        totals = report['totals']
+        scenarios = ', '.join(f"{n} {c['runs'] - c['failed']}/{c['runs']}" for n, c in report['scenarios'].items())
+        self.stdout.write(f"{'step':<20} {'count':>6} {'err %':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for step, row in report['steps'].items():
+            self.stdout.write(
+                f"{step:<20} {row['count']:>6} {row['error_rate'] * 100:>6.1f} {row['rps']:>7.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+            )
+        self.stdout.write(
+            f"total: {totals['requests']} requests, {totals['rps']} req/s, {totals['error_rate'] * 100:.2f}% errors; "
+            f'scenarios: {scenarios}'
+        )
+        if previous is not None:
+            self.stdout.write(f"\ncompared with {options['compare']} ({previous.get('meta', {}).get('commit')}):")
+            for step, metric, old, new, change in loadtest.compare(previous, report):
+                self.stdout.write(f'{step:<20} {metric:<10} {old:>10} -> {new:<10} {change:+.1f}%')
+        self.stdout.write(self.style.SUCCESS(f'Report written to {output}'))
@@ -0,0 +1,107 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from quiz.realtime import get_broker, lobby_channel
+from quiz.websocket import serve_lobby
+
+
+class FakeSocket:
+    """Stands in for an ASGI websocket connection: records when events arrive."""
+
+    def __init__(self, on_event):
+        self.incoming = asyncio.Queue()
+        self.on_event = on_event
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        if message['type'] == 'websocket.send':
+            self.on_event(time.perf_counter())
+
+    def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect'})
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the hosted lobby push channel: open N in-process websocket '
+        'connections on one lobby, then report memory per connection and how long '
+        'an event takes to reach every connection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000])
+        parser.add_argument('--events', type=int, default=20, help='Events published per run')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'broker: {type(get_broker()).__name__}')
+        self.stdout.write(f"{'conns':>7} {'memory KiB':>11} {'B/conn':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for count in options['connections']:
+            result = asyncio.run(self.run(count, options['events']))
+            self.stdout.write(
+                f"{count:>7} {result['memory'] / 1024:>11.1f} {result['memory'] / count:>8.0f} "
+                f"{result['p50']:>8.2f} {result['p99']:>8.2f} {result['max']:>8.2f}"
+            )
+
+    async def run(self, count, events):
+        broker = get_broker()
+        # a lobby id no real game uses
+        hosted_id = -count
+        channel = lobby_channel(hosted_id)
+        loop = asyncio.get_running_loop()
+
+        delivered = 0
+        all_delivered = asyncio.Event()
+        arrivals = []
+
+        def on_event(now):
+            nonlocal delivered
+            arrivals.append(now)
+            delivered += 1
+            if delivered == count:
+                all_delivered.set()
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        sockets = [FakeSocket(on_event) for _ in range(count)]
+        tasks = [
+            asyncio.ensure_future(serve_lobby(hosted_id, user_id, sock.receive, sock.send))
+            for user_id, sock in enumerate(sockets, start=1)
+        ]
+        while broker.subscriber_count(channel) < count:
+            await asyncio.sleep(0.01)
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        latencies = []
+        for seq in range(events):
+            delivered = 0
+            arrivals.clear()
+            all_delivered.clear()
+            # publish from a worker thread, the way a sync Django view does
+            sent = await loop.run_in_executor(None, self.publish, broker, channel, seq)
+            await all_delivered.wait()
+            latencies.extend((arrival - sent) * 1000 for arrival in arrivals)
+
+        for sock in sockets:
+            sock.disconnect()
+        await asyncio.gather(*tasks)
+
+        latencies.sort()
+        return {
+            'memory': memory,
+            'p50': statistics.median(latencies),
+            'p99': latencies[int(len(latencies) * 0.99) - 1],
+            'max': latencies[-1],
+        }
+
+    @staticmethod
+    def publish(broker, channel, seq):
+        sent = time.perf_counter()
+        broker.publish(channel, {'event': 'joined', 'username': f'player{seq}'})
+        return sent
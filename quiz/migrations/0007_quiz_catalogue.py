@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_title_keys(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    quizzes = list(Quiz.objects.only('id', 'title'))
+    for quiz in quizzes:
+        quiz.title_key = quiz.title.lower()
+    Quiz.objects.bulk_update(quizzes, ['title_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_answer_image_question_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='title_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['is_active', '-id'], name='quiz_catalogue'),
+        ),
+        migrations.RunPython(fill_title_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+import secrets
+import string
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+def resolve_case_clashes(apps, schema_editor):
+    """Codes that only differ in case can't stay once lookups ignore case."""
+    Quiz = apps.get_model('quiz', 'Quiz')
+    seen = set()
+    for quiz in Quiz.objects.exclude(code=None).order_by('id'):
+        if quiz.code.upper() in seen:
+            # the older quiz keeps the code
+            quiz.code = None
+            quiz.save(update_fields=['code'])
+        else:
+            seen.add(quiz.code.upper())
+
+    HostedGame = apps.get_model('quiz', 'HostedGame')
+    seen = set()
+    for game in HostedGame.objects.order_by('id'):
+        code = game.run_code.upper()
+        while code in seen:
+            code = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+        if code != game.run_code.upper():
+            game.run_code = code
+            game.save(update_fields=['run_code'])
+        seen.add(code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_quiz_catalogue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_case_clashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'order'], name='question_quiz_order'),
+        ),
+        migrations.AddConstraint(
+            model_name='hostedgame',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('run_code'), name='hostedgame_run_code_upper', violation_error_message='Лобі з таким кодом уже існує'),
+        ),
+        migrations.AddConstraint(
+            model_name='quiz',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('code'), name='quiz_code_upper', violation_error_message='Вікторина з таким кодом уже існує'),
+        ),
+    ]
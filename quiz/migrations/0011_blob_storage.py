@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:48
+
+import quiz.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=quiz.storage.get_blob_storage, upload_to='answers/%Y/%m/%d/', verbose_name='Зображення відповіді'),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=quiz.storage.get_blob_storage, upload_to='questions/%Y/%m/%d/', verbose_name='Зображення питання'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='scoring_mode',
+            field=models.CharField(choices=[('flat', 'Бал за правильну відповідь'), ('linear', 'Більше балів за швидкість')], default='flat', max_length=10, verbose_name='Нарахування балів'),
+        ),
+    ]
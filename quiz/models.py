@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Upper
+
+from .storage import get_blob_storage
 # Create your models here.
 class Quiz(models.Model):
     title = models.CharField(max_length=200, verbose_name="Назва вікторини")
@@ -14,19 +17,51 @@ class Quiz(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Активна")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата створення")
     time_limit = models.DurationField(null=True, blank=True, verbose_name="Обмеження часу")
+    # how answers are scored, see quiz/scoring.py
+    SCORING_CHOICES = (
+        ('flat', 'Бал за правильну відповідь'),
+        ('linear', 'Більше балів за швидкість'),
+    )
+    scoring_mode = models.CharField(max_length=10, choices=SCORING_CHOICES, default='flat', verbose_name="Нарахування балів")
+    # lower-cased title for prefix search in the catalogue (SQLite's LOWER() is ASCII-only)
+    title_key = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
     
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the code as stored, so a changed code can be dropped from quiz.codes
+        instance._loaded_code = instance.__dict__.get('code')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.title_key = self.title.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'title' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'title_key'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Вікторина"
         verbose_name_plural = "Вікторини"
+        indexes = [
+            models.Index(fields=['is_active', '-id'], name='quiz_catalogue'),
+        ]
+        constraints = [
+            # codes are typed in any case and looked up via UPPER(code)
+            models.UniqueConstraint(Upper('code'), name='quiz_code_upper', violation_error_message='Вікторина з таким кодом уже існує'),
+        ]
 
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE, verbose_name="Вікторина")
     text = models.TextField(verbose_name="Текст питання")
     # Optional image for the question
-    image = models.ImageField(upload_to='questions/%Y/%m/%d/', null=True, blank=True, verbose_name='Зображення питання')
+    # stored by content hash, see quiz/storage.py (upload_to is not used for the name)
+    image = models.ImageField(upload_to='questions/%Y/%m/%d/', storage=get_blob_storage, null=True, blank=True, verbose_name='Зображення питання')
+    # resized WebP/JPEG copies of `image`, filled in by quiz/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     order = models.PositiveIntegerField(verbose_name="Порядок питання")
     
     def __str__(self):
@@ -36,12 +71,16 @@ class Question(models.Model):
         verbose_name = "Питання"
         verbose_name_plural = "Питання"
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['quiz', 'order'], name='question_quiz_order'),
+        ]
 
 class Answer(models.Model):
     question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE, verbose_name="Питання")
     text = models.CharField(max_length=500, verbose_name="Текст відповіді")
     # Optional image for the answer
-    image = models.ImageField(upload_to='answers/%Y/%m/%d/', null=True, blank=True, verbose_name='Зображення відповіді')
+    image = models.ImageField(upload_to='answers/%Y/%m/%d/', storage=get_blob_storage, null=True, blank=True, verbose_name='Зображення відповіді')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_correct = models.BooleanField(default=False, verbose_name="Правильна відповідь")
     
     def __str__(self):
@@ -55,10 +94,19 @@ class HostedGame(models.Model):
     is_started = models.BooleanField(default=False)
     is_closed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # the round being played (see quiz/rounds.py); past the last question once finished
+    current_order = models.PositiveIntegerField(null=True, blank=True)
+    round_started_at = models.DateTimeField(null=True, blank=True)
+    round_deadline = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Hosted {self.quiz.title} ({self.run_code})"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Upper('run_code'), name='hostedgame_run_code_upper', violation_error_message='Лобі з таким кодом уже існує'),
+        ]
+
 
 class HostedParticipant(models.Model):
     hosted_game = models.ForeignKey(HostedGame, related_name='participants', on_delete=models.CASCADE)
@@ -75,3 +123,20 @@ class HostedParticipant(models.Model):
     
 
 
+
+
+class CodeSequence(models.Model):
+    """Counter behind the join-code allocator (see quiz/codes.py).
+
+    `key` seeds the permutation that turns numbers into codes; it is made once
+    with the row and must never change, or new codes could repeat old ones.
+    """
+    name = models.CharField(max_length=20, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+    key = models.CharField(max_length=64)
+
+
+class RecycledCode(models.Model):
+    """A lobby code given back by a closed or finished hosted game."""
+    code = models.CharField(max_length=8, primary_key=True)
+    released_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,141 @@
+"""Publish/subscribe used to push hosted-lobby events to websocket clients.
+
+Views publish plain dicts from ordinary (sync) request threads; websocket
+handlers (see `quiz.websocket`) subscribe from the asyncio loop of the ASGI
+server. The broker class is chosen with the `LOBBY_BROKER` setting:
+
+* `quiz.realtime.InMemoryBroker` (default) fans out inside one process.
+* `quiz.realtime.RedisBroker` relays every event through Redis pub/sub so all
+  workers behind a load balancer see it. It needs the `redis` package and takes
+  its connection URL from `LOBBY_BROKER_OPTIONS = {'url': ...}`.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def _put_all(queues, message):
+    for queue in queues:
+        queue.put_nowait(message)
+
+
+class InMemoryBroker:
+    """Fan events out to subscribers living in this process.
+
+    Every subscriber is an `asyncio.Queue` tied to the loop that created it;
+    `publish` is safe to call from any thread.
+    """
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        """Return a queue receiving every message published on `channel`.
+
+        Must be called from inside a running event loop.
+        """
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add((loop, queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if not subscribers:
+                return
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        by_loop = {}
+        with self._lock:
+            for loop, queue in self._subscribers.get(channel, ()):
+                by_loop.setdefault(loop, []).append(queue)
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, queues in by_loop.items():
+            if loop is current:
+                _put_all(queues, message)
+            elif not loop.is_closed():
+                # one wake-up per loop, not per subscriber
+                loop.call_soon_threadsafe(_put_all, queues, message)
+
+
+class RedisBroker(InMemoryBroker):
+    """Relay events through Redis so several worker processes share them.
+
+    Each process keeps one Redis subscription (on a background thread) and fans
+    incoming events out to its own websocket clients in memory.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='zapquiz:', **options):
+        import redis
+
+        super().__init__()
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._listener = None
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, message):
+        self._redis.publish(self._prefix + channel, json.dumps(message))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='lobby-broker', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self._prefix + '*')
+        for item in pubsub.listen():
+            channel = item['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            self._deliver(channel[len(self._prefix):], json.loads(item['data']))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = import_string(getattr(settings, 'LOBBY_BROKER', 'quiz.realtime.InMemoryBroker'))
+                _broker = broker_class(**getattr(settings, 'LOBBY_BROKER_OPTIONS', {}))
+    return _broker
+
+
+def lobby_channel(hosted_id):
+    return f'lobby:{hosted_id}'
+
+
+def publish_lobby_event(hosted_id, event, **data):
+    """Broadcast a lobby event once the current transaction commits."""
+    message = {'event': event, **data}
+    transaction.on_commit(lambda: get_broker().publish(lobby_channel(hosted_id), message))
@@ -0,0 +1,209 @@
+"""Server-side question timeline of hosted games.
+
+A started `HostedGame` is always on exactly one round: the question being
+played (`current_order`), when it was shown and when answers stop being
+accepted. The host moves the game forward (`advance`); every transition is
+written to the game row, cached, and pushed to all participants at once as a
+lobby event::
+
+    {"event": "question", "order": 3, "number": 2, "total": 10,
+     "question_id": 17, "deadline": <unix time>, "server_time": <unix time>}
+    {"event": "finished"}
+
+Clients count down from ``deadline - server_time`` instead of their own clock.
+Once the last round closes every session of the game is finished
+(`results.finalize.finalize_hosted`), whether or not its player looks at the
+results.
+
+Rounds only ever move forward and a deadline never moves, so a worker can turn
+away a late answer from the round it last saw without touching the cache or the
+database (`accepts`); only answers that look valid are checked against the
+shared state. Keeping a room costs one small `Round` per process, no timers or
+threads, so a single worker can run many rooms. A process remembers the rounds
+of at most `HOSTED_ROUND_LRU_SIZE` games and forgets a game once it finishes;
+after that its answers are turned away by the cached state.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from results import finalize
+from . import codes
+from .compiled import get_compiled_quiz
+from .models import HostedGame
+from .realtime import publish_lobby_event
+
+
+CACHE_KEY = 'hosted-round:{hosted_id}'
+CACHE_TIMEOUT = 6 * 60 * 60
+
+
+@dataclass(frozen=True)
+class Round:
+    hosted_id: int
+    # order of the current question; past the last one once the game is over
+    order: int
+    question_id: object = None
+    number: int = 0
+    total: int = 0
+    started_at: float = 0.0
+    deadline: float = 0.0
+
+    @property
+    def finished(self):
+        return self.question_id is None
+
+    @property
+    def remaining(self):
+        return max(0.0, self.deadline - time.time()) if not self.finished else 0.0
+
+    def is_open(self, now=None):
+        now = time.time() if now is None else now
+        return not self.finished and now <= self.deadline + settings.HOSTED_ROUND_GRACE
+
+    def as_event(self):
+        if self.finished:
+            return {'event': 'finished'}
+        return {
+            'event': 'question',
+            'order': self.order,
+            'number': self.number,
+            'total': self.total,
+            'question_id': self.question_id,
+            'deadline': self.deadline,
+            'server_time': time.time(),
+        }
+
+
+_rounds = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(state):
+    """Keep the newest round seen by this process; a finished game is dropped."""
+    with _lock:
+        known = _rounds.get(state.hosted_id)
+        if known is not None and (state.order, state.started_at) < (known.order, known.started_at):
+            return
+        if state.finished:
+            _rounds.pop(state.hosted_id, None)
+            return
+        _rounds[state.hosted_id] = state
+        _rounds.move_to_end(state.hosted_id)
+        while len(_rounds) > settings.HOSTED_ROUND_LRU_SIZE:
+            _rounds.popitem(last=False)
+
+
+def forget(hosted_id=None):
+    with _lock:
+        if hosted_id is None:
+            _rounds.clear()
+        else:
+            _rounds.pop(hosted_id, None)
+
+
+def round_seconds(compiled):
+    if compiled.time_limit:
+        return compiled.time_limit.total_seconds()
+    return settings.HOSTED_ROUND_SECONDS
+
+
+def _build(hosted, compiled):
+    if hosted.current_order is None:
+        return None
+    question = compiled.question(hosted.current_order)
+    orders = sorted(compiled.by_order)
+    return Round(
+        hosted_id=hosted.id,
+        order=hosted.current_order,
+        question_id=question.id if question else None,
+        number=orders.index(question.order) + 1 if question else len(orders),
+        total=len(orders),
+        started_at=hosted.round_started_at.timestamp() if hosted.round_started_at else 0.0,
+        deadline=hosted.round_deadline.timestamp() if hosted.round_deadline else 0.0,
+    )
+
+
+def current_round(hosted_id):
+    """The game's current `Round` (None before it starts), from the cache or the database."""
+    data = cache.get(CACHE_KEY.format(hosted_id=hosted_id))
+    if data is not None:
+        state = Round(**data)
+    else:
+        hosted = HostedGame.objects.filter(id=hosted_id).first()
+        if hosted is None:
+            return None
+        state = _build(hosted, get_compiled_quiz(hosted.quiz_id))
+        if state is None:
+            return None
+        cache.set(CACHE_KEY.format(hosted_id=hosted_id), asdict(state), CACHE_TIMEOUT)
+    _remember(state)
+    return state
+
+
+def accepts(hosted_id, order, now=None):
+    """Whether an answer to the question at `order` is still on time."""
+    now = time.time() if now is None else now
+    with _lock:
+        seen = _rounds.get(hosted_id)
+    if seen is not None and (order < seen.order or (order == seen.order and not seen.is_open(now))):
+        # that round is over for good, no need to ask anybody
+        return False
+    state = current_round(hosted_id)
+    return state is not None and state.order == order and state.is_open(now)
+
+
+def _open(hosted, order, compiled):
+    """Move the game from its current round to `order`; False if someone else already did."""
+    question = compiled.question(order)
+    now = timezone.now()
+    deadline = now + timedelta(seconds=round_seconds(compiled)) if question else None
+    moved = HostedGame.objects.filter(id=hosted.id, current_order=hosted.current_order).update(
+        current_order=order, round_started_at=now, round_deadline=deadline,
+    )
+    if not moved:
+        return False
+    hosted.current_order, hosted.round_started_at, hosted.round_deadline = order, now, deadline
+    state = _build(hosted, compiled)
+
+    def announce():
+        cache.set(CACHE_KEY.format(hosted_id=hosted.id), asdict(state), CACHE_TIMEOUT)
+        _remember(state)
+
+    transaction.on_commit(announce)
+    if state.finished:
+        # nobody needs to join any more, the lobby code can go to another game
+        transaction.on_commit(lambda: codes.retire(hosted.id))
+        # players who never open their results page still get them, and their place on the leaderboard
+        transaction.on_commit(lambda: finalize.finalize_hosted(hosted.id))
+    publish_lobby_event(hosted.id, **state.as_event())
+    return True
+
+
+def start(hosted):
+    """Open the first round; call from the transaction that starts the game."""
+    compiled = get_compiled_quiz(hosted.quiz_id)
+    first = min(compiled.by_order, default=1)
+    return _open(hosted, first, compiled)
+
+
+def advance(hosted):
+    """Show the next question, or finish the game after the last one.
+
+    Safe against double clicks: only the request that still sees the current
+    round moves the game on.
+    """
+    if hosted.current_order is None:
+        return False
+    compiled = get_compiled_quiz(hosted.quiz_id)
+    if compiled.question(hosted.current_order) is None:
+        return False
+    with transaction.atomic():
+        return _open(hosted, compiled.next_order(hosted.current_order), compiled)
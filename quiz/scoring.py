@@ -0,0 +1,39 @@
+"""How many points an answer is worth.
+
+A quiz picks one of these with `Quiz.scoring_mode`:
+
+* ``flat``: one point per correct answer, however long it took;
+* ``linear``: a correct answer given at once earns `SPEED_POINTS`, and the
+  points go down linearly over the question's time (`rounds.round_seconds`),
+  to half of them at the limit and after it.
+
+A wrong answer is worth nothing in every mode, and a correct one at least one
+point. Answers whose response time is unknown count as given at the limit.
+"""
+from .rounds import round_seconds
+
+
+SPEED_POINTS = 1000
+
+
+def flat(quiz, seconds):
+    return 1
+
+
+def linear(quiz, seconds):
+    limit = round_seconds(quiz)
+    late = 1.0 if seconds is None or not limit else min(1.0, seconds / limit)
+    return round(SPEED_POINTS * (1 - late / 2))
+
+
+MODES = {
+    'flat': flat,
+    'linear': linear,
+}
+
+
+def score(quiz, answer, seconds):
+    """Points for `answer` of the compiled `quiz`, given `seconds` after its question was shown."""
+    if not quiz.is_correct(answer):
+        return 0
+    return max(1, MODES.get(quiz.scoring_mode, flat)(quiz, seconds))
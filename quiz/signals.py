@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Quiz, Question, Answer, HostedGame
+from .catalogue import invalidate_catalogue
+from .codes import invalidate as invalidate_codes
+from .compiled import invalidate_compiled_quiz
+from .images import needs_variants, schedule_variants
+
+
+def _invalidate_on_commit(quiz_id):
+    if quiz_id is not None:
+        # wait for the commit so nobody rebuilds the snapshot from uncommitted rows
+        transaction.on_commit(lambda: invalidate_compiled_quiz(quiz_id))
+
+
+def _forget_codes(kind, *codes):
+    # right away for this transaction, and again once committed in case
+    # someone cached the old state in between
+    invalidate_codes(kind, *codes)
+    transaction.on_commit(lambda: invalidate_codes(kind, *codes))
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.id)
+    transaction.on_commit(invalidate_catalogue)
+    # the code may have changed, been taken or freed, or the quiz (de)activated
+    _forget_codes('quiz', getattr(instance, '_loaded_code', None), instance.code)
+    instance._loaded_code = instance.code
+
+
+@receiver([post_save, post_delete], sender=HostedGame)
+def hosted_game_changed(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        # a new lobby code may be remembered as unknown, a deleted one must stop resolving
+        _forget_codes('hosted', instance.run_code)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.quiz_id)
+    # question counts are shown in the catalogue
+    transaction.on_commit(invalidate_catalogue)
+    if kwargs['signal'] is post_save and needs_variants(instance):
+        schedule_variants(Question, instance.id)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    # formsets and cascades usually have the question cached already
+    question = Answer._meta.get_field('question').get_cached_value(instance, default=None)
+    if question is not None:
+        quiz_id = question.quiz_id
+    else:
+        quiz_id = Question.objects.filter(id=instance.question_id).values_list('quiz_id', flat=True).first()
+    _invalidate_on_commit(quiz_id)
+    if kwargs['signal'] is post_save and needs_variants(instance):
+        schedule_variants(Answer, instance.id)
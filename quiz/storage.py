@@ -0,0 +1,244 @@
+"""Content-addressed storage for question and answer images.
+
+Uploads are stored by the SHA-256 of their bytes, whatever they were called::
+
+    blobs/3f/3f8a...c2.png
+
+so the same logo uploaded to a hundred quizzes is one file on disk and one
+entry in every cache in front of it. A blob never changes once written, which
+is why `media_blob` can serve blobs (and the variants derived from them, see
+quiz/images.py) with far-future ``immutable`` cache headers.
+
+A blob is shared by every row pointing at it. The rows themselves are the
+reference count (`references`), which stays right through the bulk inserts of
+quiz creation and archive import, which send no signals. Deleting a row never
+deletes its file: an upload of the same bytes may be about to use it again, and
+whether it does only shows once that upload commits. Files no row refers to are
+removed by ``manage.py dedupe_media --gc`` (`collect_garbage`, run it from
+cron), which leaves files used within the last `min_age` seconds alone; saving
+a blob that exists already marks it as used (`keep_alive`).
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_DIR = 'blobs'
+COLLECT_PREFIX = '.collect-'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# what `media_blob` serves, by extension; uploads are limited to these (quiz/forms.py)
+MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+
+def blob_name(digest, ext=''):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{ext.lower()}'
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    """`FileSystemStorage` that names files by their content (see module docs)."""
+
+    def name_for(self, name, content):
+        """The blob name `content` (a `File`) is stored under."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        ext = os.path.splitext(name)[1]
+        # keep the extension only when it's a sane one, it ends up in URLs
+        if not (ext[1:].isalnum() and len(ext) <= 6):
+            ext = ''
+        return blob_name(digest.hexdigest(), ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self._save(self.name_for(name, content), content)
+
+    def _save(self, name, content):
+        if keep_alive(self, name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # write aside and rename: a concurrent upload of the same bytes just
+        # replaces the file with an identical one, readers never see half of it
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks():
+                    fh.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # the name is the content, an existing file is the same file
+        return name
+
+
+blob_storage = BlobStorage()
+
+
+def get_blob_storage():
+    """Storage callable of the image fields (keeps migrations free of settings)."""
+    return blob_storage
+
+
+def references(name):
+    """How many question and answer rows use the file `name`."""
+    from .models import Question, Answer
+
+    return Question.objects.filter(image=name).count() + Answer.objects.filter(image=name).count()
+
+
+def keep_alive(storage, name):
+    """Mark the file `name` as just used, so `collect_garbage` leaves it alone; False if there is none."""
+    try:
+        os.utime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def referenced_names():
+    """Every file name used by a question or answer image."""
+    from .models import Question, Answer
+
+    names = set()
+    for model in (Question, Answer):
+        names.update(model.objects.exclude(Q(image='') | Q(image__isnull=True)).values_list('image', flat=True).distinct())
+    return names
+
+
+def dedupe_legacy(dry_run=False):
+    """Move images stored under their upload names into blobs and repoint the rows.
+
+    Returns counters for the command to report.
+    """
+    from .compiled import invalidate_compiled_quiz
+    from .models import Question, Answer
+
+    stats = {'files': 0, 'blobs_written': 0, 'blobs_reused': 0, 'rows': 0, 'missing': 0, 'bytes_freed': 0}
+    moved = set()
+    quiz_ids = set()
+    for model in (Question, Answer):
+        legacy = (
+            model.objects.exclude(Q(image='') | Q(image__isnull=True) | Q(image__startswith=f'{BLOB_DIR}/'))
+            .values_list('image', flat=True).distinct()
+        )
+        for old in list(legacy):
+            if not blob_storage.exists(old):
+                stats['missing'] += 1
+                continue
+            stats['files'] += 1
+            with blob_storage.open(old, 'rb') as fh:
+                new = blob_storage.name_for(old, fh)
+                if blob_storage.exists(new):
+                    stats['blobs_reused'] += 1
+                    stats['bytes_freed'] += blob_storage.size(old)
+                else:
+                    stats['blobs_written'] += 1
+                    if not dry_run:
+                        blob_storage.save(old, fh)
+            rows = list(model.objects.filter(image=old))
+            stats['rows'] += len(rows)
+            if dry_run:
+                continue
+            for row in rows:
+                row.image.name = new
+                if row.image_variants.get('source') == old:
+                    row.image_variants['source'] = new
+            with transaction.atomic():
+                model.objects.bulk_update(rows, ['image', 'image_variants'], batch_size=500)
+            moved.add(old)
+            if model is Question:
+                quiz_ids.update(row.quiz_id for row in rows)
+            else:
+                quiz_ids.update(Question.objects.filter(answers__in=rows).values_list('quiz_id', flat=True))
+
+    for old in moved:
+        if not references(old):
+            blob_storage.delete(old)
+    for quiz_id in quiz_ids:
+        invalidate_compiled_quiz(quiz_id)
+    return stats
+
+
+def _walk(directory):
+    root = blob_storage.path(directory)
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, blob_storage.location).replace(os.sep, '/'), path
+
+
+def _collect(path, deadline):
+    """Delete `path` unless it was used after `deadline` after all; True if it was deleted."""
+    # move it aside first: an upload from now on finds no file and writes it
+    # again, one that reused it just before shows in the mtime
+    aside = os.path.join(os.path.dirname(path), COLLECT_PREFIX + os.path.basename(path))
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return False
+    if os.stat(aside).st_mtime > deadline:
+        os.replace(aside, path)
+        return False
+    os.unlink(aside)
+    return True
+
+
+def collect_garbage(min_age=3600, dry_run=False):
+    """Delete blobs and variants no row refers to; returns ``(files, bytes)``.
+
+    Files used within the last `min_age` seconds are left alone, they may
+    belong to an upload whose transaction hasn't committed yet.
+    """
+    from .models import Question, Answer
+
+    keep = referenced_names()
+    for model in (Question, Answer):
+        for variants in model.objects.exclude(image_variants={}).values_list('image_variants', flat=True).iterator():
+            for key in ('webp', 'jpeg'):
+                keep.update(name for _, name in variants.get(key, ()))
+
+    deadline = time.time() - min_age
+    removed = freed = 0
+    for directory in (BLOB_DIR, 'questions/variants', 'answers/variants'):
+        for name, path in _walk(directory):
+            head, filename = os.path.split(path)
+            if filename.startswith(COLLECT_PREFIX):
+                # left behind by a collection that died halfway
+                original = os.path.join(head, filename[len(COLLECT_PREFIX):])
+                if os.path.relpath(original, blob_storage.location).replace(os.sep, '/') in keep and not dry_run:
+                    os.replace(path, original)
+                    continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name in keep or stat.st_mtime > deadline:
+                continue
+            if dry_run or _collect(path, deadline):
+                removed += 1
+                freed += stat.st_size
+    return removed, freed
@@ -0,0 +1,76 @@
+from django import template
+from django.utils.html import format_html, format_html_join, json_script
+from django.utils.safestring import mark_safe
+
+from quiz.images import image_sources, question_media
+
+register = template.Library()
+
+PREFETCH_SCRIPT = '''<script>
+(function () {
+    var items = JSON.parse(document.getElementById('next-question-media').textContent);
+    function prefetch() {
+        items.forEach(function (item) {
+            // a detached <picture> makes the browser pick the same candidate the next page will
+            var picture = document.createElement('picture');
+            if (item.webp) {
+                var source = document.createElement('source');
+                source.type = 'image/webp';
+                source.sizes = item.sizes;
+                source.srcset = item.webp;
+                picture.appendChild(source);
+            }
+            var img = document.createElement('img');
+            picture.appendChild(img);
+            if (item.jpeg) {
+                img.sizes = item.sizes;
+                img.srcset = item.jpeg;
+            }
+            img.src = item.src;
+        });
+    }
+    // only once this question is on screen, it must not compete with its own images
+    if (window.requestIdleCallback) {
+        window.addEventListener('load', function () { requestIdleCallback(prefetch, {timeout: 2000}); });
+    } else {
+        window.addEventListener('load', function () { setTimeout(prefetch, 200); });
+    }
+})();
+</script>'''
+
+
+@register.simple_tag
+def responsive_image(url, variants=None, alt='', sizes='100vw', css_class='', style='', loading='lazy'):
+    """Render a <picture> with WebP and JPEG srcsets built by quiz/images.py.
+
+    `sizes` is a ``sizes`` attribute or one of the presets in `quiz.images.SIZES`. Falls back
+    to a plain <img> of `url` while the variants are not ready (or the image
+    couldn't be processed). Pass ``loading="eager"`` for images that are on
+    screen right away.
+    """
+    if not url:
+        return ''
+    source = image_sources(url, variants, sizes)
+    attrs = format_html_join('', ' {}="{}"', [(k, v) for k, v in (('class', css_class), ('style', style)) if v])
+    if not source['webp']:
+        return format_html('<img src="{}" alt="{}" loading="{}"{}>', url, alt, loading, attrs)
+    variants = variants or {}
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        source['webp'], source['sizes'],
+        source['src'], source['jpeg'], source['sizes'],
+        variants.get('width', ''), variants.get('height', ''), alt, loading, attrs,
+    )
+
+
+@register.simple_tag
+def prefetch_question_media(question):
+    """Let the browser fetch the images of `question` (the next one) while the player thinks.
+
+    Renders nothing when the question has no images.
+    """
+    media = question_media(question)
+    if not media:
+        return ''
+    return json_script(media, 'next-question-media') + mark_safe(PREFETCH_SCRIPT)
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.functions import Upper
+from django.template import Context, Template
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from results import leaderboard
+from results.models import LeaderboardScore, PlayerAnswer, QuizSession
+from users.models import UserProfile
+from . import catalogue, codes, dashboard, rounds, storage, views
+from .archive import ArchiveError, import_archive, write_archive
+from .bench import isolated_database
+from .compiled import get_compiled_quiz
+from .models import Quiz, Question, Answer, HostedGame, HostedParticipant
+from .websocket import websocket_application
+
+
+class CompiledQuizTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123')
+        self.q1 = Question.objects.create(quiz=self.quiz, text='First', order=1)
+        self.right = Answer.objects.create(question=self.q1, text='yes', is_correct=True)
+        Answer.objects.create(question=self.q1, text='no')
+        # gap in the ordering on purpose
+        self.q2 = Question.objects.create(quiz=self.quiz, text='Second', order=5)
+        Answer.objects.create(question=self.q2, text='a', is_correct=True)
+        self.session = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        self.client.force_login(self.user)
+
+    def test_snapshot_content(self):
+        compiled = get_compiled_quiz(self.quiz.id)
+        self.assertEqual([q.order for q in compiled.questions], [1, 5])
+        self.assertEqual(compiled.next_order(1), 5)
+        self.assertEqual(compiled.next_order(5), 6)
+        self.assertTrue(compiled.is_correct(compiled.answers[self.right.id]))
+
+    def test_play_loop_does_not_query_content(self):
+        question_url = reverse('quiz_question', args=[self.session.id, 1])
+        submit_url = reverse('submit_answer', args=[self.session.id, self.q1.id])
+        self.client.get(question_url)  # warm the cache
+
+        # django session + user + quiz session
+        with self.assertNumQueries(3):
+            self.client.get(question_url)
+        # django session + user + quiz session + answered check + savepoint, answer insert, score update, release
+        with self.assertNumQueries(8):
+            response = self.client.post(submit_url, {'answer_id': self.right.id})
+        self.assertRedirects(response, reverse('quiz_question', args=[self.session.id, 5]), fetch_redirect_response=False)
+
+    def test_json_play_api(self):
+        payload_url = reverse('play_quiz_payload', args=[self.quiz.id])
+        response = self.client.get(payload_url)
+        payload = response.json()
+        self.assertEqual([q['order'] for q in payload['questions']], [1, 5])
+        self.assertNotIn('is_correct', response.content.decode())
+        self.assertEqual(self.client.get(payload_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.client.get(reverse('play_session', args=[self.session.id]))
+        answer_url = reverse('play_answer', args=[self.session.id])
+        # django session + user + quiz session + answered check + savepoint, answer insert, score update, release;
+        # no redirect and no render
+        with self.assertNumQueries(8):
+            data = self.client.post(answer_url, {'question_id': self.q1.id, 'answer_id': self.right.id}, content_type='application/json').json()
+        self.assertEqual(data, {'is_correct': True, 'score': 1, 'next_question': 5, 'finished': False})
+        data = self.client.post(answer_url, {'question_id': self.q2.id, 'answer_id': self.right.id}, content_type='application/json')
+        self.assertEqual(data.status_code, 400)
+        # time ran out on the last question
+        data = self.client.post(answer_url, {'question_id': self.q2.id, 'answer_id': None}, content_type='application/json').json()
+        self.assertEqual((data['score'], data['finished']), (0, True))
+
+        page = self.client.get(reverse('play_session', args=[self.session.id]))
+        self.assertEqual(page.context['state']['answered'], [self.q1.id])
+
+    def test_json_play_api_takes_one_answer_per_current_question(self):
+        q3 = Question.objects.create(quiz=self.quiz, text='Third', order=7)
+        Answer.objects.create(question=q3, text='a', is_correct=True)
+        self.client.get(reverse('play_session', args=[self.session.id]))
+        answer_url = reverse('play_answer', args=[self.session.id])
+
+        def post(question, answer_id):
+            return self.client.post(answer_url, {'question_id': question.id, 'answer_id': answer_id}, content_type='application/json')
+
+        # the player is on the first question, the third one isn't up yet
+        self.assertEqual(post(q3, q3.answers.get().id).status_code, 409)
+        self.assertEqual(post(self.q1, self.right.id).status_code, 200)
+        self.assertEqual(post(self.q1, self.right.id).status_code, 409)
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.playeranswer_set.count(), self.session.total_score), (1, 1))
+
+        # the mark is gone: the first question not answered yet is current
+        cache.clear()
+        self.assertEqual(post(self.q1, self.right.id).status_code, 409)
+        self.assertEqual(post(q3, q3.answers.get().id).status_code, 200)
+
+    def test_edits_invalidate_snapshot(self):
+        self.assertEqual(get_compiled_quiz(self.quiz.id).by_order[1].text, 'First')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.q1.text = 'Changed'
+            self.q1.save()
+        self.assertEqual(get_compiled_quiz(self.quiz.id).by_order[1].text, 'Changed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.right.is_correct = False
+            self.right.save()
+        compiled = get_compiled_quiz(self.quiz.id)
+        self.assertFalse(compiled.is_correct(compiled.answers[self.right.id]))
+
+    def test_finished_session_takes_no_answers(self):
+        self.client.get(reverse('quiz_question', args=[self.session.id, 6]))
+        response = self.client.post(reverse('submit_answer', args=[self.session.id, self.q1.id]), {'answer_id': self.right.id})
+        self.assertRedirects(response, reverse('quiz_question', args=[self.session.id, 6]), fetch_redirect_response=False)
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.total_score, self.session.playeranswer_set.exists()), (0, False))
+
+    def test_answer_from_other_question_is_rejected(self):
+        submit_url = reverse('submit_answer', args=[self.session.id, self.q2.id])
+        response = self.client.post(submit_url, {'answer_id': self.right.id})
+        self.assertContains(response, 'Answer not found')
+        self.assertFalse(self.session.playeranswer_set.exists())
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('player', password='pass12345')
+        self.client.force_login(self.user)
+        for i in range(30):
+            quiz = Quiz.objects.create(title=f'Київ {i}' if i % 2 else f'Львів {i}', creator=self.user)
+            Question.objects.create(quiz=quiz, text='Q', order=1)
+
+    def test_page_is_one_query_and_paginates(self):
+        catalogue.invalidate_catalogue()
+        with self.assertNumQueries(1):
+            first, cursor = catalogue.get_page(size=20)
+        with self.assertNumQueries(0):
+            catalogue.get_page(size=20)
+        rest, last_cursor = catalogue.get_page(before=cursor, size=20)
+        self.assertEqual(len(first) + len(rest), 30)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(first[0]['question_count'], 1)
+        self.assertEqual(first[0]['player_count'], 0)
+
+    def test_search_and_invalidation(self):
+        response = self.client.get(reverse('quiz_list'), {'q': 'київ'})
+        self.assertEqual(len(response.context['quizzes']), 15)
+        with self.captureOnCommitCallbacks(execute=True):
+            Quiz.objects.get(title='Київ 1').delete()
+        response = self.client.get(reverse('quiz_list'), {'q': 'КИЇВ'})
+        self.assertEqual(len(response.context['quizzes']), 14)
+        response = self.client.get(reverse('quiz_list'), {'q': 'київ 2', 'author': 'player'})
+        self.assertEqual([q['title'] for q in response.context['quizzes']], ['Київ 29', 'Київ 27', 'Київ 25', 'Київ 23', 'Київ 21'])
+        response = self.client.get(reverse('quiz_list'), {'author': 'nobody'})
+        self.assertEqual(list(response.context['quizzes']), [])
+
+
+class JoinCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        codes.clear_local()
+        self.user = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123', creator=self.user)
+        self.client.force_login(self.user)
+
+    def test_hits_and_misses_are_remembered(self):
+        self.assertEqual(codes.resolve('quiz', ' abc123 '), self.quiz.id)
+        self.assertIsNone(codes.resolve('quiz', 'NOPE00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(codes.resolve('quiz', 'Abc123'), self.quiz.id)
+            self.assertIsNone(codes.resolve('quiz', 'nope00'))
+            self.assertIsNone(codes.resolve('quiz', 'X' * 20))
+        # another process: nothing local, the shared cache still answers
+        codes.clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(codes.resolve('quiz', 'ABC123'), self.quiz.id)
+
+        # django session + user + quiz session insert
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('index'), {'code': 'abc123'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_changes_are_picked_up(self):
+        self.assertIsNone(codes.resolve('hosted', 'RUN123'))
+        hosted = HostedGame.objects.create(quiz=self.quiz, host=self.user, run_code='RUN123')
+        self.assertEqual(codes.resolve('hosted', 'run123'), hosted.id)
+
+        codes.resolve('quiz', 'ABC123')
+        quiz = Quiz.objects.get(id=self.quiz.id)
+        quiz.code = 'NEW123'
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz.save()
+        self.assertIsNone(codes.resolve('quiz', 'ABC123'))
+        self.assertEqual(codes.resolve('quiz', 'NEW123'), quiz.id)
+        quiz.is_active = False
+        quiz.save()
+        self.assertIsNone(codes.resolve('quiz', 'NEW123'))
+
+
+class CodeAllocatorTests(TransactionTestCase):
+    def setUp(self):
+        codes.reset_allocator()
+
+    def test_threads_never_get_the_same_code(self):
+        allocators = [codes.CodeAllocator(block_size=7) for _ in range(4)]
+        handed_out = []
+        lock = threading.Lock()
+        gate = threading.Barrier(16)
+
+        def worker(allocator):
+            gate.wait()
+            try:
+                mine = [allocator.allocate() for _ in range(50)]
+            finally:
+                connection.close()
+            with lock:
+                handed_out.extend(mine)
+
+        # four "processes" sharing the database, four threads each; on disk,
+        # where concurrent refills queue for the write lock like in production
+        threads = [threading.Thread(target=worker, args=(allocators[i % 4],)) for i in range(16)]
+        with isolated_database(on_disk=True):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(handed_out), 800)
+        self.assertEqual(len(set(handed_out)), 800)
+        self.assertTrue(all(len(code) == 6 for code in handed_out))
+
+    def test_closed_lobby_codes_are_recycled(self):
+        user = User.objects.create_user('host')
+        quiz = Quiz.objects.create(title='Quiz', creator=user)
+        hosted = codes.create_with_code(HostedGame, 'run_code', quiz=quiz, host=user)
+        code = hosted.run_code
+        self.assertEqual(codes.resolve('hosted', code), hosted.id)
+
+        self.assertTrue(codes.retire(hosted.id))
+        self.assertIsNone(codes.resolve('hosted', code))
+        with override_settings(JOIN_CODE_RECYCLE_AFTER=0):
+            self.assertEqual(codes.CodeAllocator(block_size=5).allocate(), code)
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must be served by an index, never by a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('player')
+        UserProfile.objects.create(user=cls.user)
+        cls.quiz = Quiz.objects.create(title='Quiz', code='ABC123', creator=cls.user)
+        cls.question = Question.objects.create(quiz=cls.quiz, text='Q', order=1)
+        answer = Answer.objects.create(question=cls.question, text='A', is_correct=True)
+        cls.hosted = HostedGame.objects.create(quiz=cls.quiz, host=cls.user, run_code='RUN123')
+        for _ in range(3):
+            session = QuizSession.objects.create(user=cls.user, quiz=cls.quiz, total_score=1)
+            PlayerAnswer.objects.create(session=session, user=cls.user, question=cls.question, selected_answer=answer, score=1)
+        cls.session = session
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # tiny tables are cheaper to scan; we only care that an index *can* serve the query
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def full_scans(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            return re.findall(r'Seq Scan on (\w+)', plan)
+        # SQLite: "SCAN table" without "USING [COVERING] INDEX"
+        return re.findall(r'\bSCAN (\w+)$', plan, re.MULTILINE)
+
+    def test_hot_queries_use_indexes(self):
+        quiz, user = self.quiz, self.user
+        queries = {
+            'join by code': Quiz.objects.alias(code_upper=Upper('code')).filter(code_upper='ABC123', is_active=True),
+            'join hosted game': HostedGame.objects.alias(run_code_upper=Upper('run_code')).filter(run_code_upper='RUN123'),
+            'compiled questions': Question.objects.filter(quiz_id=quiz.id).order_by('order', 'id'),
+            'compiled answers': Answer.objects.filter(question__quiz_id=quiz.id).order_by('id'),
+            'catalogue page': Quiz.objects.filter(is_active=True, id__lt=quiz.id + 1).order_by('-id')[:24],
+            'catalogue search': Quiz.objects.filter(is_active=True, title_key__gte='qu', title_key__lt='qu\uffff').order_by('-id')[:24],
+            'catalogue by author': Quiz.objects.filter(is_active=True, creator__username='player').order_by('-id')[:24],
+            'quiz leaderboard': leaderboard.top(quiz.id),
+            'rank buckets': LeaderboardScore.objects.filter(quiz_id=quiz.id, score__gt=0),
+            'completed sessions': QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False).order_by('-total_score'),
+            'player sessions': QuizSession.objects.filter(user=user, completed_at__isnull=False).order_by('-completed_at'),
+            'session answers': PlayerAnswer.objects.filter(session=self.session),
+            'player answer': PlayerAnswer.objects.filter(user=user, question=self.question),
+            'global leaderboard': UserProfile.objects.order_by('-points_earned', '-average_score')[:20],
+            'lobby participants': HostedParticipant.objects.filter(hosted_game=self.hosted),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(queryset), [], queryset.explain())
+
+
+class LobbyWebsocketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user('host', password='pass12345')
+        self.player = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123', creator=self.host)
+        self.hosted = HostedGame.objects.create(quiz=self.quiz, host=self.host, run_code='RUN001')
+        HostedParticipant.objects.create(hosted_game=self.hosted, user=self.player)
+
+    def start_game(self):
+        client = Client()
+        client.force_login(self.host)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(reverse('host_lobby', args=[self.hosted.id]), {'action': 'start'})
+
+    def test_participant_receives_own_session_on_start(self):
+        self.client.force_login(self.player)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.session.session_key}'.encode()
+        scope = {'type': 'websocket', 'path': f'/ws/host/{self.hosted.id}/lobby/', 'headers': [(b'cookie', cookie)]}
+
+        async def run():
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            await incoming.put({'type': 'websocket.connect'})
+            task = asyncio.ensure_future(websocket_application(scope, incoming.get, outgoing.put))
+            self.assertEqual((await outgoing.get())['type'], 'websocket.accept')
+            status = json.loads((await outgoing.get())['text'])
+            await sync_to_async(self.start_game)()
+            started = json.loads((await asyncio.wait_for(outgoing.get(), 5))['text'])
+            await incoming.put({'type': 'websocket.disconnect'})
+            await task
+            return status, started
+
+        status, started = async_to_sync(run)()
+        self.assertEqual(status['is_started'], False)
+        session_id = HostedParticipant.objects.get(user=self.player).session_id
+        self.assertEqual(started, {'event': 'started', 'session_id': session_id})
+
+    def test_start_is_bulk_and_happens_once(self):
+        for i in range(20):
+            HostedParticipant.objects.create(hosted_game=self.hosted, user=User.objects.create_user(f'p{i}'))
+        get_compiled_quiz(self.quiz.id)
+        # savepoint, flag the game, read players, insert sessions, link participants (one UPDATE per 500), read the map,
+        # open the first round, release
+        with self.assertNumQueries(8):
+            self.assertTrue(views.start_hosted_game(self.hosted))
+        self.assertFalse(views.start_hosted_game(HostedGame.objects.get(id=self.hosted.id)))
+        self.assertEqual(QuizSession.objects.filter(quiz=self.quiz, source='hosted').count(), 21)
+        self.assertFalse(HostedParticipant.objects.filter(session=None).exists())
+
+    def test_outsider_is_rejected(self):
+        scope = {'type': 'websocket', 'path': f'/ws/host/{self.hosted.id}/lobby/', 'headers': []}
+
+        async def run():
+            sent = []
+
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+
+            await websocket_application(scope, receive, send)
+            return sent
+
+        self.assertEqual(async_to_sync(run)(), [{'type': 'websocket.close', 'code': 4401}])
+
+
+class QuizCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='pass12345')
+        self.client.force_login(self.user)
+
+    def post(self, questions, files=None):
+        data = {'title': 'Created', 'description': '', 'time_limit': '', 'code': '', 'questions_json': json.dumps(questions)}
+        data.update(files or {})
+        return self.client.post(reverse('quiz_create'), data)
+
+    def test_json_flow_creates_everything(self):
+        questions = [
+            {'text': f'Q{i}', 'answers': [{'text': 'a', 'is_correct': True}, {'text': ''}, {'text': 'b'}]}
+            for i in range(3)
+        ]
+        response = self.post(questions)
+        self.assertRedirects(response, reverse('index'), fetch_redirect_response=False)
+        quiz = Quiz.objects.get(title='Created')
+        self.assertEqual([q.order for q in quiz.questions.all()], [1, 2, 3])
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz).count(), 6)
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz, is_correct=True).count(), 3)
+
+    def test_taken_code_is_retried(self):
+        Quiz.objects.create(title='Old', code='TAKEN1')
+        with mock.patch.object(codes, 'allocate', side_effect=['TAKEN1', 'FREE01']):
+            self.post([{'text': 'Q', 'answers': [{'text': 'a'}, {'text': 'b'}]}])
+        quiz = Quiz.objects.get(title='Created')
+        self.assertEqual((quiz.code, quiz.creator, quiz.questions.count()), ('FREE01', self.user, 1))
+
+    def test_invalid_image_creates_nothing(self):
+        questions = [{'text': 'Q', 'answers': [{'text': 'a'}, {'text': 'b'}]}]
+        bad = SimpleUploadedFile('notes.txt', b'text', content_type='text/plain')
+        response = self.post(questions, {'q0_a1_image': bad})
+        self.assertContains(response, 'Невірний формат файлу')
+        self.assertFalse(Quiz.objects.exists())
+
+
+class HostedRoundTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        rounds.forget()
+        self.host = User.objects.create_user('host', password='pass12345')
+        self.player = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123', creator=self.host, time_limit=timedelta(seconds=30))
+        self.questions = []
+        for order in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f'Q{order}', order=order)
+            self.right = Answer.objects.create(question=question, text='yes', is_correct=True)
+            self.questions.append((question, self.right))
+        self.hosted = HostedGame.objects.create(quiz=self.quiz, host=self.host, run_code='RUN001')
+        HostedParticipant.objects.create(hosted_game=self.hosted, user=self.player)
+        with self.captureOnCommitCallbacks(execute=True):
+            views.start_hosted_game(self.hosted)
+        self.session = QuizSession.objects.get(user=self.player)
+        self.client.force_login(self.player)
+
+    def answer(self, number):
+        question, answer = self.questions[number - 1]
+        return self.client.post(reverse('submit_answer', args=[self.session.id, question.id]), {'answer_id': answer.id})
+
+    def advance(self):
+        host = Client()
+        host.force_login(self.host)
+        with self.captureOnCommitCallbacks(execute=True):
+            host.post(reverse('host_lobby', args=[self.hosted.id]), {'action': 'next'})
+
+    def test_rounds_follow_the_host(self):
+        state = rounds.current_round(self.hosted.id)
+        self.assertEqual((state.number, state.total), (1, 2))
+        self.assertAlmostEqual(state.deadline - state.started_at, 30, places=3)
+        self.assertEqual(self.answer(1).url, reverse('hosted_play', args=[self.hosted.id]))
+        # answering twice doesn't score twice, skipping ahead isn't possible
+        self.answer(1)
+        self.assertEqual(self.client.get(reverse('quiz_question', args=[self.session.id, 2])).url, reverse('hosted_play', args=[self.hosted.id]))
+
+        self.advance()
+        response = self.client.get(reverse('hosted_play', args=[self.hosted.id]))
+        self.assertEqual(response.context['question'].id, self.questions[1][0].id)
+        self.assertIn('late=1', self.answer(1).url)
+        self.answer(2)
+
+        self.advance()
+        self.assertTrue(rounds.current_round(self.hosted.id).finished)
+        response = self.client.get(reverse('hosted_play', args=[self.hosted.id]), follow=True)
+        self.assertTemplateUsed(response, 'quiz/quiz_results.html')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.total_score, 2)
+        self.assertIsNotNone(self.session.completed_at)
+
+    def test_game_end_finishes_every_session(self):
+        absent = User.objects.create_user('absent')
+        # joined and answered, but never comes back for the results
+        other = QuizSession.objects.create(user=absent, quiz=self.quiz, source='hosted', hosted_game=self.hosted)
+        self.hosted.participants.create(user=absent, session=other)
+        views.store_answer(other, get_compiled_quiz(self.quiz.id), self.questions[0][1])
+        self.answer(1)
+        self.advance()
+        self.advance()
+
+        self.assertFalse(QuizSession.objects.filter(hosted_game=self.hosted, completed_at=None).exists())
+        other.refresh_from_db()
+        self.assertEqual((other.summary['answered'], other.leaderboard_entry.score), (1, 1))
+        self.assertEqual(UserProfile.objects.get(user=absent).sessions_completed, 1)
+        # a form posted after the end doesn't change what was frozen
+        response = self.client.post(reverse('submit_answer', args=[self.session.id, self.questions[1][0].id]),
+                                    {'answer_id': self.questions[1][1].id})
+        self.assertEqual(response.url, reverse('hosted_play', args=[self.hosted.id]))
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.total_score, self.session.playeranswer_set.count()), (1, 1))
+
+    def test_deleted_round_question_sends_players_to_the_lobby(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0][0].delete()
+        response = self.client.get(reverse('hosted_play', args=[self.hosted.id]))
+        self.assertRedirects(response, reverse('host_lobby', args=[self.hosted.id]), fetch_redirect_response=False)
+
+    def test_late_answers_are_rejected_in_memory(self):
+        state = rounds.current_round(self.hosted.id)
+        self.assertTrue(rounds.accepts(self.hosted.id, 1, now=state.deadline))
+        with self.assertNumQueries(0):
+            self.assertFalse(rounds.accepts(self.hosted.id, 1, now=state.deadline + 5))
+        self.advance()
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertFalse(rounds.accepts(self.hosted.id, 1))
+        # a fresh worker falls back to the database
+        rounds.forget()
+        self.assertTrue(rounds.accepts(self.hosted.id, 2))
+
+    @override_settings(HOSTED_ROUND_LRU_SIZE=2)
+    def test_workers_forget_finished_and_old_games(self):
+        self.assertIn(self.hosted.id, rounds._rounds)
+        self.advance()
+        self.advance()
+        self.assertNotIn(self.hosted.id, rounds._rounds)
+        # still turned away, from the cached state
+        self.assertFalse(rounds.accepts(self.hosted.id, 2))
+        self.assertNotIn(self.hosted.id, rounds._rounds)
+
+        for hosted_id in range(1000, 1003):
+            rounds._remember(rounds.Round(hosted_id=hosted_id, order=1, question_id=1))
+        self.assertEqual(list(rounds._rounds), [1001, 1002])
+
+    @override_settings(DASHBOARD_PUSH_INTERVAL=0)
+    def test_host_dashboard_streams_answer_deltas(self):
+        host = Client()
+        host.force_login(self.host)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={host.session.session_key}'.encode()
+        scope = {'type': 'websocket', 'path': f'/ws/host/{self.hosted.id}/dashboard/', 'headers': [(b'cookie', cookie)]}
+        question, right = self.questions[0]
+
+        def answer():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.answer(1)
+
+        async def run():
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            await incoming.put({'type': 'websocket.connect'})
+            task = asyncio.ensure_future(websocket_application(scope, incoming.get, outgoing.put))
+            self.assertEqual((await outgoing.get())['type'], 'websocket.accept')
+            snapshot = json.loads((await outgoing.get())['text'])
+            await sync_to_async(answer)()
+            tally = json.loads((await asyncio.wait_for(outgoing.get(), 5))['text'])
+            await incoming.put({'type': 'websocket.disconnect'})
+            await task
+            return snapshot, tally
+
+        snapshot, tally = async_to_sync(run)()
+        self.assertEqual(snapshot, {
+            'event': 'dashboard', 'question_id': question.id, 'players': 1, 'answered': 0,
+            'distribution': {str(right.id): 0}, 'top': [],
+        })
+        self.assertEqual(tally['answered'], 1)
+        self.assertEqual(tally['distribution'], {str(right.id): 1})
+        self.assertEqual(tally['top'], [{'username': 'player', 'score': 1}])
+
+        # a board loaded after the answer doesn't count its delta again
+        board = dashboard.load_board(self.hosted.id)
+        self.assertFalse(board.apply({'session_id': self.session.id, 'question_id': question.id, 'answer_id': right.id, 'score': 1}))
+        self.assertEqual(board.snapshot()['answered'], 1)
+        self.assertEqual(host.get(reverse('host_dashboard', args=[self.hosted.id])).json(), board.snapshot())
+        self.assertEqual(self.client.get(reverse('host_dashboard', args=[self.hosted.id])).status_code, 403)
+
+    def test_polled_dashboard_follows_the_deltas(self):
+        host = Client()
+        host.force_login(self.host)
+        url = reverse('host_dashboard', args=[self.hosted.id])
+        question, right = self.questions[0]
+        self.assertEqual(host.get(url).json()['answered'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer(1)
+
+        # django session + user + hosted game; the answers aren't read again
+        with self.assertNumQueries(3):
+            polled = host.get(url).json()
+        self.assertEqual(polled, dashboard.load_board(self.hosted.id).snapshot())
+        self.assertEqual((polled['answered'], polled['distribution']), (1, {str(right.id): 1}))
+
+        # the next round starts from the database
+        self.advance()
+        self.assertEqual(host.get(url).json()['question_id'], self.questions[1][0].id)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Source', code='SRC001', creator=self.author, time_limit=timedelta(minutes=1))
+        logo = BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(logo, 'PNG')
+        logo = logo.getvalue()
+        for order in (1, 2):
+            q = Question.objects.create(quiz=self.quiz, text=f'Q{order}', order=order,
+                                        image=SimpleUploadedFile('logo.png', logo, content_type='image/png'))
+            Answer.objects.create(question=q, text='yes', is_correct=True)
+            Answer.objects.create(question=q, text='no')
+
+    def test_round_trip_dedupes_images_and_drops_taken_codes(self):
+        archive = BytesIO()
+        write_archive(Quiz.objects.filter(id=self.quiz.id), archive)
+
+        archive.seek(0)
+        stats = import_archive(archive)
+        self.assertEqual((stats['quizzes'], stats['questions'], stats['answers']), (1, 2, 4))
+        # both uploads already share one blob, and the import reuses it
+        self.assertEqual((stats['blobs_written'], stats['blobs_reused'], stats['codes_dropped']), (0, 1, 1))
+
+        copy = Quiz.objects.exclude(id=self.quiz.id).get()
+        self.assertEqual((copy.title, copy.code, copy.creator, copy.time_limit), ('Source', None, self.author, timedelta(minutes=1)))
+        images = {q.image.name for q in Question.objects.all()}
+        self.assertEqual(len(images), 1)
+        self.assertEqual(Answer.objects.filter(question__quiz=copy, is_correct=True).count(), 2)
+
+        archive.seek(0)
+        self.assertEqual(import_archive(archive)['blobs_reused'], 1)
+
+    def test_garbage_is_rejected(self):
+        with self.assertRaises(ArchiveError):
+            import_archive(BytesIO(b'not an archive'))
+
+    def test_blobs_must_be_images(self):
+        def archive(name, data):
+            out = BytesIO()
+            with tarfile.open(fileobj=out, mode='w:gz') as tar:
+                for member, content in (('manifest.json', json.dumps({'format': 'zapquiz', 'version': 1}).encode()), (name, data)):
+                    info = tarfile.TarInfo(member)
+                    info.size = len(content)
+                    tar.addfile(info, BytesIO(content))
+            out.seek(0)
+            return out
+
+        page = b'<script>alert(1)</script>'
+        fake = b'\x89PNG not really'
+        big = b'\0' * (3 * 1024 * 1024)
+        for name, data in (
+            (f'blobs/{hashlib.sha256(page).hexdigest()}.html', page),
+            (f'blobs/{hashlib.sha256(fake).hexdigest()}.png', fake),
+            (f'blobs/{hashlib.sha256(big).hexdigest()}.png', big),
+        ):
+            with self.subTest(name=name[-8:]), self.assertRaises(ArchiveError):
+                import_archive(archive(name, data))
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'blobs', hashlib.sha256(page).hexdigest()[:2])))
+
+    def test_malformed_records_are_rejected(self):
+        def archive(record):
+            out = BytesIO()
+            with tarfile.open(fileobj=out, mode='w:gz') as tar:
+                for member, content in (
+                    ('manifest.json', json.dumps({'format': 'zapquiz', 'version': 1}).encode()),
+                    ('quizzes/000001.json', json.dumps(record).encode()),
+                ):
+                    info = tarfile.TarInfo(member)
+                    info.size = len(content)
+                    tar.addfile(info, BytesIO(content))
+            out.seek(0)
+            return out
+
+        question = {'text': 'Q', 'order': 1, 'answers': [{'text': 'A', 'is_correct': True}]}
+        good = {'title': 'Imported', 'time_limit': 30, 'questions': [question]}
+        for record in (
+            ['not', 'a', 'dict'],
+            {'questions': [question]},
+            {'title': 'No questions'},
+            {**good, 'time_limit': '30'},
+            {**good, 'scoring_mode': 'double'},
+            {**good, 'questions': [{'order': 1, 'answers': []}]},
+            {**good, 'questions': [{**question, 'order': 'first'}]},
+            {**good, 'questions': [{**question, 'answers': [{'is_correct': True}]}]},
+        ):
+            with self.subTest(record=record), self.assertRaises(ArchiveError):
+                import_archive(archive(record))
+        self.assertFalse(Quiz.objects.filter(title='Imported').exists())
+
+        self.assertEqual(import_archive(archive(good))['questions'], 1)
+        self.assertEqual(Quiz.objects.get(title='Imported').time_limit, timedelta(seconds=30))
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANT_WORKERS=0, IMAGE_MAX_DIMENSION=1000)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.quiz = Quiz.objects.create(title='Pictures')
+
+    def upload(self, size):
+        data = BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(data, 'PNG')
+        return SimpleUploadedFile('photo.png', data.getvalue(), content_type='image/png')
+
+    def test_upload_gets_capped_variants_and_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(quiz=self.quiz, text='Q', order=1, image=self.upload((1600, 800)))
+        question.refresh_from_db()
+        variants = question.image_variants
+        self.assertEqual((variants['source'], variants['width'], variants['height']), (question.image.name, 1000, 500))
+        self.assertEqual([w for w, _ in variants['webp']], [320, 640, 1000])
+        for _, name in variants['webp'] + variants['jpeg']:
+            self.assertTrue(default_storage.exists(name))
+        with Image.open(default_storage.path(variants['jpeg'][0][1])) as small:
+            self.assertEqual((small.format, small.size), ('JPEG', (320, 160)))
+
+        compiled = get_compiled_quiz(self.quiz.id).question(1)
+        self.assertEqual(compiled.image_variants, variants)
+        html = Template('{% load image_extras %}{% responsive_image q.image_url q.image_variants %}').render(Context({'q': compiled}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'{default_storage.url(variants["jpeg"][0][1])} 320w', html)
+
+        # the same picture uploaded again reuses the files
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Question.objects.create(quiz=self.quiz, text='Q2', order=2, image=self.upload((1600, 800)))
+        other.refresh_from_db()
+        self.assertEqual(other.image_variants['webp'], variants['webp'])
+
+    def test_play_page_prefetches_the_next_question(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(quiz=self.quiz, text='Q1', order=1)
+            second = Question.objects.create(quiz=self.quiz, text='Q2', order=2, image=self.upload((800, 600)))
+        second.refresh_from_db()
+        player = User.objects.create_user('player', password='pass12345')
+        session = QuizSession.objects.create(user=player, quiz=self.quiz)
+        self.client.force_login(player)
+
+        page = self.client.get(reverse('quiz_question', args=[session.id, 1])).content.decode()
+        manifest = json.loads(re.search(r'id="next-question-media" type="application/json">(.*?)</script>', page).group(1))
+        self.assertEqual(len(manifest), 1)
+        self.assertIn(default_storage.url(second.image_variants['webp'][0][1]), manifest[0]['webp'])
+        self.assertEqual(manifest[0]['sizes'], '(max-width: 768px) 100vw, 720px')
+
+        page = self.client.get(reverse('quiz_question', args=[session.id, 2])).content.decode()
+        self.assertNotIn('next-question-media', page)
+
+
+class BlobStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANT_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def quiz_with_logo(self, title):
+        quiz = Quiz.objects.create(title=title)
+        data = BytesIO()
+        Image.new('RGB', (40, 40), (0, 90, 200)).save(data, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(quiz=quiz, text='Q', order=1,
+                                    image=SimpleUploadedFile(f'{title}.png', data.getvalue(), content_type='image/png'))
+        return quiz
+
+    def test_identical_uploads_share_a_blob_until_collected(self):
+        first, second = self.quiz_with_logo('first'), self.quiz_with_logo('second')
+        name = first.questions.get().image.name
+        self.assertEqual(second.questions.get().image.name, name)
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual(storage.references(name), 2)
+
+        response = self.client.get(default_storage.url(name))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual((response['Content-Type'], response['X-Content-Type-Options']), ('image/png', 'nosniff'))
+        self.assertEqual(b''.join(response.streaming_content)[:4], b'\x89PNG')
+        # whatever else ends up next to the blobs isn't served
+        page = storage.blob_storage.save('page.html', ContentFile(b'<script>alert(1)</script>'))
+        self.assertEqual(self.client.get(default_storage.url(page)).status_code, 404)
+        storage.blob_storage.delete(page)
+
+        first.delete()
+        self.assertEqual(storage.collect_garbage(min_age=0), (0, 0))
+        self.assertTrue(default_storage.exists(name))
+        variant = second.questions.get().image_variants['webp'][0][1]
+        second.delete()
+        self.assertTrue(default_storage.exists(name))
+
+        # an upload of the same bytes reuses the old blob before its row commits
+        old = time.time() - 7200
+        for path in (name, variant):
+            os.utime(default_storage.path(path), (old, old))
+        with default_storage.open(name, 'rb') as fh:
+            self.assertEqual(storage.blob_storage.save('again.png', fh), name)
+        self.assertEqual(storage.collect_garbage()[0], 1)
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(variant))
+
+        storage.collect_garbage(min_age=0)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_dedupe_moves_legacy_files_into_blobs(self):
+        quiz = self.quiz_with_logo('legacy')
+        blob = quiz.questions.get().image.name
+        for path in ('questions/2025/11/30/icon.png', 'answers/2025/11/30/icon.png'):
+            with default_storage.open(blob, 'rb') as fh:
+                default_storage.save(path, fh)
+        default_storage.delete(blob)
+        Question.objects.filter(quiz=quiz).update(image='questions/2025/11/30/icon.png')
+        question = quiz.questions.get()
+        Answer.objects.bulk_create([Answer(question=question, text='a', image='answers/2025/11/30/icon.png')])
+
+        stats = storage.dedupe_legacy()
+        self.assertEqual((stats['files'], stats['rows'], stats['blobs_written'], stats['blobs_reused']), (2, 2, 1, 1))
+        self.assertEqual(storage.references(blob), 2)
+        self.assertFalse(default_storage.exists('questions/2025/11/30/icon.png'))
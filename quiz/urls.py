@@ -5,10 +5,14 @@ urlpatterns = [
     path('', views.JoinView.as_view(), name='index'),
     path('quizzes/', views.QuizListView.as_view(), name='quiz_list'),
     path('quiz/create/', views.QuizCreateView.as_view(), name='quiz_create'),
+    path('quiz/import/', views.import_quiz, name='import_quiz'),
+    path('quiz/<int:quiz_id>/export/', views.export_quiz, name='export_quiz'),
     path('quiz/<int:quiz_id>/host/', views.host_quiz, name='host_quiz'),
     path('host/join/', views.join_hosted, name='join_hosted'),
     path('host/<int:hosted_id>/lobby/', views.host_lobby, name='host_lobby'),
+    path('host/<int:hosted_id>/dashboard/', views.host_dashboard, name='host_dashboard'),
     path('host/<int:hosted_id>/status/', views.host_status, name='host_status'),
+    path('host/<int:hosted_id>/play/', views.hosted_play, name='hosted_play'),
     path('quiz/<int:quiz_id>/start/', views.QuizDetailView.as_view(), name='start_quiz'),
     path('quiz/<int:quiz_id>/', views.QuizDetailView.as_view(), name='quiz_detail'),
     path('quiz/<int:quiz_id>/questions/', views.edit_quiz_questions, name='edit_quiz_questions'),
@@ -16,6 +20,10 @@ urlpatterns = [
     path('quiz/session/<int:session_id>/question/<int:question_number>/', views.QuizSessionView.as_view(), name='quiz_question'),
     path('quiz/session/<int:session_id>/submit/<int:question_id>/', views.QuizSessionView.as_view(), name='submit_answer'),
     path('quiz/session/<int:session_id>/results/', views.QuizSessionView.as_view(), name='quiz_results'),
+    path('quiz/session/<int:session_id>/play/', views.play_session, name='play_session'),
+    path('api/quiz/<int:quiz_id>/play/', views.play_quiz_payload, name='play_quiz_payload'),
+    path('api/session/<int:session_id>/answer/', views.play_answer, name='play_answer'),
     path('quiz/<int:quiz_id>/leaderboard/', views.LeaderboardView.as_view(), name='quiz_leaderboard'),
+    path('quiz/<int:quiz_id>/stats/', views.quiz_stats, name='quiz_stats'),
     path('quiz/<int:quiz_id>/code_leaderboard/', views.code_leaderboard, name='quiz_code_leaderboard'),
 ]
\ No newline at end of file
@@ -4,9 +4,19 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.edit import CreateView
 from django.urls import reverse_lazy
 from .models import Quiz, Question, Answer, HostedGame, HostedParticipant
-from results.models import QuizSession, PlayerAnswer
-from django.db.models import Sum
-from django.utils import timezone
+from results.models import PlayerAnswer, QuizSession, QuizStats
+from results import finalize, ingest, leaderboard, timing
+from . import catalogue, codes, dashboard, images, rounds, scoring
+from .compiled import get_compiled_quiz
+from .realtime import publish_lobby_event
+from .archive import ArchiveError, import_archive, iter_archive
+from .storage import CACHE_CONTROL, MEDIA_TYPES
+from django.conf import settings
+from django.views import static
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404, redirect
 from django.forms import modelformset_factory, inlineformset_factory
 from django.contrib.auth.decorators import login_required
@@ -17,21 +27,107 @@ from django.utils.decorators import method_decorator
 
 class QuizListView(View):
     def get(self, request):
-        quizzes = Quiz.objects.filter(is_active=True)
-        return render(request, 'quiz/quiz_list.html', {'quizzes': quizzes})
-
-
-from .forms import QuizCreateForm
+        query = request.GET.get('q', '').strip()[:100]
+        author = request.GET.get('author', '').strip()[:150]
+        try:
+            before = int(request.GET['before'])
+        except (KeyError, ValueError):
+            before = None
+        quizzes, next_before = catalogue.get_page(query, author, before)
+        return render(request, 'quiz/quiz_list.html', {
+            'quizzes': quizzes,
+            'next_before': next_before,
+            'query': query,
+            'author': author,
+            'is_first_page': before is None,
+        })
+
+
+from .forms import QuizCreateForm, validate_image
 import json
+import os
 
 from django.views import View as BaseView
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.utils import timezone
-import secrets, string
 from results.models import QuizSession
 
 
+def parse_questions_payload(questions, files):
+    """Validate the JSON questions posted by the create page in a single pass.
+
+    Returns ``(rows, error)``. Each row is ``(text, image, answers)`` and every
+    answer ``(text, is_correct, image)``; images come from `files` using the
+    client's keys (``q0_image``, ``q0_a0_image``). Answers without text are
+    dropped here so nothing else has to look at them again.
+    """
+    # Validate structure: at least 1 question, each has text and >=2 answers
+    if not isinstance(questions, list) or len(questions) < 1:
+        return None, 'Потрібно додати принаймні 1 питання'
+
+    rows = []
+    for qi, q in enumerate(questions):
+        if not isinstance(q, dict) or not q.get('text'):
+            return None, 'Кожне питання повинно містити текст'
+        answers = []
+        for ai, a in enumerate(q.get('answers') or []):
+            if not isinstance(a, dict) or not a.get('text'):
+                continue
+            answers.append((a['text'], bool(a.get('is_correct')), files.get(f"q{qi}_a{ai}_image")))
+        if len(answers) < 2:
+            return None, 'Кожне питання повинно мати принаймні 2 відповіді'
+        rows.append((q['text'], files.get(f"q{qi}_image"), answers))
+
+    try:
+        for _, image, answers in rows:
+            validate_image(image)
+            for _, _, answer_image in answers:
+                validate_image(answer_image)
+    except ValidationError as e:
+        return None, e.messages[0]
+    return rows, None
+
+
+def create_questions(quiz, rows):
+    """Insert the questions and answers of `rows` (see `parse_questions_payload`).
+
+    Rows go in with one bulk INSERT per table; image files are written once the
+    rows exist and attached with a single bulk UPDATE per table. Call inside a
+    transaction.
+    """
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=text, order=order)
+        for order, (text, _, _) in enumerate(rows, start=1)
+    ])
+    answers = Answer.objects.bulk_create([
+        Answer(question=question, text=text, is_correct=is_correct)
+        for question, (_, _, answer_rows) in zip(questions, rows)
+        for text, is_correct, _ in answer_rows
+    ])
+
+    question_images = []
+    for question, (_, image, _) in zip(questions, rows):
+        if image:
+            question.image.save(image.name, image, save=False)
+            question_images.append(question)
+    answer_images = []
+    answer_files = (image for _, _, answer_rows in rows for _, _, image in answer_rows)
+    for answer, image in zip(answers, answer_files):
+        if image:
+            answer.image.save(image.name, image, save=False)
+            answer_images.append(answer)
+    if question_images:
+        Question.objects.bulk_update(question_images, ['image'])
+    if answer_images:
+        Answer.objects.bulk_update(answer_images, ['image'])
+    # bulk writes send no post_save, so queue the resized copies here
+    for question in question_images:
+        images.schedule_variants(Question, question.id)
+    for answer in answer_images:
+        images.schedule_variants(Answer, answer.id)
+    return questions, answers
+
+
 class QuizCreateView(LoginRequiredMixin, View):
     template_name = 'quiz/quiz_form.html'
     success_url = reverse_lazy('index')
@@ -53,39 +149,21 @@ class QuizCreateView(LoginRequiredMixin, View):
             except Exception:
                 return render(request, self.template_name, {'form': QuizCreateForm(request.POST), 'error': 'Невірний формат даних питань'})
 
-            # Validate structure: at least 1 question, each has text and >=2 answers
-            if not isinstance(questions, list) or len(questions) < 1:
-                return render(request, self.template_name, {'form': QuizCreateForm(request.POST), 'error': 'Потрібно додати принаймні 1 питання'})
-
-            for q in questions:
-                if not q.get('text'):
-                    return render(request, self.template_name, {'form': QuizCreateForm(request.POST), 'error': 'Кожне питання повинно містити текст'})
-                answers = q.get('answers') or []
-                if len([a for a in answers if a.get('text')]) < 2:
-                    return render(request, self.template_name, {'form': QuizCreateForm(request.POST), 'error': 'Кожне питання повинно мати принаймні 2 відповіді'})
+            rows, error = parse_questions_payload(questions, request.FILES)
+            if error:
+                return render(request, self.template_name, {'form': QuizCreateForm(request.POST), 'error': error})
 
             # Validate and save quiz
             quiz_form = QuizCreateForm(request.POST)
             if not quiz_form.is_valid():
                 return render(request, self.template_name, {'form': quiz_form, 'error': 'Помилка в полях вікторини'})
 
-            quiz = quiz_form.save(commit=False)
-            quiz.creator = request.user
-            quiz.is_active = True
-            quiz.save()
-
-            # Create questions and answers
-            for idx, q in enumerate(questions, start=1):
-                # attach uploaded image if present; client uses keys like q0_image, q0_a0_image
-                q_image_key = f"q{idx-1}_image"
-                q_image = request.FILES.get(q_image_key)
-                question = Question.objects.create(quiz=quiz, text=q.get('text'), order=idx, image=q_image)
-                for ai, a in enumerate(q.get('answers', [])):
-                    if not a.get('text'):
-                        continue
-                    a_image_key = f"q{idx-1}_a{ai}_image"
-                    a_image = request.FILES.get(a_image_key)
-                    Answer.objects.create(question=question, text=a.get('text'), is_correct=bool(a.get('is_correct')), image=a_image)
+            # all or nothing: a failure halfway must not leave a half-built quiz behind
+            with transaction.atomic():
+                quiz_form.instance.creator = request.user
+                quiz_form.instance.is_active = True
+                quiz = quiz_form.save()
+                create_questions(quiz, rows)
 
             return redirect(self.success_url)
 
@@ -105,21 +183,23 @@ class QuizCreateView(LoginRequiredMixin, View):
         # answer formset are valid and contain >=2 answers, we'll also create the question
         # and its answers. This makes the Create button functional even when the client
         # UI hides the legacy fields (no JSON flow used).
-        quiz = quiz_form.save(commit=False)
-        quiz.creator = request.user
-        quiz.is_active = True
-        quiz.save()
-
-        # Try to save an initial question + answers if provided and valid
-        answers_clean = []
-        if qform.is_valid() and answer_formset.is_valid():
-            answers_clean = [f for f in answer_formset.cleaned_data if f and f.get('text')]
-            if answers_clean and len(answers_clean) >= 2:
-                question = qform.save(commit=False)
-                question.quiz = quiz
-                question.save()
-                for ans_data in answers_clean:
-                    Answer.objects.create(question=question, text=ans_data.get('text'), is_correct=ans_data.get('is_correct', False))
+        with transaction.atomic():
+            quiz_form.instance.creator = request.user
+            quiz_form.instance.is_active = True
+            quiz = quiz_form.save()
+
+            # Try to save an initial question + answers if provided and valid
+            answers_clean = []
+            if qform.is_valid() and answer_formset.is_valid():
+                answers_clean = [f for f in answer_formset.cleaned_data if f and f.get('text')]
+                if answers_clean and len(answers_clean) >= 2:
+                    question = qform.save(commit=False)
+                    question.quiz = quiz
+                    question.save()
+                    Answer.objects.bulk_create([
+                        Answer(question=question, text=ans_data.get('text'), is_correct=ans_data.get('is_correct', False))
+                        for ans_data in answers_clean
+                    ])
 
         return redirect(self.success_url)
 
@@ -135,9 +215,8 @@ class JoinView(BaseView):
         code = request.POST.get('code', '').strip()
         if not code:
             return render(request, self.template_name, {'error': 'Введіть код вікторини'})
-        try:
-            quiz = Quiz.objects.get(code__iexact=code, is_active=True)
-        except Quiz.DoesNotExist:
+        quiz_id = codes.resolve('quiz', code)
+        if quiz_id is None:
             return render(request, self.template_name, {'error': 'Вікторина з таким кодом не знайдена'})
 
         # require login to join; redirect to login if anonymous
@@ -146,9 +225,9 @@ class JoinView(BaseView):
             login_url = reverse('login')
             return redirect(f"{login_url}?next={request.path}")
 
-        # create a session and redirect to first question
-        session = QuizSession.objects.create(user=request.user, quiz=quiz)
-        return redirect('quiz_question', session_id=session.id, question_number=1)
+        # create a session and start playing
+        session = QuizSession.objects.create(user=request.user, quiz_id=quiz_id)
+        return redirect('play_session', session_id=session.id)
 
 
 @login_required
@@ -158,18 +237,43 @@ def host_quiz(request, quiz_id):
     if not (request.user == quiz.creator or request.user.is_staff):
         return render(request, 'quiz/forbidden.html', status=403)
     # always create a new hosted game so host can run multiple rounds
-    alphabet = string.ascii_uppercase + string.digits
-    hosted = None
-    for _ in range(50):
-        candidate = ''.join(secrets.choice(alphabet) for _ in range(6))
-        if not Quiz.objects.filter(code=candidate).exists() and not HostedGame.objects.filter(run_code=candidate).exists():
-            hosted = HostedGame.objects.create(quiz=quiz, host=request.user, run_code=candidate)
-            break
-    if hosted is None:
-        hosted = HostedGame.objects.create(quiz=quiz, host=request.user, run_code='HOSTED')
+    hosted = codes.create_with_code(HostedGame, 'run_code', quiz=quiz, host=request.user)
 
     participants = hosted.participants.select_related('user')
-    return render(request, 'quiz/host_lobby.html', {'hosted': hosted, 'participants': participants})
+    state = rounds.current_round(hosted.id) if hosted.is_started else None
+    return render(request, 'quiz/host_lobby.html', {'hosted': hosted, 'participants': participants, 'round': state})
+
+
+@login_required
+def hosted_play(request, hosted_id):
+    """The participant's view of the round the host is currently running."""
+    participant = get_object_or_404(
+        HostedParticipant.objects.select_related('hosted_game'), hosted_game_id=hosted_id, user=request.user,
+    )
+    hosted = participant.hosted_game
+    state = rounds.current_round(hosted.id) if hosted.is_started else None
+    if state is None or participant.session_id is None:
+        return redirect('host_lobby', hosted.id)
+    if state.finished:
+        # one past the last question is where the play view finishes the session
+        return redirect('quiz_question', session_id=participant.session_id, question_number=state.order)
+    quiz = get_compiled_quiz(hosted.quiz_id)
+    question = quiz.question(state.order)
+    if question is None:
+        # deleted while its round was running; wait in the lobby for the host's next step
+        return redirect('host_lobby', hosted.id)
+    answered = ingest.is_answered(participant.session_id, question.id)
+    return render(request, 'quiz/hosted_play.html', {
+        'hosted': hosted,
+        'session_id': participant.session_id,
+        'quiz': quiz,
+        'question': question,
+        # the host will show it next, let the browser fetch its images meanwhile
+        'next_question': quiz.following(question.order),
+        'round': state,
+        'answered': answered,
+        'late': 'late' in request.GET,
+    })
 
 
 @login_required
@@ -178,9 +282,8 @@ def join_hosted(request):
         run_code = request.POST.get('run_code', '').strip()
         if not run_code:
             return render(request, 'quiz/host_join.html', {'error': 'Введіть код лобі'})
-        try:
-            hosted = HostedGame.objects.get(run_code__iexact=run_code)
-        except HostedGame.DoesNotExist:
+        hosted_id = codes.resolve('hosted', run_code)
+        if hosted_id is None:
             return render(request, 'quiz/host_join.html', {'error': 'Лобі не знайдено'})
 
         # ensure user is logged in
@@ -188,12 +291,44 @@ def join_hosted(request):
             return redirect(f"{reverse('login')}?next={request.path}")
 
         # add participant
-        HostedParticipant.objects.get_or_create(hosted_game=hosted, user=request.user)
+        _, created = HostedParticipant.objects.get_or_create(hosted_game_id=hosted_id, user=request.user)
+        if created:
+            publish_lobby_event(hosted_id, 'joined', username=request.user.username)
         # redirect to lobby view
-        return redirect('host_lobby', hosted.id)
+        return redirect('host_lobby', hosted_id)
     return render(request, 'quiz/host_join.html')
 
 
+def start_hosted_game(hosted):
+    """Create a session for every participant and mark the game started.
+
+    Returns False when the game was already started (or closed), e.g. by a
+    double-clicked start button.
+    """
+    with transaction.atomic():
+        # the conditional UPDATE locks the game row, so only one request gets past it
+        if not HostedGame.objects.filter(id=hosted.id, is_started=False, is_closed=False).update(is_started=True):
+            return False
+        hosted.is_started = True
+        waiting = list(hosted.participants.filter(session__isnull=True))
+        created = QuizSession.objects.bulk_create(
+            [
+                QuizSession(user_id=participant.user_id, quiz_id=hosted.quiz_id, source='hosted', hosted_game=hosted)
+                for participant in waiting
+            ],
+            batch_size=500,
+        )
+        # bulk_create fills in the ids, in the order the sessions were given
+        for participant, session in zip(waiting, created):
+            participant.session_id = session.id
+        HostedParticipant.objects.bulk_update(waiting, ['session'], batch_size=500)
+        # every participant picks their own session out of the map
+        sessions = dict(hosted.participants.exclude(session=None).values_list('user_id', 'session_id'))
+        publish_lobby_event(hosted.id, 'started', sessions={str(user_id): session_id for user_id, session_id in sessions.items()})
+        rounds.start(hosted)
+    return True
+
+
 @login_required
 def host_lobby(request, hosted_id):
     hosted = get_object_or_404(HostedGame, id=hosted_id)
@@ -202,21 +337,39 @@ def host_lobby(request, hosted_id):
     if request.method == 'POST' and request.user == hosted.host:
         action = request.POST.get('action')
         if action == 'start' and not hosted.is_started and not hosted.is_closed:
-            # start the hosted game: create QuizSession for each participant and attach
-            for p in participants:
-                if p.session is None:
-                    session = QuizSession.objects.create(user=p.user, quiz=hosted.quiz)
-                    p.session = session
-                    p.save()
-            hosted.is_started = True
-            hosted.save()
+            start_hosted_game(hosted)
+            return redirect('host_lobby', hosted.id)
+        elif action == 'next' and hosted.is_started:
+            rounds.advance(hosted)
             return redirect('host_lobby', hosted.id)
         elif action == 'close' and not hosted.is_started:
             hosted.is_closed = True
             hosted.save()
+            codes.retire(hosted.id)
+            publish_lobby_event(hosted.id, 'closed')
             return redirect('host_lobby', hosted.id)
 
-    return render(request, 'quiz/host_lobby.html', {'hosted': hosted, 'participants': participants})
+    state = rounds.current_round(hosted.id) if hosted.is_started else None
+    question, correct_ids = None, ()
+    if state is not None and not state.finished and request.user == hosted.host:
+        # labels for the dashboard's answer bars
+        compiled = get_compiled_quiz(hosted.quiz_id)
+        question = compiled.question(state.order)
+        if question is not None:
+            correct_ids = compiled.correct.get(question.id, ())
+    return render(request, 'quiz/host_lobby.html', {
+        'hosted': hosted, 'participants': participants, 'round': state,
+        'question': question, 'correct_ids': correct_ids,
+    })
+
+
+@login_required
+def host_dashboard(request, hosted_id):
+    """The host's live numbers as JSON, for browsers that can't keep the dashboard websocket open."""
+    hosted = get_object_or_404(HostedGame, id=hosted_id)
+    if not (hosted.host_id == request.user.id or request.user.is_staff):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return JsonResponse(dashboard.polled_snapshot(hosted.id))
 
 
 @login_required
@@ -229,12 +382,13 @@ def host_status(request, hosted_id):
     except HostedParticipant.DoesNotExist:
         p = None
 
+    state = rounds.current_round(hosted.id) if hosted.is_started else None
     data = {
         'is_started': hosted.is_started,
         'is_closed': hosted.is_closed,
-        'participant_session_id': p.session.id if p and p.session else None,
+        'participant_session_id': p.session_id if p else None,
+        'round': state.as_event() if state else None,
     }
-    from django.http import JsonResponse
     return JsonResponse(data)
 
 
@@ -277,6 +431,32 @@ def edit_question_answers(request, question_id):
 
     return render(request, 'quiz/question_answers_form.html', {'question': question, 'formset': formset})
 
+@login_required
+def export_quiz(request, quiz_id):
+    """Download a quiz with its questions, answers and images as an archive."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not (request.user == quiz.creator or request.user.is_staff):
+        return render(request, 'quiz/forbidden.html', status=403)
+    response = StreamingHttpResponse(iter_archive(Quiz.objects.filter(id=quiz.id)), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="quiz-{quiz.id}.zapquiz.tar.gz"'
+    return response
+
+
+@login_required
+def import_quiz(request):
+    """Upload an archive made by `export_quiz`; the quizzes are owned by the uploader."""
+    if request.method == 'POST':
+        upload = request.FILES.get('archive')
+        if not upload:
+            return render(request, 'quiz/quiz_import.html', {'error': 'Оберіть файл архіву'})
+        try:
+            stats = import_archive(upload, creator=request.user, keep_authors=False)
+        except ArchiveError as e:
+            return render(request, 'quiz/quiz_import.html', {'error': f'Не вдалося імпортувати архів: {e}'})
+        return render(request, 'quiz/quiz_import.html', {'stats': stats})
+    return render(request, 'quiz/quiz_import.html')
+
+
 @method_decorator(login_required, name='dispatch')
 class QuizDetailView(View):
     def get(self, request, quiz_id):
@@ -285,35 +465,70 @@ class QuizDetailView(View):
         return render(request, 'quiz/quiz_detail.html', {'quiz': quiz, 'questions': questions})
 
     def post(self, request, quiz_id):
-        """Start a new QuizSession for the logged-in user and redirect to first question."""
+        """Start a new QuizSession for the logged-in user and open the player."""
         quiz = get_object_or_404(Quiz, id=quiz_id)
         # create a new session
         session = QuizSession.objects.create(user=request.user, quiz=quiz)
-        # redirect to first question
-        return redirect('quiz_question', session_id=session.id, question_number=1)
+        return redirect('play_session', session_id=session.id)
+
+
+def find_answer(quiz, question_id, answer_id):
+    """The compiled answer `answer_id` if it belongs to `question_id`, else None."""
+    try:
+        answer = quiz.answers[int(answer_id)]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return answer if answer.question_id == question_id else None
+
+
+def store_answer(session, quiz, answer, shown_at=None):
+    """Score `answer` and record it for `session` with its response time; returns the score.
+
+    The question was shown at `shown_at` (unix time) or, when that's not given,
+    whenever a play view marked it (`results.timing`). Returns None if a
+    concurrent request answered the question first.
+    """
+    seconds = timing.response_time(session.id, answer.question_id, shown_at=shown_at)
+    score = scoring.score(quiz, answer, seconds)
+    if not ingest.record_answer(session.id, session.user_id, answer.question_id, answer.id, score, seconds):
+        return None
+    if session.hosted_game_id is not None:
+        dashboard.publish_answer(session.hosted_game_id, session.id, answer.question_id, answer.id, score)
+    return score
 
 
 class QuizSessionView(View):
-    """Render a question within a QuizSession or handle answer submission."""
+    """Render a question within a QuizSession or handle answer submission.
+
+    Questions and answers come from the cached compiled quiz, so the play loop
+    only touches the session and answer rows.
+    """
     def get(self, request, session_id, question_number=None):
-        session = get_object_or_404(QuizSession, id=session_id)
+        session = get_object_or_404(QuizSession.objects.select_related('user'), id=session_id)
+        if session.hosted_game_id is not None:
+            # hosted sessions follow the host's rounds and only finish with the game
+            state = rounds.current_round(session.hosted_game_id)
+            if state is not None and not state.finished:
+                return redirect('hosted_play', session.hosted_game_id)
         if question_number is not None:
-            question = session.quiz.questions.filter(order=question_number).first()
+            quiz = get_compiled_quiz(session.quiz_id)
+            question = quiz.question(question_number)
             if not question:
-                # quiz finished — mark session completed and compute score if not already set
-                if session.completed_at is None:
-                    session.completed_at = timezone.now()
-                    # compute total score for answers given during this session only
-                    total = PlayerAnswer.objects.filter(
-                        user=session.user,
-                        question__quiz=session.quiz,
-                        answered_at__gte=session.started_at,
-                        answered_at__lte=session.completed_at,
-                    ).aggregate(total=Sum('score'))['total'] or 0
-                    session.total_score = total
-                    session.save()
-                return render(request, 'quiz/quiz_results.html', {'session': session})
-            return render(request, 'quiz/quiz_session.html', {'session': session, 'question': question, 'question_number': question_number})
+                # quiz finished: freeze the results once, the page always shows the frozen ones
+                finalize.finalize(session, quiz)
+                return render(request, 'quiz/quiz_results.html', {
+                    'session': session,
+                    'quiz': quiz,
+                    'rows': finalize.result_rows(quiz, session.summary),
+                })
+            timing.mark_shown(session.id, question.id)
+            return render(request, 'quiz/quiz_session.html', {
+                'session': session,
+                'quiz': quiz,
+                'question': question,
+                'question_number': question_number,
+                'next_question': quiz.following(question.order),
+            })
         return render(request, 'quiz/quiz_session.html', {'session': session})
 
     def post(self, request, session_id, question_id=None):
@@ -323,41 +538,224 @@ class QuizSessionView(View):
         answer_id = request.POST.get('answer_id')
         if not answer_id:
             return render(request, 'quiz/quiz_session.html', {'session': session, 'error': 'No answer submitted'})
-        try:
-            answer = Answer.objects.get(id=answer_id)
-        except Answer.DoesNotExist:
-            return render(request, 'quiz/quiz_session.html', {'session': session, 'error': 'Answer not found'})
-
-        score = 1 if answer.is_correct else 0
-        PlayerAnswer.objects.create(
-            user=session.user,
-            question=answer.question,
-            selected_answer=answer,
-            score=score
-        )
-        session.total_score = PlayerAnswer.objects.filter(user=session.user, question__quiz=session.quiz).aggregate(total=Sum('score'))['total'] or 0
-        session.save()
-
-        next_order = answer.question.order + 1
+        quiz = get_compiled_quiz(session.quiz_id)
+        if session.completed_at is not None:
+            # the results are frozen; a late or resubmitted form only gets to see them
+            if session.hosted_game_id is not None:
+                return redirect('hosted_play', session.hosted_game_id)
+            finished = quiz.next_order(max(quiz.by_order, default=0))
+            return redirect('quiz_question', session_id=session.id, question_number=finished)
+        answer = find_answer(quiz, question_id, answer_id)
+        if answer is None:
+            return render(request, 'quiz/quiz_session.html', {'session': session, 'quiz': quiz, 'error': 'Answer not found'})
+
+        hosted_id = session.hosted_game_id
+        shown_at = None
+        if hosted_id is not None:
+            if not rounds.accepts(hosted_id, quiz.by_id[answer.question_id].order):
+                return redirect(reverse('hosted_play', args=[hosted_id]) + '?late=1')
+            if ingest.is_answered(session.id, answer.question_id):
+                return redirect('hosted_play', hosted_id)
+            # everybody saw the question when the host opened the round
+            shown_at = rounds.current_round(hosted_id).started_at
+
+        # a resubmitted form only moves on, the first answer stands
+        if hosted_id is not None or not ingest.is_answered(session.id, answer.question_id):
+            store_answer(session, quiz, answer, shown_at)
+
+        if hosted_id is not None:
+            return redirect('hosted_play', hosted_id)
+        next_order = quiz.next_order(quiz.by_id[answer.question_id].order)
         return redirect('quiz_question', session_id=session.id, question_number=next_order)
 
 
+def play_payload(quiz):
+    """Everything the single-page player needs to show a quiz, without what's correct."""
+    return {
+        'id': quiz.id,
+        'version': quiz.version,
+        'title': quiz.title,
+        'time_limit': quiz.time_limit.total_seconds() if quiz.time_limit else None,
+        'questions': [
+            {
+                'id': q.id,
+                'order': q.order,
+                'text': q.text,
+                'image': images.image_sources(q.image_url, q.image_variants, 'question') if q.image_url else None,
+                'answers': [
+                    {
+                        'id': a.id,
+                        'text': a.text,
+                        'image': images.image_sources(a.image_url, a.image_variants, 'answer') if a.image_url else None,
+                    }
+                    for a in q.answers
+                ],
+            }
+            for q in quiz.questions
+            if quiz.by_order.get(q.order) is q
+        ],
+    }
+
+
+def _first_unanswered(quiz, answered):
+    return next((quiz.by_order[o] for o in sorted(quiz.by_order) if quiz.by_order[o].id not in answered), None)
+
+
+def _answerable(session, quiz):
+    """Ids of the questions the single-page player may post now: the current one and the one after it.
+
+    The next one too because a skipped question is posted without waiting for
+    the reply, so it can arrive after the answer to the question that followed.
+    """
+    current = quiz.by_id.get(timing.current_question(session.id))
+    if current is None:
+        # the mark expired, the player is back on the first question not answered yet
+        ingest.flush_session(session.id)
+        answered = set(PlayerAnswer.objects.filter(session=session).values_list('question_id', flat=True))
+        current = _first_unanswered(quiz, answered)
+        if current is None:
+            return set()
+    following = quiz.following(current.order)
+    return {current.id} if following is None else {current.id, following.id}
+
+
+@login_required
+def play_session(request, session_id):
+    """Single-page player: the quiz is fetched once as JSON and answers are posted with fetch().
+
+    The page-per-question flow (`QuizSessionView`) stays for browsers without
+    JavaScript and for hosted games.
+    """
+    session = get_object_or_404(QuizSession, id=session_id, user=request.user)
+    if session.hosted_game_id is not None:
+        return redirect('hosted_play', session.hosted_game_id)
+    quiz = get_compiled_quiz(session.quiz_id)
+    # one past the last question is where the play view finishes the session
+    finish_order = quiz.next_order(max(quiz.by_order)) if quiz.by_order else 1
+    ingest.flush_session(session.id)
+    answered = set(PlayerAnswer.objects.filter(session=session).values_list('question_id', flat=True))
+    state = {
+        'session_id': session.id,
+        'payload_url': reverse('play_quiz_payload', args=[quiz.id]),
+        'answer_url': reverse('play_answer', args=[session.id]),
+        'finish_url': reverse('quiz_question', args=[session.id, finish_order]),
+        # the page-per-question flow, if anything goes wrong here
+        'fallback_url': reverse('quiz_question', args=[session.id, min(quiz.by_order, default=1)]),
+        'finished': session.completed_at is not None,
+        'answered': sorted(answered),
+        'score': session.total_score,
+    }
+    # the player starts on the first question not answered yet
+    first = _first_unanswered(quiz, answered)
+    if first is not None and session.completed_at is None:
+        timing.mark_shown(session.id, first.id)
+    return render(request, 'quiz/play.html', {'session': session, 'quiz': quiz, 'state': state})
+
+
+@login_required
+def play_quiz_payload(request, quiz_id):
+    """The quiz as JSON (`play_payload`); the ETag follows the compiled quiz version."""
+    try:
+        quiz = get_compiled_quiz(quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404
+    etag = f'"{quiz.id}-{quiz.version}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(play_payload(quiz), json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@require_POST
+def play_answer(request, session_id):
+    """Record one answer posted as ``{"question_id": .., "answer_id": ..}``.
+
+    Replies with the answer's score and the order of the next question
+    (``finished`` once there is none). The player posts ``"answer_id": null``
+    when a question's time ran out, so the next one is timed from when it
+    really appeared.
+    """
+    session = get_object_or_404(QuizSession, id=session_id, user=request.user)
+    if session.hosted_game_id is not None or session.completed_at is not None:
+        return JsonResponse({'error': 'Сесію вже завершено'}, status=409)
+    try:
+        data = json.loads(request.body)
+        question_id = int(data['question_id'])
+        answer_id = data['answer_id']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Невірний формат відповіді'}, status=400)
+    quiz = get_compiled_quiz(session.quiz_id)
+    answer = None
+    if answer_id is not None or question_id not in quiz.by_id:
+        answer = find_answer(quiz, question_id, answer_id)
+        if answer is None:
+            return JsonResponse({'error': 'Відповідь не знайдено'}, status=400)
+    if question_id not in _answerable(session, quiz):
+        return JsonResponse({'error': 'Це питання зараз не активне'}, status=409)
+    score = 0
+    if answer is not None:
+        if ingest.is_answered(session.id, question_id):
+            return JsonResponse({'error': 'Ви вже відповіли на це питання'}, status=409)
+        score = store_answer(session, quiz, answer)
+        if score is None:
+            return JsonResponse({'error': 'Ви вже відповіли на це питання'}, status=409)
+    next_question = quiz.following(quiz.by_id[question_id].order)
+    if next_question is not None:
+        timing.mark_shown(session.id, next_question.id)
+    return JsonResponse({
+        'is_correct': answer is not None and quiz.is_correct(answer),
+        'score': score,
+        'next_question': quiz.next_order(quiz.by_id[question_id].order),
+        'finished': next_question is None,
+    })
+
+
 class LeaderboardView(View):
     def get(self, request, quiz_id):
         quiz = get_object_or_404(Quiz, id=quiz_id)
-        top_players = QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False).order_by('-total_score')[:10]
-        return render(request, 'quiz/leaderboard.html', {'quiz': quiz, 'top_players': top_players})
+        top_players = leaderboard.top(quiz.id, limit=10)
+        context = {'quiz': quiz, 'top_players': top_players}
+        if request.user.is_authenticated:
+            context['my_rank'], context['my_entry'] = leaderboard.rank_of(quiz.id, request.user)
+        return render(request, 'quiz/leaderboard.html', context)
 
 
 def code_leaderboard(request, quiz_id):
     """Leaderboard for players who joined by code (i.e. sessions NOT created as part of a HostedGame)."""
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    # sessions completed for this quiz
-    sessions_qs = QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False)
-    # find sessions that belong to hosted participants for this quiz
-    hosted_session_ids = HostedParticipant.objects.filter(hosted_game__quiz=quiz, session__isnull=False).values_list('session_id', flat=True)
-    # exclude hosted sessions to get only code-joined sessions
-    code_sessions = sessions_qs.exclude(id__in=hosted_session_ids).order_by('-total_score')[:50]
+    code_sessions = leaderboard.top(quiz.id, source='code', limit=50)
+    context = {'quiz': quiz, 'sessions': code_sessions}
+    if request.user.is_authenticated:
+        context['my_rank'], context['my_entry'] = leaderboard.rank_of(quiz.id, request.user, source='code')
+    return render(request, 'quiz/code_leaderboard.html', context)
 
-    return render(request, 'quiz/code_leaderboard.html', {'quiz': quiz, 'sessions': code_sessions})
 
+@login_required
+def quiz_stats(request, quiz_id):
+    """Per-question statistics for the quiz author, as last computed by `manage.py export_analytics`."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not (quiz.creator_id == request.user.id or request.user.is_staff):
+        return render(request, 'quiz/forbidden.html', status=403)
+    stats = QuizStats.objects.filter(quiz=quiz).first()
+    return render(request, 'quiz/quiz_stats.html', {'quiz': quiz, 'stats': stats})
+
+
+def media_blob(request, path):
+    """Serve a content-addressed media file; its URL changes whenever its bytes do.
+
+    Routed in production too, so it only hands out images, under the type of
+    their extension and never sniffed as anything else.
+    """
+    content_type = MEDIA_TYPES.get(os.path.splitext(path)[1].lower())
+    if content_type is None:
+        raise Http404
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Content-Type'] = content_type
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Disposition'] = f'inline; filename="{os.path.basename(path)}"'
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -0,0 +1,182 @@
+"""Websocket endpoint that pushes hosted-lobby events to the browser.
+
+Served by `ZapQuiz.asgi.application` at ``/ws/host/<hosted_id>/lobby/``. The
+client gets one `status` message on connect (the same data `host_status`
+returns) and afterwards only the events published through `quiz.realtime`:
+
+* ``{"event": "joined", "username": ...}`` when a player enters the lobby,
+* ``{"event": "started", "session_id": ...}`` with the receiving player's own session,
+* ``{"event": "question", ...}`` / ``{"event": "finished"}`` as the host moves
+  through the rounds (see `quiz.rounds`),
+* ``{"event": "closed"}`` when the host closes the lobby.
+
+The host's live dashboard is served at ``/ws/host/<hosted_id>/dashboard/``: one
+``dashboard`` snapshot on connect, then coalesced ``tally`` updates (see
+`quiz.dashboard`).
+"""
+import asyncio
+import json
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+
+from .dashboard import dashboard_channel, load_board
+from .models import HostedGame, HostedParticipant
+from .realtime import get_broker, lobby_channel
+from .rounds import current_round
+
+
+LOBBY_PATH = re.compile(r'^/ws/host/(?P<hosted_id>\d+)/lobby/$')
+DASHBOARD_PATH = re.compile(r'^/ws/host/(?P<hosted_id>\d+)/dashboard/$')
+
+
+def _user_from_scope(scope):
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(morsel.value if morsel else None)
+    return get_user(SimpleNamespace(session=session))
+
+
+def lobby_status(hosted_id, user):
+    """Initial lobby state for `user`, or None if they don't belong to the lobby."""
+    hosted = HostedGame.objects.filter(id=hosted_id).first()
+    if hosted is None:
+        return None
+    sessions = list(HostedParticipant.objects.filter(hosted_game=hosted, user=user).values_list('session_id', flat=True))
+    if not sessions and hosted.host_id != user.id:
+        return None
+    state = current_round(hosted.id) if hosted.is_started else None
+    return {
+        'event': 'status',
+        'is_started': hosted.is_started,
+        'is_closed': hosted.is_closed,
+        'participant_session_id': sessions[0] if sessions else None,
+        'round': state.as_event() if state else None,
+    }
+
+
+def message_for_user(message, user_id):
+    """Tailor a broadcast lobby event to one connected user."""
+    if message.get('event') == 'started':
+        return {'event': 'started', 'session_id': message.get('sessions', {}).get(str(user_id))}
+    return message
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+
+
+async def serve_lobby(hosted_id, user_id, receive, send, queue=None):
+    """Forward lobby events to an accepted websocket until the client goes away.
+
+    Pass a `queue` already subscribed to the lobby channel to not miss events
+    published while the connection was being set up.
+    """
+    broker = get_broker()
+    channel = lobby_channel(hosted_id)
+    if queue is None:
+        queue = broker.subscribe(channel)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                getter.cancel()
+                return
+            await send({'type': 'websocket.send', 'text': json.dumps(message_for_user(getter.result(), user_id))})
+    finally:
+        broker.unsubscribe(channel, queue)
+        disconnect.cancel()
+
+
+def dashboard_board(hosted_id, user):
+    """The game's dashboard `Board` for its host, or None for anybody else."""
+    hosted = HostedGame.objects.filter(id=hosted_id).values_list('host_id', flat=True).first()
+    if hosted is None or not (hosted == user.id or user.is_staff):
+        return None
+    return load_board(hosted_id)
+
+
+async def serve_dashboard(hosted_id, board, receive, send, queue, interval=None):
+    """Apply answer deltas from `queue` to `board` and send what changed, at most every `interval` seconds.
+
+    `queue` must be subscribed to the dashboard channel before `board` was loaded.
+    """
+    interval = settings.DASHBOARD_PUSH_INTERVAL if interval is None else interval
+    broker = get_broker()
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                getter.cancel()
+                return
+            board.apply(getter.result())
+            # let the rest of the burst arrive and send it as one message
+            await asyncio.wait({disconnect}, timeout=interval)
+            while not queue.empty():
+                board.apply(queue.get_nowait())
+            changes = board.take_changes()
+            if changes is not None and not disconnect.done():
+                await send({'type': 'websocket.send', 'text': json.dumps(changes)})
+    finally:
+        broker.unsubscribe(dashboard_channel(hosted_id), queue)
+        disconnect.cancel()
+
+
+async def _dashboard_application(hosted_id, user, receive, send):
+    # subscribe before loading the board; deltas it already counted are skipped
+    queue = get_broker().subscribe(dashboard_channel(hosted_id))
+    board = await sync_to_async(dashboard_board)(hosted_id, user)
+    if board is None:
+        get_broker().unsubscribe(dashboard_channel(hosted_id), queue)
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+    await send({'type': 'websocket.accept'})
+    await send({'type': 'websocket.send', 'text': json.dumps(board.snapshot())})
+    await serve_dashboard(hosted_id, board, receive, send, queue)
+
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    match = LOBBY_PATH.match(scope['path'])
+    dashboard = DASHBOARD_PATH.match(scope['path'])
+    if not (match or dashboard):
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    hosted_id = int((match or dashboard).group('hosted_id'))
+
+    user = await sync_to_async(_user_from_scope)(scope)
+    if not user.is_authenticated:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    if dashboard:
+        await _dashboard_application(hosted_id, user, receive, send)
+        return
+    # subscribe before reading the status so no event falls in between
+    queue = get_broker().subscribe(lobby_channel(hosted_id))
+    status = await sync_to_async(lobby_status)(hosted_id, user)
+    if status is None:
+        get_broker().unsubscribe(lobby_channel(hosted_id), queue)
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+    await send({'type': 'websocket.send', 'text': json.dumps(status)})
+    await serve_lobby(hosted_id, user.id, receive, send, queue=queue)
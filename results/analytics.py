@@ -0,0 +1,351 @@
+"""Question statistics for quiz authors, computed away from the request cycle.
+
+`export` copies the `PlayerAnswer` and `QuizSession` rows added since the last
+run into column files under `ANALYTICS_DIR` (one ``.npz`` chunk of NumPy
+arrays per run); ``manifest.json`` keeps the watermarks (the last exported
+ids) and the list of chunks. Only columns that never change after a row is
+written are exported, so old chunks stay valid. The one exception is the
+session of an answer recorded before answers had sessions: such answers are
+exported with session -1, remembered in the manifest and exported again once
+``manage.py recompute_session_scores`` linked them; `load` keeps the latest
+copy of a row.
+
+Ids are handed out when a row is inserted, not when it commits, so on a
+database with concurrent writers (PostgreSQL) a row can become visible after
+rows with higher ids. `export` therefore stops at the first row younger than
+`ANALYTICS_EXPORT_LAG` seconds, which every transaction is assumed to commit
+within.
+
+`compute_stats` then loads the columns of the quizzes that got new rows and
+works out, per question, with vectorized NumPy:
+
+* how many players answered it and what share got it right (difficulty),
+* the mean response time,
+* how often each answer was picked (how well the wrong ones distract),
+* how many players reached it and how many of those before it left (drop-off).
+
+The results are saved as one `QuizStats` row per quiz, which is all the stats
+page reads. Run both with ``manage.py export_analytics`` (e.g. from cron).
+
+NumPy is only needed here; the rest of the site runs without it.
+"""
+import json
+import os
+import tempfile
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from quiz.models import Answer, Question
+from .models import PlayerAnswer, QuizSession, QuizStats
+
+
+MANIFEST = 'manifest.json'
+ANSWER_COLUMNS = ('id', 'session', 'quiz', 'question', 'answer', 'correct', 'seconds')
+SESSION_COLUMNS = ('id', 'quiz')
+# everything else is int64
+DTYPES = {'correct': bool, 'seconds': 'float64'}
+# a wrong answer picked by fewer players than this does no work as a distractor
+DISTRACTOR_MIN_SHARE = 0.05
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError('Question statistics need NumPy: pip install numpy') from None
+    return numpy
+
+
+def _directory(directory=None):
+    return os.fspath(directory or settings.ANALYTICS_DIR)
+
+
+def read_manifest(directory=None):
+    path = os.path.join(_directory(directory), MANIFEST)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'answers_after': 0, 'sessions_after': 0, 'next_chunk': 1, 'chunks': [], 'orphans': []}
+
+
+def _chunk_name(manifest):
+    number = manifest['next_chunk']
+    manifest['next_chunk'] += 1
+    return f'chunk-{number:06d}.npz'
+
+
+def _empty(np, columns):
+    return {column: np.empty(0, dtype=DTYPES.get(column, np.int64)) for column in columns}
+
+
+def _write_manifest(directory, manifest):
+    # written next to the chunks and renamed over the old one, never half-written
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+
+ANSWER_FIELDS = ('id', 'session_id', 'question__quiz_id', 'question_id', 'selected_answer_id', 'score', 'response_time')
+
+
+def _first_too_recent(queryset, after, field, cutoff):
+    """Lowest id above `after` of a row whose `field` is not older than `cutoff`, None if there's none."""
+    return queryset.filter(id__gt=after, **{f'{field}__gte': cutoff}).aggregate(first=Min('id'))['first']
+
+
+def _answer_rows(after, limit, before=None):
+    rows = PlayerAnswer.objects.filter(id__gt=after)
+    if before is not None:
+        rows = rows.filter(id__lt=before)
+    return list(rows.order_by('id').values_list(*ANSWER_FIELDS)[:limit])
+
+
+def _linked_rows(ids, batch_size):
+    """Rows of the answers `ids` that have a session by now."""
+    rows = []
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        rows += PlayerAnswer.objects.filter(id__in=batch, session__isnull=False).order_by('id').values_list(*ANSWER_FIELDS)
+    return rows
+
+
+def _answer_columns(np, rows):
+    ids, sessions, quizzes, questions, answers, scores, times = zip(*rows)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        # answers from before sessions existed have none
+        'session': np.array([s if s is not None else -1 for s in sessions], dtype=np.int64),
+        'quiz': np.array(quizzes, dtype=np.int64),
+        'question': np.array(questions, dtype=np.int64),
+        'answer': np.array(answers, dtype=np.int64),
+        # every scoring mode gives a right answer at least one point and a wrong one none
+        'correct': np.array(scores, dtype=np.int64) > 0,
+        'seconds': np.array([t.total_seconds() if t is not None else np.nan for t in times], dtype=np.float64),
+    }
+
+
+def export(directory=None, batch_size=50000, lag=None):
+    """Append the rows added since the last export as a new chunk.
+
+    Rows younger than `lag` seconds (default `ANALYTICS_EXPORT_LAG`) wait for
+    the next run, see the module docs. Returns ``(answers, sessions, quiz
+    ids)`` of what was exported.
+    """
+    np = _numpy()
+    directory = _directory(directory)
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    manifest.setdefault('orphans', [])
+    lag = settings.ANALYTICS_EXPORT_LAG if lag is None else lag
+    cutoff = timezone.now() - timedelta(seconds=lag)
+
+    # everything below the first row that may still have uncommitted neighbours
+    # is committed, so the watermark never passes a row that isn't visible yet
+    answer_parts = []
+    after = manifest['answers_after']
+    before = _first_too_recent(PlayerAnswer.objects.all(), after, 'answered_at', cutoff)
+    while True:
+        rows = _answer_rows(after, batch_size, before)
+        if not rows:
+            break
+        answer_parts.append(_answer_columns(np, rows))
+        after = rows[-1][0]
+    linked = _linked_rows(manifest['orphans'], batch_size)
+    if linked:
+        answer_parts.append(_answer_columns(np, linked))
+    sessions = QuizSession.objects.filter(id__gt=manifest['sessions_after'])
+    before = _first_too_recent(sessions, manifest['sessions_after'], 'started_at', cutoff)
+    if before is not None:
+        sessions = sessions.filter(id__lt=before)
+    sessions = list(sessions.order_by('id').values_list('id', 'quiz_id'))
+    if not answer_parts and not sessions:
+        return 0, 0, set()
+
+    answers = _join(np, answer_parts, ANSWER_COLUMNS)
+    chunk = {f'answers_{column}': values for column, values in answers.items()}
+    session_ids, session_quizzes = zip(*sessions) if sessions else ((), ())
+    chunk['sessions_id'] = np.array(session_ids, dtype=np.int64)
+    chunk['sessions_quiz'] = np.array(session_quizzes, dtype=np.int64)
+
+    name = _chunk_name(manifest)
+    np.savez(os.path.join(directory, name), **chunk)
+    manifest['chunks'].append(name)
+    manifest['answers_after'] = after
+    relinked = {row[0] for row in linked}
+    orphans = [i for i in manifest['orphans'] if i not in relinked]
+    manifest['orphans'] = orphans + chunk['answers_id'][chunk['answers_session'] < 0].tolist()
+    manifest['sessions_after'] = session_ids[-1] if sessions else manifest['sessions_after']
+    _write_manifest(directory, manifest)
+
+    quizzes = set(np.unique(chunk['answers_quiz']).tolist()) | set(session_quizzes)
+    return len(chunk['answers_id']), len(sessions), quizzes
+
+
+def load(quiz_ids=None, directory=None):
+    """All exported columns as ``(answers, sessions)`` dicts of arrays, optionally only for `quiz_ids`."""
+    np = _numpy()
+    directory = _directory(directory)
+    answer_parts, session_parts = [], []
+    wanted = np.array(sorted(quiz_ids), dtype=np.int64) if quiz_ids is not None else None
+    for name in read_manifest(directory)['chunks']:
+        with np.load(os.path.join(directory, name)) as chunk:
+            answers = {column: chunk[f'answers_{column}'] for column in ANSWER_COLUMNS}
+            sessions = {column: chunk[f'sessions_{column}'] for column in SESSION_COLUMNS}
+        if wanted is not None:
+            keep = np.isin(answers['quiz'], wanted)
+            answers = {column: values[keep] for column, values in answers.items()}
+            keep = np.isin(sessions['quiz'], wanted)
+            sessions = {column: values[keep] for column, values in sessions.items()}
+        answer_parts.append(answers)
+        session_parts.append(sessions)
+
+    answers = _join(np, answer_parts, ANSWER_COLUMNS)
+    # an answer exported again once it was linked to its session replaces the earlier copy
+    ids = answers['id'][::-1]
+    _, last = np.unique(ids, return_index=True)
+    if len(last) < len(ids):
+        keep = np.sort(len(ids) - 1 - last)
+        answers = {column: values[keep] for column, values in answers.items()}
+    return answers, _join(np, session_parts, SESSION_COLUMNS)
+
+
+def _join(np, parts, columns):
+    if not parts:
+        return _empty(np, columns)
+    return {column: np.concatenate([p[column] for p in parts]) for column in columns}
+
+
+def compact(directory=None):
+    """Merge all chunks into one, so later loads open a single file."""
+    np = _numpy()
+    directory = _directory(directory)
+    manifest = read_manifest(directory)
+    if len(manifest['chunks']) < 2:
+        return False
+    answers, sessions = load(directory=directory)
+    name = _chunk_name(manifest)
+    np.savez(
+        os.path.join(directory, name),
+        **{f'answers_{c}': v for c, v in answers.items()},
+        **{f'sessions_{c}': v for c, v in sessions.items()},
+    )
+    old, manifest['chunks'] = manifest['chunks'], [name]
+    _write_manifest(directory, manifest)
+    for chunk in old:
+        os.remove(os.path.join(directory, chunk))
+    return True
+
+
+def question_stats(np, answers, started, questions, choices):
+    """Stats of one quiz's questions from its answer columns.
+
+    `questions` is ``[(id, order, text)]`` in play order, `choices` maps a
+    question id to its ``[(answer id, text, is_correct)]``.
+    """
+    ids = np.array([q[0] for q in questions], dtype=np.int64)
+    if not len(ids):
+        return []
+    # position of each answer's question in `questions`; answers to deleted questions are dropped
+    sorter = np.argsort(ids)
+    index = sorter[np.minimum(np.searchsorted(ids, answers['question'], sorter=sorter), len(ids) - 1)]
+    keep = ids[index] == answers['question']
+    index = index[keep]
+    correct = answers['correct'][keep]
+    seconds = answers['seconds'][keep]
+    picked = answers['answer'][keep]
+    sessions = answers['session'][keep]
+
+    size = len(ids)
+    attempts = np.bincount(index, minlength=size)
+    right = np.bincount(index, weights=correct, minlength=size)
+    timed = ~np.isnan(seconds)
+    time_total = np.bincount(index[timed], weights=seconds[timed], minlength=size)
+    time_count = np.bincount(index[timed], minlength=size)
+    # players, not answers: a (question, session) pair counts once
+    linked = sessions >= 0
+    width = int(sessions.max(initial=0)) + 1
+    pairs = np.unique(index[linked] * width + sessions[linked])
+    reached = np.bincount(pairs // width, minlength=size)
+    picked_ids, picks = np.unique(picked, return_counts=True)
+    picks = dict(zip(picked_ids.tolist(), picks.tolist()))
+
+    result = []
+    before = started
+    for i, (question_id, number, text) in enumerate(questions):
+        n = int(attempts[i])
+        result.append({
+            'id': question_id,
+            'order': number,
+            'text': text,
+            'attempts': n,
+            'correct_rate': float(right[i] / n) if n else None,
+            'mean_seconds': float(time_total[i] / time_count[i]) if time_count[i] else None,
+            'reached': int(reached[i]),
+            'drop_off': float(1 - reached[i] / before) if before else None,
+            'answers': [
+                {
+                    'id': answer_id,
+                    'text': answer_text,
+                    'is_correct': is_correct,
+                    'picks': picks.get(answer_id, 0),
+                    'pick_rate': picks.get(answer_id, 0) / n if n else None,
+                    'weak_distractor': not is_correct and n > 0 and picks.get(answer_id, 0) / n < DISTRACTOR_MIN_SHARE,
+                }
+                for answer_id, answer_text, is_correct in choices.get(question_id, ())
+            ],
+        })
+        before = int(reached[i])
+    return result
+
+
+def compute_stats(quiz_ids=None, directory=None):
+    """Recompute `QuizStats` of `quiz_ids` (every exported quiz if None); returns how many were saved."""
+    np = _numpy()
+    answers, sessions = load(quiz_ids, directory)
+    if quiz_ids is None:
+        quiz_ids = set(np.unique(answers['quiz']).tolist()) | set(np.unique(sessions['quiz']).tolist())
+    quiz_ids = sorted(quiz_ids)
+
+    questions = {}
+    for question_id, quiz_id, number, text in (
+        Question.objects.filter(quiz_id__in=quiz_ids).order_by('quiz_id', 'order', 'id').values_list('id', 'quiz_id', 'order', 'text')
+    ):
+        questions.setdefault(quiz_id, []).append((question_id, number, text))
+    choices = {}
+    for answer_id, question_id, text, is_correct in (
+        Answer.objects.filter(question__quiz_id__in=quiz_ids).order_by('id').values_list('id', 'question_id', 'text', 'is_correct')
+    ):
+        choices.setdefault(question_id, []).append((answer_id, text, is_correct))
+
+    # sort once by quiz and slice, instead of masking every column per quiz
+    by_quiz = np.argsort(answers['quiz'], kind='stable')
+    answers = {column: values[by_quiz] for column, values in answers.items()}
+    wanted = np.array(quiz_ids, dtype=np.int64)
+    first = np.searchsorted(answers['quiz'], wanted, side='left')
+    last = np.searchsorted(answers['quiz'], wanted, side='right')
+    session_quizzes = np.sort(sessions['quiz'])
+    started = np.searchsorted(session_quizzes, wanted, side='right') - np.searchsorted(session_quizzes, wanted, side='left')
+
+    saved = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for i, quiz_id in enumerate(quiz_ids):
+            if quiz_id not in questions:
+                # deleted since
+                continue
+            part = {column: values[first[i]:last[i]] for column, values in answers.items()}
+            QuizStats.objects.update_or_create(quiz_id=quiz_id, defaults={
+                'sessions': int(started[i]),
+                'answers': len(part['id']),
+                'questions': question_stats(np, part, int(started[i]), questions[quiz_id], choices),
+                'computed_at': now,
+            })
+            saved += 1
+    return saved
@@ -0,0 +1,133 @@
+"""Finishing a quiz session.
+
+`finalize` runs once per session, when the player gets past the last question
+or, for every player of a hosted game, when its last round closes
+(`finalize_hosted`). In one transaction it stamps `completed_at`,
+freezes a compact `QuizSession.summary` of the session's own answers, and adds
+the session to the quiz leaderboard and the player's totals. If any step fails
+nothing is kept and the next visit tries again. A second call, e.g. a reload
+or a second tab, finds the session finished and does nothing.
+
+The summary holds what the results page shows, so the page renders from the
+session row and the cached compiled quiz alone::
+
+    {"answers": [[question_id, answer_id, correct, score, seconds], ...],
+     "answered": 10, "correct": 7, "timed": 9, "seconds": 84.2}
+
+``seconds`` of an answer is its response time (None if the server didn't time
+it); the top-level ``seconds`` is their sum over the ``timed`` answers.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from quiz.compiled import get_compiled_quiz
+from users import stats as player_stats
+from . import ingest, leaderboard
+from .models import PlayerAnswer, QuizSession
+
+
+logger = logging.getLogger(__name__)
+
+def _answer_rows(session_id):
+    return list(
+        PlayerAnswer.objects.filter(session_id=session_id).order_by('id')
+        .values_list('question_id', 'selected_answer_id', 'score', 'response_time')
+    )
+
+
+def build_summary(quiz, rows):
+    """Summarize answer `rows` (``(question, answer, score, response time)``) against compiled `quiz`.
+
+    Returns the summary and the exact total response time as a timedelta.
+    """
+    answers = []
+    timed = timedelta()
+    timed_count = 0
+    for question_id, answer_id, score, response_time in rows:
+        correct = answer_id in quiz.correct.get(question_id, ())
+        seconds = None
+        if response_time is not None:
+            seconds = response_time.total_seconds()
+            timed += response_time
+            timed_count += 1
+        answers.append([question_id, answer_id, correct, score, seconds])
+    return {
+        'answers': answers,
+        'answered': len(answers),
+        'correct': sum(1 for a in answers if a[2]),
+        'timed': timed_count,
+        'seconds': timed.total_seconds(),
+    }, timed
+
+
+def finalize(session, quiz=None):
+    """Finish `session` unless it is finished already; True if this call finished it.
+
+    `session` comes back with its final `total_score`, `completed_at` and `summary`.
+    """
+    quiz = quiz or get_compiled_quiz(session.quiz_id)
+    if session.completed_at is not None:
+        if not session.summary:
+            # finished before sessions had a summary
+            session.summary, _ = build_summary(quiz, _answer_rows(session.id))
+            QuizSession.objects.filter(id=session.id).update(summary=session.summary)
+        return False
+
+    ingest.flush_session(session.id)
+    try:
+        with transaction.atomic():
+            summary, timed = build_summary(quiz, _answer_rows(session.id))
+            # the conditional UPDATE makes sure only one request finishes the session
+            finished = QuizSession.objects.filter(id=session.id, completed_at__isnull=True).update(
+                completed_at=timezone.now(), summary=summary,
+            )
+            # total_score is kept up to date with every answer
+            session.refresh_from_db(fields=['total_score', 'completed_at', 'summary'])
+            if finished:
+                leaderboard.record_completion(session)
+                player_stats.record_session(session, timed=(summary['timed'], timed))
+    except Exception:
+        # rolled back, the session is still open
+        session.completed_at, session.summary = None, {}
+        raise
+    return bool(finished)
+
+
+def finalize_hosted(hosted_id):
+    """Finish every session of hosted game `hosted_id` still open; returns how many were finished.
+
+    A session that fails stays open for its results page to finish, the rest go ahead.
+    """
+    sessions = list(QuizSession.objects.filter(hosted_game_id=hosted_id, completed_at__isnull=True))
+    if not sessions:
+        return 0
+    quiz = get_compiled_quiz(sessions[0].quiz_id)
+    buffer = ingest.get_buffer()
+    if buffer is not None:
+        # once for the whole game instead of once per session
+        buffer.flush()
+    finished = 0
+    for session in sessions:
+        try:
+            finished += finalize(session, quiz)
+        except Exception:
+            logger.exception('Could not finish session %s of hosted game %s', session.id, hosted_id)
+    return finished
+
+
+def result_rows(quiz, summary):
+    """The summary's answers joined with compiled `quiz`, for the results page."""
+    rows = []
+    for question_id, answer_id, correct, score, seconds in summary.get('answers', ()):
+        rows.append({
+            # None if the question or answer was deleted since
+            'question': quiz.by_id.get(question_id),
+            'answer': quiz.answers.get(answer_id),
+            'is_correct': correct,
+            'score': score,
+            'seconds': seconds,
+        })
+    return rows
@@ -0,0 +1,436 @@
+"""Write-behind buffer for answer submissions.
+
+With ``ANSWER_BUFFER = True`` a submitted answer is scored, appended to an
+in-memory batch and to an on-disk journal, and the player is answered right
+away. A background thread writes the batch, one transaction of bulk INSERTs
+plus one ``total_score`` UPDATE per distinct score delta, once
+`ANSWER_BUFFER_BATCH` answers are waiting or every `ANSWER_BUFFER_DELAY`
+seconds. SQLite allows one writer at a time, so a burst of hundreds of answers
+turns into a handful of short transactions instead of hundreds of competing
+ones.
+
+Durability:
+
+* the batch is flushed on interpreter exit (atexit);
+* every answer is journaled (``answers-<writer>-<n>.jsonl`` under
+  `ANSWER_BUFFER_JOURNAL_DIR`) before it is acknowledged, and a segment is only
+  deleted after its rows are committed. ``<writer>`` is the pid plus a random
+  nonce, so a restarted process that gets the pid of a crashed one never
+  reuses its segments. Each writer holds an flock on ``writer-<writer>.lock``
+  while it runs; segments whose writer no longer holds it are replayed by the
+  next buffer that starts, or by ``manage.py replay_answer_journal``. A
+  replay first renames the segment to one of its own, so processes starting
+  together never write it twice. Rows that already made it to the database
+  are skipped;
+* a batch that keeps failing (`MAX_ATTEMPTS` times in a row) is written row
+  by row, and rows that still fail are logged and set aside in
+  ``rejected-<writer>.jsonl`` next to the journal instead of blocking every
+  later batch.
+
+Code that reads answers or totals of a session still being played must call
+`flush_session` first (the play view does before finishing a session).
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import secrets
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from quiz.models import Answer
+from .models import PlayerAnswer, QuizSession
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_GLOB = 'answers-*.jsonl'
+CLAIMED_GLOB = 'replaying-*.jsonl'
+LOCK_GLOB = 'writer-*.lock'
+# a batch that failed this many times in a row is written row by row
+MAX_ATTEMPTS = 3
+
+
+def _duration(seconds):
+    return None if seconds is None else timedelta(seconds=seconds)
+
+
+def write_answers(rows):
+    """Insert answer `rows` and add their scores to the session totals, in one transaction.
+
+    A row is ``(session_id, user_id, question_id, answer_id, score, response_time)``
+    with the response time in seconds or None. Rows of sessions, questions or
+    answers deleted in the meantime are dropped, and so are second answers to a
+    question of a session (two requests can both find it unanswered). Returns
+    the number written.
+    """
+    if not rows:
+        return 0
+    with transaction.atomic():
+        alive = set(QuizSession.objects.filter(id__in={r[0] for r in rows}).values_list('id', flat=True))
+        # (answer, question) pairs that still exist; deleting a question deletes its answers
+        choices = set(Answer.objects.filter(id__in={r[3] for r in rows}).values_list('id', 'question_id'))
+        rows = [r for r in rows if (r[3], r[2]) in choices]
+        seen = set(
+            PlayerAnswer.objects.filter(session_id__in=alive).values_list('session_id', 'question_id')
+        )
+        unique = []
+        for row in rows:
+            if row[0] in alive and (row[0], row[2]) not in seen:
+                seen.add((row[0], row[2]))
+                unique.append(row)
+        rows = unique
+        PlayerAnswer.objects.bulk_create(
+            [
+                PlayerAnswer(
+                    session_id=s, user_id=u, question_id=q, selected_answer_id=a, score=score,
+                    response_time=_duration(seconds),
+                )
+                for s, u, q, a, score, seconds in rows
+            ],
+            batch_size=500,
+        )
+        deltas = {}
+        for session_id, _, _, _, score, _ in rows:
+            if score:
+                deltas[session_id] = deltas.get(session_id, 0) + score
+        # sessions usually gain the same amount, so this is one UPDATE per distinct delta
+        by_delta = {}
+        for session_id, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(session_id)
+        for delta, ids in by_delta.items():
+            QuizSession.objects.filter(id__in=ids).update(total_score=F('total_score') + delta)
+    return len(rows)
+
+
+def _lock_path(journal_dir, writer):
+    return journal_dir / f'writer-{writer}.lock'
+
+
+def _lock_writer(journal_dir):
+    """Pick a new writer id and hold its lock; returns ``(writer, fd)``.
+
+    The lock lasts until `fd` is closed, or the process dies. It is taken
+    before the file gets its final name, so nobody ever sees it unlocked.
+    """
+    writer = f'{os.getpid()}.{secrets.token_hex(4)}'
+    pending = journal_dir / f'.writer-{writer}.lock'
+    fd = os.open(pending, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    os.rename(pending, _lock_path(journal_dir, writer))
+    return writer, fd
+
+
+def _writer_alive(journal_dir, writer):
+    """Whether the process that wrote (or claimed) a segment still holds its lock."""
+    try:
+        fd = os.open(_lock_path(journal_dir, writer), os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        # also drops the lock if we got it
+        os.close(fd)
+    return False
+
+
+def _read_journal(path):
+    rows = []
+    with open(path) as fh:
+        for line in fh:
+            try:
+                row = tuple(json.loads(line))
+                # journals written before response times were kept
+                rows.append(row + (None,) * (6 - len(row)))
+            except ValueError:
+                # torn last line of a crashed write; that answer was never acknowledged
+                continue
+    return rows
+
+
+def _claim(path, writer):
+    """Rename segment `path` to ``replaying-<writer>-<segment>``; None if another process took it first.
+
+    A rename is atomic, so of several processes replaying at once exactly one
+    gets each segment.
+    """
+    segment = path.name.split('-', 2)[2] if path.name.startswith('replaying-') else path.name
+    claimed = path.with_name(f'replaying-{writer}-{segment}')
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    return claimed, path.with_name(segment)
+
+
+def replay_journals(journal_dir, writer=None):
+    """Write what dead processes left in `journal_dir`; returns the number of answers replayed.
+
+    `writer` is the id of the calling buffer, whose lock marks the segments it
+    claims as taken; without one a lock is held for the duration of the
+    replay. Segments claimed by a replay that died halfway are picked up
+    again, and locks of dead writers are removed once nothing of theirs is
+    left.
+    """
+    journal_dir = Path(journal_dir)
+    if not journal_dir.is_dir():
+        return 0
+    if writer is None:
+        writer, fd = _lock_writer(journal_dir)
+        try:
+            return replay_journals(journal_dir, writer)
+        finally:
+            _lock_path(journal_dir, writer).unlink(missing_ok=True)
+            os.close(fd)
+    alive = {}
+    replayed = 0
+    for path in sorted(journal_dir.glob(JOURNAL_GLOB)) + sorted(journal_dir.glob(CLAIMED_GLOB)):
+        # the writer of a segment, or the process replaying it; ours is locked, so it counts as alive
+        owner = path.name.split('-')[1]
+        if owner not in alive:
+            alive[owner] = _writer_alive(journal_dir, owner)
+        if alive[owner]:
+            continue
+        claim = _claim(path, writer)
+        if claim is None:
+            continue
+        claimed, segment = claim
+        try:
+            # rows that made it to the database already are skipped by write_answers
+            replayed += write_answers(_read_journal(claimed))
+        except Exception:
+            # hand it back for the next replay
+            os.rename(claimed, segment)
+            raise
+        claimed.unlink()
+
+    left = {path.name.split('-')[1] for path in journal_dir.glob('answers-*-*.jsonl')}
+    left |= {path.name.split('-')[1] for path in journal_dir.glob('replaying-*-*.jsonl')}
+    for path in journal_dir.glob(LOCK_GLOB):
+        owner = path.name[len('writer-'):-len('.lock')]
+        if owner not in left and not _writer_alive(journal_dir, owner):
+            path.unlink(missing_ok=True)
+    return replayed
+
+
+class AnswerBuffer:
+    """Collects answers in memory and writes them in batches (see module docs).
+
+    With ``delay=None`` there is no background thread and batches are written
+    by `submit` once full, or by an explicit `flush`.
+    """
+
+    def __init__(self, batch_size=200, delay=0.2, journal_dir=None, fsync=False, max_attempts=MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self._failures = 0
+        self._lock = threading.Lock()
+        # serializes flushes so batches are committed in submission order
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._closed = False
+        self._wakeup = threading.Event()
+
+        self._journal_dir = Path(journal_dir) if journal_dir else None
+        self._journal = None
+        self._journal_path = None
+        self._segment = 0
+        self._writer = None
+        self._lock_fd = None
+        # journal segments whose rows are not committed yet
+        self._unflushed = []
+        if self._journal_dir is not None:
+            self._journal_dir.mkdir(parents=True, exist_ok=True)
+            self._writer, self._lock_fd = _lock_writer(self._journal_dir)
+            # every segment there is someone else's, since ours have a fresh writer id
+            replay_journals(self._journal_dir, self._writer)
+            self._open_segment()
+
+        self._thread = None
+        if delay:
+            self._thread = threading.Thread(target=self._run, name='answer-buffer', daemon=True)
+            self._thread.start()
+
+    def _open_segment(self):
+        self._segment += 1
+        self._journal_path = self._journal_dir / f'answers-{self._writer}-{self._segment:06d}.jsonl'
+        self._journal = open(self._journal_path, 'x', buffering=1)
+
+    def _rotate(self):
+        """Close the journal segment holding the pending rows; caller holds `_lock`."""
+        if self._journal is None:
+            return
+        self._journal.close()
+        self._unflushed.append(self._journal_path)
+        self._open_segment()
+
+    def submit(self, session_id, user_id, question_id, answer_id, score, response_time=None):
+        row = (session_id, user_id, question_id, answer_id, score, response_time)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('answer buffer is closed')
+            if self._journal is not None:
+                self._journal.write(json.dumps(row) + '\n')
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            if self._thread is not None:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def is_pending(self, session_id, question_id=None):
+        with self._lock:
+            return any(r[0] == session_id and (question_id is None or r[2] == question_id) for r in self._pending)
+
+    def flush(self):
+        """Write everything submitted so far; returns the number of answers written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                if rows:
+                    self._rotate()
+                segments, self._unflushed = self._unflushed, []
+            try:
+                written = write_answers(rows)
+            except Exception:
+                self._failures += 1
+                if self._failures < self.max_attempts:
+                    with self._lock:
+                        # keep them for the next attempt; the journal still has them
+                        self._pending[:0] = rows
+                        self._unflushed[:0] = segments
+                    raise
+                # not going away by itself: find the rows at fault instead of retrying forever
+                written = self._write_each(rows)
+            self._failures = 0
+            for path in segments:
+                path.unlink(missing_ok=True)
+            return written
+
+    def _write_each(self, rows):
+        """Write `rows` one at a time and set aside those that fail on their own."""
+        written = 0
+        failed = []
+        for row in rows:
+            try:
+                written += write_answers([row])
+            except Exception:
+                logger.exception('Could not write answer %r, setting it aside', row)
+                failed.append(row)
+        if failed and self._journal_dir is not None:
+            with open(self._journal_dir / f'rejected-{self._writer}.jsonl', 'a') as fh:
+                fh.writelines(json.dumps(row) + '\n' for row in failed)
+        return written
+
+    def _run(self):
+        try:
+            while not self._closed:
+                self._wakeup.wait(self.delay)
+                self._wakeup.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Writing buffered answers failed, will retry')
+        finally:
+            connection.close()
+
+    def close(self):
+        """Stop the background thread and write what is left."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                # nothing left in it once the final flush went through
+                if not self._unflushed and self._journal_path.stat().st_size == 0:
+                    self._journal_path.unlink()
+                # whatever is still journaled is up for replay now
+                _lock_path(self._journal_dir, self._writer).unlink(missing_ok=True)
+                os.close(self._lock_fd)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The process-wide buffer, or None unless `ANSWER_BUFFER` is on."""
+    global _buffer
+    if not getattr(settings, 'ANSWER_BUFFER', False):
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AnswerBuffer(
+                    batch_size=settings.ANSWER_BUFFER_BATCH,
+                    delay=settings.ANSWER_BUFFER_DELAY,
+                    journal_dir=settings.ANSWER_BUFFER_JOURNAL_DIR,
+                    fsync=settings.ANSWER_BUFFER_FSYNC,
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def record_answer(session_id, user_id, question_id, answer_id, score, response_time=None):
+    """Store a scored answer, through the buffer when it's enabled.
+
+    `response_time` is in seconds, None when it isn't known. Returns False if
+    the session had answered the question already. A buffered answer is
+    checked when its batch is written, where a second one is dropped.
+    """
+    buffer = get_buffer()
+    if buffer is not None:
+        buffer.submit(session_id, user_id, question_id, answer_id, score, response_time)
+        return True
+    try:
+        with transaction.atomic():
+            PlayerAnswer.objects.create(
+                session_id=session_id,
+                user_id=user_id,
+                question_id=question_id,
+                selected_answer_id=answer_id,
+                score=score,
+                response_time=_duration(response_time),
+            )
+            # increment in the database so concurrent submits don't overwrite each other
+            if score:
+                QuizSession.objects.filter(id=session_id).update(total_score=F('total_score') + score)
+    except IntegrityError:
+        # a concurrent request got there first (playeranswer_session_question)
+        return False
+    return True
+
+
+def is_answered(session_id, question_id):
+    buffer = get_buffer()
+    if buffer is not None and buffer.is_pending(session_id, question_id):
+        return True
+    return PlayerAnswer.objects.filter(session_id=session_id, question_id=question_id).exists()
+
+
+def flush_session(session_id):
+    """Make sure the session's buffered answers are in the database."""
+    buffer = get_buffer()
+    if buffer is not None and buffer.is_pending(session_id):
+        buffer.flush()
@@ -0,0 +1,95 @@
+"""Per-quiz leaderboards backed by `LeaderboardEntry` and `LeaderboardScore`.
+
+An entry is added when a session completes, and the count of its score bucket
+goes up by one. Top-N reads walk the ``(quiz, [source,] -score, completed_at)``
+index from the start. A player's rank is 1 + the number of entries with a
+higher score (players with equal scores share a rank); it is summed from the
+score buckets, so its cost depends on the number of distinct scores, not on the
+number of sessions played.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+
+from .models import LeaderboardEntry, LeaderboardScore, QuizSession
+
+
+def record_completion(session):
+    """Put a just-completed session on its quiz leaderboard (call once per session)."""
+    with transaction.atomic():
+        LeaderboardEntry.objects.create(
+            session=session,
+            quiz_id=session.quiz_id,
+            user_id=session.user_id,
+            source=session.source,
+            score=session.total_score,
+            completed_at=session.completed_at,
+        )
+        _bump_bucket(session.quiz_id, session.source, session.total_score)
+
+
+def _bump_bucket(quiz_id, source, score):
+    bucket = LeaderboardScore.objects.filter(quiz_id=quiz_id, source=source, score=score)
+    if bucket.update(players=F('players') + 1):
+        return
+    try:
+        with transaction.atomic():
+            LeaderboardScore.objects.create(quiz_id=quiz_id, source=source, score=score, players=1)
+    except IntegrityError:
+        # somebody else created the bucket in the meantime
+        bucket.update(players=F('players') + 1)
+
+
+def top(quiz_id, source=None, limit=10):
+    entries = LeaderboardEntry.objects.filter(quiz_id=quiz_id)
+    if source is not None:
+        entries = entries.filter(source=source)
+    return entries.select_related('user__userprofile').order_by('-score', 'completed_at')[:limit]
+
+
+def rank_of(quiz_id, user, source=None):
+    """Return ``(rank, entry)`` for the user's best result, or ``(None, None)``."""
+    entries = LeaderboardEntry.objects.filter(quiz_id=quiz_id, user=user)
+    buckets = LeaderboardScore.objects.filter(quiz_id=quiz_id)
+    if source is not None:
+        entries = entries.filter(source=source)
+        buckets = buckets.filter(source=source)
+    best = entries.order_by('-score', 'completed_at').first()
+    if best is None:
+        return None, None
+    ahead = buckets.filter(score__gt=best.score).aggregate(players=Sum('players'))['players'] or 0
+    return ahead + 1, best
+
+
+def rebuild(quiz_id=None):
+    """Recreate entries and score buckets from completed sessions; returns the entry count.
+
+    Entries are copied with a single INSERT ... SELECT so rebuilding millions of
+    sessions doesn't round-trip every row through Python.
+    """
+    sessions = QuizSession.objects.filter(completed_at__isnull=False)
+    entries = LeaderboardEntry.objects.all()
+    buckets = LeaderboardScore.objects.all()
+    if quiz_id is not None:
+        sessions = sessions.filter(quiz_id=quiz_id)
+        entries = entries.filter(quiz_id=quiz_id)
+        buckets = buckets.filter(quiz_id=quiz_id)
+    entries.delete()
+    buckets.delete()
+
+    select_sql, params = (
+        sessions.order_by()
+        .values_list('quiz_id', 'id', 'user_id', 'source', 'total_score', 'completed_at')
+        .query.sql_with_params()
+    )
+    table = connection.ops.quote_name(LeaderboardEntry._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(c) for c in ('quiz_id', 'session_id', 'user_id', 'source', 'score', 'completed_at'))
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {select_sql}', params)
+        total = cursor.rowcount
+
+    counts = sessions.values('quiz_id', 'source', 'total_score').annotate(players=Count('id')).order_by()
+    LeaderboardScore.objects.bulk_create(
+        [LeaderboardScore(quiz_id=c['quiz_id'], source=c['source'], score=c['total_score'], players=c['players']) for c in counts],
+        batch_size=1000,
+    )
+    return total
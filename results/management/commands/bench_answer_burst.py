@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from quiz.bench import isolated_database, run_concurrently, summarize
+from quiz.models import Quiz, Question, Answer
+from results import ingest
+from results.models import PlayerAnswer, QuizSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Submit one answer per player all at once, written directly and through the '
+        'write-behind answer buffer (runs on a throwaway on-disk database).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent submitters')
+        parser.add_argument('--batch', type=int, default=200, help='ANSWER_BUFFER_BATCH for the buffered run')
+        parser.add_argument('--delay', type=float, default=0.05, help='ANSWER_BUFFER_DELAY for the buffered run')
+
+    def handle(self, *args, **options):
+        with isolated_database(on_disk=True):
+            self.run(options)
+
+    def run(self, options):
+        quiz = Quiz.objects.create(title='bench')
+        question = Question.objects.create(quiz=quiz, text='Q', order=1)
+        right = Answer.objects.create(question=question, text='yes', is_correct=True)
+        users = User.objects.bulk_create([User(username=f'bench-{i}') for i in range(options['players'])])
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        self.stdout.write(f"{'path':>9} {'ok':>5} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'all acked s':>11} {'all stored s':>12}")
+        for label in ('direct', 'buffered'):
+            sessions = QuizSession.objects.bulk_create([QuizSession(user=u, quiz=quiz) for u in users])
+            journal_dir = tempfile.mkdtemp(prefix='zapquiz-journal-')
+            buffer = None
+            if label == 'buffered':
+                buffer = ingest._buffer = ingest.AnswerBuffer(
+                    batch_size=options['batch'], delay=options['delay'], journal_dir=journal_dir,
+                )
+            try:
+                with override_settings(ANSWER_BUFFER=buffer is not None):
+                    start = time.perf_counter()
+                    latencies, errors = self.burst(clients, sessions, question, right, options['threads'])
+                    acked = time.perf_counter() - start
+                    if buffer is not None:
+                        buffer.close()
+                    stored = time.perf_counter() - start
+            finally:
+                ingest._buffer = None
+                shutil.rmtree(journal_dir, ignore_errors=True)
+            written = PlayerAnswer.objects.filter(session__in=sessions).count()
+            stats = summarize(latencies)
+            self.stdout.write(
+                f"{label:>9} {written:>5} {errors:>6} {stats['median_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                f"{stats['max_ms']:>8.1f} {acked:>11.2f} {stored:>12.2f}"
+            )
+
+    def burst(self, clients, sessions, question, answer, threads):
+        def submit(job):
+            client, session = job
+            response = client.post(reverse('submit_answer', args=[session.id, question.id]), {'answer_id': answer.id})
+            return response.status_code == 302
+
+        return run_concurrently(submit, list(zip(clients, sessions)), threads)
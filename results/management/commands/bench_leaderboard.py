@@ -0,0 +1,89 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from quiz.bench import isolated_database, summarize, timed
+from quiz.models import Quiz, HostedGame, HostedParticipant
+from results import leaderboard
+from results.models import QuizSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare leaderboard reads sorting QuizSession rows against the '
+        'materialized LeaderboardEntry index (runs on a throwaway database).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=1_000_000)
+        parser.add_argument('--players', type=int, default=10_000)
+        parser.add_argument('--hosted-share', type=float, default=0.2, help='Fraction of sessions from hosted games')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        random.seed(1)
+        quiz = Quiz.objects.create(title='bench', code='BENCH1')
+        users = User.objects.bulk_create([User(username=f'p{i}') for i in range(options['players'])])
+        self.stdout.write(f"seeding {options['sessions']} sessions...")
+        seconds, _ = timed(self.seed, quiz, users, options)
+        self.stdout.write(f'  seeded in {seconds:.1f}s')
+        seconds, count = timed(leaderboard.rebuild, quiz.id)
+        self.stdout.write(f'  rebuilt {count} leaderboard entries in {seconds:.1f}s')
+
+        me = users[len(users) // 2]
+        cases = [
+            ('top 10, sessions', lambda: list(
+                QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False).order_by('-total_score')[:10])),
+            ('top 50 code, sessions', lambda: list(
+                QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False)
+                .exclude(id__in=HostedParticipant.objects.filter(hosted_game__quiz=quiz, session__isnull=False).values_list('session_id', flat=True))
+                .order_by('-total_score')[:50])),
+            ('top 10, entries', lambda: list(leaderboard.top(quiz.id, limit=10))),
+            ('top 50 code, entries', lambda: list(leaderboard.top(quiz.id, source='code', limit=50))),
+            ('my rank, entries', lambda: leaderboard.rank_of(quiz.id, me)),
+            ('my rank code, entries', lambda: leaderboard.rank_of(quiz.id, me, source='code')),
+        ]
+        self.stdout.write(f"{'query':<24} {'median ms':>10} {'p95 ms':>9}")
+        for label, query in cases:
+            durations = [timed(query)[0] for _ in range(options['repeat'])]
+            stats = summarize(durations)
+            self.stdout.write(f"{label:<24} {stats['median_ms']:>10.2f} {stats['p95_ms']:>9.2f}")
+
+    def seed(self, quiz, users, options):
+        host = users[0]
+        game = HostedGame.objects.create(quiz=quiz, host=host, run_code='BENCH2')
+        start = timezone.now() - timedelta(days=30)
+        batch = []
+        hosted_users = set()
+        with transaction.atomic():
+            for i in range(options['sessions']):
+                hosted = random.random() < options['hosted_share']
+                user = random.choice(users)
+                batch.append(QuizSession(
+                    user=user, quiz=quiz, source='hosted' if hosted else 'code',
+                    completed_at=start + timedelta(seconds=i), total_score=random.randint(0, 20),
+                ))
+                if len(batch) == 10_000:
+                    self.flush(batch, game, hosted_users)
+                    batch = []
+            if batch:
+                self.flush(batch, game, hosted_users)
+
+    @staticmethod
+    def flush(batch, game, hosted_users):
+        sessions = QuizSession.objects.bulk_create(batch)
+        # one participant row per user and game, like the real lobby
+        participants = []
+        for s in sessions:
+            if s.source == 'hosted' and s.user_id not in hosted_users:
+                hosted_users.add(s.user_id)
+                participants.append(HostedParticipant(hosted_game=game, user_id=s.user_id, session=s))
+        HostedParticipant.objects.bulk_create(participants)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from results import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Export answers and sessions added since the last run to column files and '
+        'recompute the question statistics of the quizzes they belong to (needs NumPy).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Where the column files live (default: ANALYTICS_DIR)')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Answer rows read per query')
+        parser.add_argument('--lag', type=int, help='Leave rows younger than this many seconds for the next run (default: ANALYTICS_EXPORT_LAG)')
+        parser.add_argument('--all', action='store_true', help='Recompute the statistics of every exported quiz')
+        parser.add_argument('--compact-after', type=int, default=50, help='Merge the chunks once there are this many')
+
+    def handle(self, *args, **options):
+        try:
+            answers, sessions, quizzes = analytics.export(options['dir'], options['batch_size'], options['lag'])
+            if len(analytics.read_manifest(options['dir'])['chunks']) >= options['compact_after']:
+                analytics.compact(options['dir'])
+            saved = analytics.compute_stats(None if options['all'] else quizzes, options['dir'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {answers} answers and {sessions} sessions, updated stats of {saved} quizzes'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from results import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild quiz leaderboards from completed sessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only rebuild this quiz id')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = leaderboard.rebuild(quiz_id=options['quiz'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} leaderboard entries'))
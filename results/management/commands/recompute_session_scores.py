@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from results.models import QuizSession, PlayerAnswer
+
+
+class Command(BaseCommand):
+    help = (
+        'Link answers recorded before PlayerAnswer.session existed to their sessions '
+        'and rebuild QuizSession.total_score from the linked answers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only repair sessions of this quiz id')
+        parser.add_argument('--no-link', action='store_true', help='Skip linking orphaned answers, only rebuild totals')
+
+    def handle(self, *args, **options):
+        sessions = QuizSession.objects.all()
+        if options['quiz']:
+            sessions = sessions.filter(quiz_id=options['quiz'])
+
+        with transaction.atomic():
+            linked = 0
+            if not options['no_link']:
+                linked = self.link_orphans(sessions)
+
+            # one UPDATE for all sessions; sessions without linked answers keep
+            # whatever total they had so legacy data is never zeroed out
+            answers = PlayerAnswer.objects.filter(session=OuterRef('pk'))
+            totals = answers.order_by().values('session').annotate(total=Sum('score')).values('total')
+            updated = sessions.filter(Exists(answers)).update(
+                total_score=Coalesce(Subquery(totals), Value(0))
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Linked {linked} answers, recomputed {updated} sessions'))
+
+    def link_orphans(self, sessions):
+        """Attach answers without a session to the session they were given in.
+
+        Newest sessions claim answers first, so when two sessions of the same user
+        overlap the later answers go to the later session. A session takes one
+        answer per question, its first (playeranswer_session_question); repeats
+        stay unlinked.
+        """
+        orphans = PlayerAnswer.objects.filter(session__isnull=True)
+        if not orphans.exists():
+            return 0
+        linked = 0
+        for session in sessions.order_by('-started_at').iterator():
+            candidates = orphans.filter(
+                user_id=session.user_id,
+                question__quiz_id=session.quiz_id,
+                answered_at__gte=session.started_at,
+            )
+            if session.completed_at is not None:
+                candidates = candidates.filter(answered_at__lte=session.completed_at)
+            candidates = candidates.exclude(question_id__in=PlayerAnswer.objects.filter(session=session).values('question_id'))
+            first = candidates.order_by().values('question_id').annotate(first=Min('id')).values('first')
+            linked += PlayerAnswer.objects.filter(id__in=first).update(session=session)
+        return linked
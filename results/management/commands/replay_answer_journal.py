@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from results.ingest import replay_journals
+
+
+class Command(BaseCommand):
+    help = (
+        'Write answers left in the answer buffer journal by processes that died before flushing. '
+        'Journals of running processes are left alone; answers already in the database are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal-dir', default=str(settings.ANSWER_BUFFER_JOURNAL_DIR))
+
+    def handle(self, *args, **options):
+        replayed = replay_journals(options['journal_dir'])
+        self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} answers'))
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+
+from quiz.bench import isolated_database, run_concurrently, summarize, timed
+from quiz.models import Quiz, Question, Answer
+from results.models import LeaderboardEntry, PlayerAnswer, QuizSession
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Stress the configured database profile (ZAPQUIZ_DB) with many threads answering and '
+        'finishing quizzes through the play view at once, then check nothing was lost. '
+        'Runs on a throwaway database; exits non-zero on any failed request or wrong total.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=5)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--plain', action='store_true', help='Drop the profile OPTIONS (old untuned settings) for comparison')
+
+    def handle(self, *args, **options):
+        if options['plain']:
+            connection.settings_dict['OPTIONS'] = {}
+        with isolated_database(on_disk=True):
+            self.run(options)
+
+    def describe(self):
+        if connection.vendor != 'sqlite':
+            return f'{connection.vendor}, CONN_MAX_AGE={connection.settings_dict["CONN_MAX_AGE"]}, OPTIONS={connection.settings_dict["OPTIONS"]}'
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                pragmas[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+        return f'sqlite, {pragmas}'
+
+    def run(self, options):
+        self.stdout.write(self.describe())
+        quiz = Quiz.objects.create(title='stress')
+        questions = []
+        for order in range(1, options['questions'] + 1):
+            question = Question.objects.create(quiz=quiz, text=f'Q{order}', order=order)
+            right = Answer.objects.create(question=question, text='yes', is_correct=True)
+            wrong = Answer.objects.create(question=question, text='no')
+            # every other question answered right
+            questions.append((question, right if order % 2 else wrong))
+        users = User.objects.bulk_create([User(username=f'stress-{i}') for i in range(options['players'])])
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users])
+        sessions = QuizSession.objects.bulk_create([QuizSession(user=u, quiz=quiz) for u in users])
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        def play(job):
+            client, session = job
+            for question, answer in questions:
+                if client.post(reverse('submit_answer', args=[session.id, question.id]), {'answer_id': answer.id}).status_code != 302:
+                    return False
+            # finishing writes the leaderboard entry, its score bucket and the profile totals
+            return client.get(reverse('quiz_question', args=[session.id, len(questions) + 1])).status_code == 200
+
+        seconds, (latencies, failures) = timed(run_concurrently, play, list(zip(clients, sessions)), options['threads'])
+        stats = summarize(latencies)
+        self.stdout.write(
+            f"{len(sessions)} players x {len(questions)} answers in {seconds:.2f}s, "
+            f"per player p50 {stats['median_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, failed {failures}"
+        )
+
+        per_player = sum(1 for order in range(1, len(questions) + 1) if order % 2)
+        checks = {
+            'answers stored': (PlayerAnswer.objects.filter(session__quiz=quiz).count(), len(sessions) * len(questions)),
+            'session totals': (QuizSession.objects.filter(quiz=quiz).aggregate(t=Sum('total_score'))['t'], len(sessions) * per_player),
+            'sessions finished': (QuizSession.objects.filter(quiz=quiz, completed_at__isnull=False).count(), len(sessions)),
+            'leaderboard entries': (LeaderboardEntry.objects.filter(quiz=quiz).count(), len(sessions)),
+            'profile points': (UserProfile.objects.aggregate(t=Sum('points_earned'))['t'], len(sessions) * per_player),
+        }
+        wrong = []
+        for name, (got, expected) in checks.items():
+            self.stdout.write(f'  {name:<20} {got} / {expected}')
+            if got != expected:
+                wrong.append(name)
+        if failures or wrong:
+            raise CommandError(f'{failures} failed requests, wrong: {", ".join(wrong) or "-"}')
+        self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    QuizSession = apps.get_model('results', 'QuizSession')
+    HostedParticipant = apps.get_model('quiz', 'HostedParticipant')
+    LeaderboardEntry = apps.get_model('results', 'LeaderboardEntry')
+    LeaderboardScore = apps.get_model('results', 'LeaderboardScore')
+
+    hosted_ids = HostedParticipant.objects.filter(session__isnull=False).values('session_id')
+    QuizSession.objects.filter(id__in=hosted_ids).update(source='hosted')
+
+    completed = QuizSession.objects.filter(completed_at__isnull=False)
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(
+            quiz_id=s.quiz_id, session_id=s.id, user_id=s.user_id,
+            source=s.source, score=s.total_score, completed_at=s.completed_at,
+        )
+        for s in completed
+    ])
+    buckets = completed.values('quiz_id', 'source', 'total_score').annotate(players=Count('id')).order_by()
+    LeaderboardScore.objects.bulk_create([
+        LeaderboardScore(quiz_id=b['quiz_id'], source=b['source'], score=b['total_score'], players=b['players'])
+        for b in buckets
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_answer_image_question_image'),
+        ('results', '0002_playeranswer_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsession',
+            name='source',
+            field=models.CharField(choices=[('code', 'Code'), ('hosted', 'Hosted')], default='code', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('code', 'Code'), ('hosted', 'Hosted')], max_length=10)),
+                ('score', models.IntegerField()),
+                ('completed_at', models.DateTimeField()),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='quiz.quiz')),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='results.quizsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quiz', '-score', 'completed_at'], name='leaderboard_quiz_rank'), models.Index(fields=['quiz', 'source', '-score', 'completed_at'], name='leaderboard_source_rank')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('code', 'Code'), ('hosted', 'Hosted')], max_length=10)),
+                ('score', models.IntegerField()),
+                ('players', models.PositiveIntegerField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_scores', to='quiz.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'source', 'score'), name='leaderboard_score_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
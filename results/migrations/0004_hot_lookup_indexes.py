@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_hot_lookup_indexes'),
+        ('results', '0003_leaderboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playeranswer',
+            index=models.Index(fields=['user', 'question'], name='playeranswer_user_question'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['quiz', 'completed_at', 'total_score'], name='session_quiz_completed'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0006_quiz_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsession',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
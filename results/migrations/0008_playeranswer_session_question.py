@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def drop_duplicates(apps, schema_editor):
+    PlayerAnswer = apps.get_model('results', 'PlayerAnswer')
+    QuizSession = apps.get_model('results', 'QuizSession')
+
+    groups = (
+        PlayerAnswer.objects.filter(session__isnull=False).values('session_id', 'question_id')
+        .annotate(n=Count('id'), first=Min('id')).filter(n__gt=1).order_by()
+    )
+    for group in groups:
+        extra = PlayerAnswer.objects.filter(
+            session_id=group['session_id'], question_id=group['question_id'],
+        ).exclude(id=group['first'])
+        extra_score = sum(extra.values_list('score', flat=True))
+        extra.delete()
+        # finished sessions keep their total, it is on the leaderboard and in the summary already
+        if extra_score:
+            QuizSession.objects.filter(id=group['session_id'], completed_at__isnull=True).update(
+                total_score=F('total_score') - extra_score,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0007_quizsession_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='playeranswer',
+            constraint=models.UniqueConstraint(fields=('session', 'question'), name='playeranswer_session_question'),
+        ),
+    ]
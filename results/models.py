@@ -2,20 +2,36 @@ from django.db import models
 from quiz.models import Quiz, Question, Answer
 # Create your models here.
 class QuizSession(models.Model):
+    SOURCE_CHOICES = (
+        ('code', 'Code'),
+        ('hosted', 'Hosted'),
+    )
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    # how the player got in: by the quiz code / quiz page, or through a hosted game
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='code')
+    # set for sessions played in a hosted game, whose rounds the host drives
+    hosted_game = models.ForeignKey('quiz.HostedGame', null=True, blank=True, on_delete=models.SET_NULL, related_name='sessions')
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     total_score = models.IntegerField(default=0)
+    # the session's answers frozen when it finishes, see results/finalize.py
+    summary = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Відповідь"
         verbose_name_plural = "Відповіді"
+        indexes = [
+            models.Index(fields=['quiz', 'completed_at', 'total_score'], name='session_quiz_completed'),
+        ]
         
     def __str__(self):
         return f"Сесія {self.user.username} для {self.quiz.title}"
 
 class PlayerAnswer(models.Model):
+    # The session this answer was given in; nullable for rows created before
+    # answers were linked to sessions (see `recompute_session_scores`).
+    session = models.ForeignKey(QuizSession, null=True, blank=True, on_delete=models.CASCADE)
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
@@ -23,5 +39,72 @@ class PlayerAnswer(models.Model):
     response_time = models.DurationField(null=True, blank=True)
     answered_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'question'], name='playeranswer_user_question'),
+        ]
+        constraints = [
+            # a question is answered once per session; legacy rows without a session are exempt (NULLs differ)
+            models.UniqueConstraint(fields=['session', 'question'], name='playeranswer_session_question'),
+        ]
+
     def __str__(self):
         return f"Відповідь {self.user.username} на {self.question.text}"
+
+
+class LeaderboardEntry(models.Model):
+    """A completed session's place on its quiz leaderboard.
+
+    Written once when the session finishes (see `results.leaderboard`), so
+    leaderboard pages read a narrow, score-ordered index instead of sorting
+    every session of the quiz.
+    """
+    quiz = models.ForeignKey(Quiz, related_name='leaderboard_entries', on_delete=models.CASCADE)
+    session = models.OneToOneField(QuizSession, related_name='leaderboard_entry', on_delete=models.CASCADE)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    source = models.CharField(max_length=10, choices=QuizSession.SOURCE_CHOICES)
+    score = models.IntegerField()
+    completed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', '-score', 'completed_at'], name='leaderboard_quiz_rank'),
+            models.Index(fields=['quiz', 'source', '-score', 'completed_at'], name='leaderboard_source_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.score} ({self.quiz.title})"
+
+
+class LeaderboardScore(models.Model):
+    """How many leaderboard entries of a quiz (and source) have a given score.
+
+    There are only as many rows per quiz as distinct scores, which makes a
+    player's rank a short sum instead of a count over every entry.
+    """
+    quiz = models.ForeignKey(Quiz, related_name='leaderboard_scores', on_delete=models.CASCADE)
+    source = models.CharField(max_length=10, choices=QuizSession.SOURCE_CHOICES)
+    score = models.IntegerField()
+    players = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'source', 'score'], name='leaderboard_score_bucket'),
+        ]
+
+
+class QuizStats(models.Model):
+    """Per-question statistics of a quiz, precomputed by `results.analytics`.
+
+    `questions` holds one entry per question in play order: attempts,
+    correct share, mean response time, how many players reached it and left
+    before it, and how often each answer was picked.
+    """
+    quiz = models.OneToOneField(Quiz, related_name='stats', on_delete=models.CASCADE)
+    sessions = models.PositiveIntegerField(default=0)
+    answers = models.PositiveIntegerField(default=0)
+    questions = models.JSONField(default=list)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Статистика {self.quiz.title}"
@@ -1,3 +1,387 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from quiz.compiled import get_compiled_quiz
+from quiz.models import Quiz, Question, Answer
+from users.models import UserProfile
+from . import analytics, finalize, ingest, leaderboard, timing
+from .models import QuizSession, PlayerAnswer, LeaderboardEntry, LeaderboardScore, QuizStats
+
+
+class SessionScoringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123')
+        self.questions = []
+        for order in (1, 2):
+            q = Question.objects.create(quiz=self.quiz, text=f'Q{order}', order=order)
+            right = Answer.objects.create(question=q, text='yes', is_correct=True)
+            wrong = Answer.objects.create(question=q, text='no')
+            self.questions.append((q, right, wrong))
+        self.client.force_login(self.user)
+
+    def submit(self, session, question, answer):
+        return self.client.post(
+            reverse('submit_answer', args=[session.id, question.id]),
+            {'answer_id': answer.id},
+        )
+
+    def test_score_only_counts_answers_of_the_session(self):
+        first = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        q, right, _ = self.questions[0]
+        self.submit(first, q, right)
+
+        second = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        self.submit(second, q, right)
+        q2, _, wrong = self.questions[1]
+        self.submit(second, q2, wrong)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.total_score, 1)
+        self.assertEqual(second.total_score, 1)
+        self.assertEqual(second.playeranswer_set.count(), 2)
+
+    def test_speed_scoring_uses_server_side_show_times(self):
+        Quiz.objects.filter(id=self.quiz.id).update(scoring_mode='linear', time_limit=timedelta(seconds=20))
+        session = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        (q, right, _), (q2, right2, _) = self.questions
+        self.client.get(reverse('quiz_question', args=[session.id, 1]))
+        # pretend the first question has been on screen for 5 of its 20 seconds
+        cache.set(timing.SHOWN_KEY.format(session_id=session.id, question_id=q.id), time.time() - 5)
+        self.submit(session, q, right)
+        # never shown by the server: counts as answered at the limit
+        self.submit(session, q2, right2)
+        self.client.get(reverse('quiz_question', args=[session.id, 3]))
+
+        first, second = session.playeranswer_set.order_by('question__order')
+        self.assertAlmostEqual(first.response_time.total_seconds(), 5, delta=1)
+        self.assertAlmostEqual(first.score, 875, delta=25)
+        self.assertEqual((second.response_time, second.score), (None, 500))
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.timed_answers, profile.response_time), (1, first.response_time))
+
+    def test_finishing_freezes_a_summary_once(self):
+        (q, right, _), (q2, _, wrong) = self.questions
+        # two overlapping sessions of the same player
+        first = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        second = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        self.submit(first, q, right)
+        self.submit(second, q, right)
+        self.submit(second, q2, wrong)
+        self.submit(first, q2, right)
+
+        response = self.client.get(reverse('quiz_question', args=[second.id, 3]))
+        second.refresh_from_db()
+        self.assertEqual([a[:3] for a in second.summary['answers']], [[q.id, right.id, True], [q2.id, wrong.id, False]])
+        self.assertEqual((second.summary['answered'], second.summary['correct']), (2, 1))
+        self.assertContains(response, 'Правильних відповідей:</strong> 1 з 2')
+
+        # reloading renders the frozen summary: no answer rows, nothing recorded twice
+        get_compiled_quiz(self.quiz.id)
+        with self.assertNumQueries(3):  # django session, user, quiz session
+            response = self.client.get(reverse('quiz_question', args=[second.id, 3]))
+        self.assertEqual(len(response.context['rows']), 2)
+        self.assertFalse(finalize.finalize(second))
+        self.assertEqual(LeaderboardEntry.objects.filter(session=second).count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).sessions_completed, 1)
+
+    def test_failed_finish_leaves_the_session_open(self):
+        session = QuizSession.objects.create(user=self.user, quiz=self.quiz)
+        q, right, _ = self.questions[0]
+        self.submit(session, q, right)
+        with mock.patch('results.leaderboard.record_completion', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                finalize.finalize(session)
+        self.assertFalse(QuizSession.objects.filter(id=session.id, completed_at__isnull=False).exists())
+        self.assertTrue(finalize.finalize(session))
+        self.assertEqual(LeaderboardEntry.objects.get(session=session).score, 1)
+
+    def test_recompute_links_orphans_and_rebuilds_totals(self):
+        session = QuizSession.objects.create(user=self.user, quiz=self.quiz, total_score=7)
+        for q, right, _ in self.questions:
+            PlayerAnswer.objects.create(user=self.user, question=q, selected_answer=right, score=1)
+        # answered again; a session keeps one answer per question
+        q, right, _ = self.questions[0]
+        repeat = PlayerAnswer.objects.create(user=self.user, question=q, selected_answer=right, score=1)
+
+        call_command('recompute_session_scores', stdout=StringIO())
+
+        session.refresh_from_db()
+        self.assertEqual(session.total_score, 2)
+        self.assertEqual(list(PlayerAnswer.objects.filter(session__isnull=True)), [repeat])
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123')
+        q = Question.objects.create(quiz=self.quiz, text='Q', order=1)
+        Answer.objects.create(question=q, text='yes', is_correct=True)
+
+    def finish(self, username, score, source='code'):
+        user = User.objects.create_user(username, password='pass12345')
+        session = QuizSession.objects.create(user=user, quiz=self.quiz, source=source, total_score=score)
+        self.client.force_login(user)
+        self.client.get(reverse('quiz_question', args=[session.id, 2]))
+        return user, session
+
+    def test_completion_feeds_top_and_rank(self):
+        alice, _ = self.finish('alice', 3)
+        bob, _ = self.finish('bob', 5, source='hosted')
+        carol, session = self.finish('carol', 3)
+        # finishing twice must not count twice
+        self.client.get(reverse('quiz_question', args=[session.id, 2]))
+
+        self.assertEqual([e.user for e in leaderboard.top(self.quiz.id)], [bob, alice, carol])
+        self.assertEqual([e.user for e in leaderboard.top(self.quiz.id, source='code')], [alice, carol])
+        self.assertEqual(leaderboard.rank_of(self.quiz.id, carol)[0], 2)
+        self.assertEqual(leaderboard.rank_of(self.quiz.id, carol, source='code')[0], 1)
+        self.assertEqual(leaderboard.rank_of(self.quiz.id, User.objects.create_user('dave')), (None, None))
+
+        response = self.client.get(reverse('quiz_code_leaderboard', args=[self.quiz.id]))
+        self.assertNotContains(response, 'bob')
+        self.assertEqual(response.context['my_rank'], 1)
+
+    def test_rebuild_matches_incremental_state(self):
+        self.finish('alice', 3)
+        self.finish('bob', 5)
+        before = list(LeaderboardScore.objects.order_by('score').values_list('score', 'players'))
+
+        self.assertEqual(leaderboard.rebuild(), 2)
+        self.assertEqual(list(LeaderboardScore.objects.order_by('score').values_list('score', 'players')), before)
+        self.assertEqual(LeaderboardEntry.objects.count(), 2)
+
+
+class AnswerBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.journal_dir = Path(tempfile.mkdtemp(prefix='zapquiz-journal-'))
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+        self.user = User.objects.create_user('player', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123')
+        self.question = Question.objects.create(quiz=self.quiz, text='Q', order=1)
+        self.right = Answer.objects.create(question=self.question, text='yes', is_correct=True)
+        self.sessions = [QuizSession.objects.create(user=self.user, quiz=self.quiz) for _ in range(3)]
+
+    def row(self, session, score=1):
+        return (session.id, self.user.id, self.question.id, self.right.id, score, None)
+
+    def test_batches_are_written_when_full(self):
+        buffer = ingest.AnswerBuffer(batch_size=3, delay=None, journal_dir=self.journal_dir)
+        buffer.submit(*self.row(self.sessions[0]))
+        buffer.submit(*self.row(self.sessions[1]))
+        self.assertFalse(PlayerAnswer.objects.exists())
+        self.assertEqual(sum(len(p.read_text().splitlines()) for p in self.journal_dir.iterdir()), 2)
+
+        # savepoint, sessions, answers, answered questions, insert, one UPDATE for delta 1, one for 2, release
+        with self.assertNumQueries(8):
+            buffer.submit(*self.row(self.sessions[2], score=2))
+        self.assertEqual(PlayerAnswer.objects.count(), 3)
+        self.assertEqual([s.total_score for s in QuizSession.objects.order_by('id')], [1, 1, 2])
+        buffer.close()
+        self.assertEqual(list(self.journal_dir.iterdir()), [])
+
+    def test_second_answer_to_a_question_is_dropped(self):
+        session = self.sessions[0]
+        self.assertEqual(ingest.write_answers([self.row(session), self.row(session, score=2)]), 1)
+        self.assertEqual(ingest.write_answers([self.row(session)]), 0)
+        session.refresh_from_db()
+        self.assertEqual((session.playeranswer_set.count(), session.total_score), (1, 1))
+
+    def test_rows_of_deleted_questions_are_dropped(self):
+        gone = Question.objects.create(quiz=self.quiz, text='Gone', order=2)
+        gone_answer = Answer.objects.create(question=gone, text='a', is_correct=True)
+        row = (self.sessions[1].id, self.user.id, gone.id, gone_answer.id, 1, None)
+        gone.delete()
+        self.assertEqual(ingest.write_answers([self.row(self.sessions[0]), row]), 1)
+        self.assertEqual(list(PlayerAnswer.objects.values_list('session_id', flat=True)), [self.sessions[0].id])
+
+    def test_rows_that_keep_failing_are_set_aside(self):
+        write_answers = ingest.write_answers
+        bad = self.sessions[1].id
+
+        def failing(rows):
+            if any(r[0] == bad for r in rows):
+                raise IntegrityError('bad row')
+            return write_answers(rows)
+
+        buffer = ingest.AnswerBuffer(batch_size=100, delay=None, journal_dir=self.journal_dir, max_attempts=2)
+        for session in self.sessions:
+            buffer.submit(*self.row(session))
+        with mock.patch.object(ingest, 'write_answers', failing):
+            with self.assertRaises(IntegrityError):
+                buffer.flush()
+            with self.assertLogs('results.ingest', 'ERROR'):
+                self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(PlayerAnswer.objects.count(), 2)
+        rejected = self.journal_dir / f'rejected-{buffer._writer}.jsonl'
+        self.assertEqual([json.loads(line)[0] for line in rejected.read_text().splitlines()], [bad])
+        # later batches aren't held up
+        self.assertEqual(buffer.flush(), 0)
+        buffer.close()
+
+    def test_journal_of_a_dead_process_is_replayed_once(self):
+        ingest.write_answers([self.row(self.sessions[0])])
+        journal = self.journal_dir / 'answers-999999999-000001.jsonl'
+        journal.write_text(
+            json.dumps(self.row(self.sessions[0])) + '\n' + json.dumps(self.row(self.sessions[1])) + '\n' + '[1, 2'
+        )
+        self.assertEqual(ingest.replay_journals(self.journal_dir), 1)
+        self.assertEqual(PlayerAnswer.objects.count(), 2)
+        self.assertFalse(journal.exists())
+
+    def test_replay_claims_each_segment_once(self):
+        journal = self.journal_dir / 'answers-999999999-000001.jsonl'
+        journal.write_text(json.dumps(self.row(self.sessions[0])) + '\n')
+        # another replay running right now has it
+        running, fd = ingest._lock_writer(self.journal_dir)
+        self.addCleanup(os.close, fd)
+        taken = self.journal_dir / f'replaying-{running}-answers-999999998-000001.jsonl'
+        taken.write_text(json.dumps(self.row(self.sessions[1])) + '\n')
+        # one that died halfway
+        dropped = self.journal_dir / 'replaying-999999997-answers-999999998-000002.jsonl'
+        dropped.write_text(json.dumps(self.row(self.sessions[2])) + '\n')
+
+        claimed, segment = ingest._claim(journal, '1.ab')
+        self.assertEqual((claimed.name, segment), (f'replaying-1.ab-{journal.name}', journal))
+        self.assertIsNone(ingest._claim(journal, '1.ab'))
+        os.rename(claimed, journal)
+
+        self.assertEqual(ingest.replay_journals(self.journal_dir), 2)
+        self.assertEqual(
+            set(PlayerAnswer.objects.values_list('session_id', flat=True)), {self.sessions[0].id, self.sessions[2].id},
+        )
+        self.assertEqual(set(self.journal_dir.iterdir()), {taken, self.journal_dir / f'writer-{running}.lock'})
+
+    def test_journals_are_told_apart_by_lock_not_pid(self):
+        # a crashed process whose pid we got: its lock file is left, but nobody holds it
+        crashed = f'{os.getpid()}.0dead0'
+        (self.journal_dir / f'writer-{crashed}.lock').touch()
+        (self.journal_dir / f'answers-{crashed}-000001.jsonl').write_text(json.dumps(self.row(self.sessions[0])) + '\n')
+        # a running process, whatever its pid is now
+        running, fd = ingest._lock_writer(self.journal_dir)
+        self.addCleanup(os.close, fd)
+        live = self.journal_dir / f'answers-{running}-000001.jsonl'
+        live.write_text(json.dumps(self.row(self.sessions[1])) + '\n')
+
+        buffer = ingest.AnswerBuffer(batch_size=100, delay=None, journal_dir=self.journal_dir)
+        self.assertEqual(list(PlayerAnswer.objects.values_list('session_id', flat=True)), [self.sessions[0].id])
+        buffer.submit(*self.row(self.sessions[2]))
+        buffer.close()
+        self.assertEqual(PlayerAnswer.objects.count(), 2)
+        self.assertEqual(set(self.journal_dir.iterdir()), {live, self.journal_dir / f'writer-{running}.lock'})
+
+    @override_settings(ANSWER_BUFFER=True)
+    def test_play_view_flushes_before_finishing(self):
+        ingest._buffer = ingest.AnswerBuffer(batch_size=100, delay=None)
+        self.addCleanup(setattr, ingest, '_buffer', None)
+        self.client.force_login(self.user)
+        session = self.sessions[0]
+        self.client.post(reverse('submit_answer', args=[session.id, self.question.id]), {'answer_id': self.right.id})
+        self.assertFalse(PlayerAnswer.objects.exists())
+
+        self.client.get(reverse('quiz_question', args=[session.id, 2]))
+        session.refresh_from_db()
+        self.assertEqual(session.total_score, 1)
+        self.assertEqual(LeaderboardEntry.objects.get(session=session).score, 1)
+
+
+@skipUnless(importlib.util.find_spec('numpy'), 'needs NumPy')
+@override_settings(ANALYTICS_EXPORT_LAG=0)
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.export_dir = Path(tempfile.mkdtemp(prefix='zapquiz-analytics-'))
+        self.addCleanup(shutil.rmtree, self.export_dir, ignore_errors=True)
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123', creator=self.author)
+        self.q1 = Question.objects.create(quiz=self.quiz, text='Q1', order=1)
+        self.q2 = Question.objects.create(quiz=self.quiz, text='Q2', order=2)
+        self.right = Answer.objects.create(question=self.q1, text='yes', is_correct=True)
+        self.wrong = Answer.objects.create(question=self.q1, text='no')
+        self.unused = Answer.objects.create(question=self.q1, text='never')
+        self.q2_right = Answer.objects.create(question=self.q2, text='yes', is_correct=True)
+        self.sessions = [
+            QuizSession.objects.create(user=User.objects.create_user(f'p{i}'), quiz=self.quiz) for i in range(4)
+        ]
+
+    def answer(self, session, answer, seconds=None):
+        ingest.write_answers([(
+            session.id, session.user_id, answer.question_id, answer.id, 1 if answer.is_correct else 0,
+            seconds,
+        )])
+
+    def export(self):
+        out = StringIO()
+        call_command('export_analytics', dir=str(self.export_dir), stdout=out)
+        return out.getvalue()
+
+    def test_incremental_export_and_stats(self):
+        # three of four players answer the first question, one goes on to the second
+        self.answer(self.sessions[0], self.right, 2.0)
+        self.answer(self.sessions[1], self.right, 4.0)
+        self.answer(self.sessions[2], self.wrong)
+        self.answer(self.sessions[0], self.q2_right, 1.0)
+        self.assertIn('Exported 4 answers and 4 sessions, updated stats of 1 quizzes', self.export())
+
+        first, second = QuizStats.objects.get(quiz=self.quiz).questions
+        self.assertEqual((first['attempts'], first['reached'], first['mean_seconds']), (3, 3, 3.0))
+        self.assertAlmostEqual(first['correct_rate'], 2 / 3)
+        self.assertAlmostEqual(first['drop_off'], 1 / 4)
+        self.assertEqual([(a['picks'], a['weak_distractor']) for a in first['answers']], [(2, False), (1, False), (0, True)])
+        self.assertAlmostEqual(second['drop_off'], 2 / 3)
+
+        # the next run only reads what's new, the stats still cover everything
+        self.answer(self.sessions[1], self.q2_right)
+        self.assertIn('Exported 1 answers and 0 sessions', self.export())
+        self.assertEqual(len(analytics.read_manifest(self.export_dir)['chunks']), 2)
+        second = QuizStats.objects.get(quiz=self.quiz).questions[1]
+        self.assertEqual((second['attempts'], second['correct_rate']), (2, 1.0))
+        self.assertIn('Exported 0 answers', self.export())
+
+        analytics.compact(self.export_dir)
+        answers, sessions = analytics.load(directory=self.export_dir)
+        self.assertEqual((len(answers['id']), len(sessions['id'])), (5, 4))
+
+        self.client.force_login(self.author)
+        with self.assertNumQueries(4):  # session, user, quiz, stats
+            response = self.client.get(reverse('quiz_stats', args=[self.quiz.id]))
+        self.assertContains(response, 'Майже не обирають')
+        self.client.force_login(self.sessions[0].user)
+        self.assertEqual(self.client.get(reverse('quiz_stats', args=[self.quiz.id])).status_code, 403)
+
+    def test_recent_rows_wait_and_linked_orphans_are_exported_again(self):
+        self.answer(self.sessions[0], self.right)
+        with override_settings(ANALYTICS_EXPORT_LAG=60):
+            self.assertIn('Exported 0 answers and 0 sessions', self.export())
+
+        # given before answers had sessions
+        orphan = PlayerAnswer.objects.create(user=self.sessions[1].user, question=self.q1, selected_answer=self.wrong)
+        self.assertIn('Exported 2 answers and 4 sessions', self.export())
+        self.assertEqual(analytics.read_manifest(self.export_dir)['orphans'], [orphan.id])
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).questions[0]['reached'], 1)
+
+        PlayerAnswer.objects.filter(id=orphan.id).update(session=self.sessions[1])
+        self.assertIn('Exported 1 answers and 0 sessions', self.export())
+        self.assertEqual(analytics.read_manifest(self.export_dir)['orphans'], [])
+        answers, _ = analytics.load(directory=self.export_dir)
+        self.assertEqual(sorted(zip(answers['id'].tolist(), answers['session'].tolist()))[-1], (orphan.id, self.sessions[1].id))
+        self.assertEqual(len(answers['id']), 2)
+        first = QuizStats.objects.get(quiz=self.quiz).questions[0]
+        self.assertEqual((first['attempts'], first['reached']), (2, 2))
@@ -0,0 +1,53 @@
+"""When a question was put in front of a player, for server-side response times.
+
+The play views mark a question as shown when they send it to a player
+(`mark_shown`) and the answer view reads the mark back (`response_time`). Marks
+live in Django's cache next to the compiled quizzes and hosted rounds, so
+timing an answer costs no query. The first mark wins: reloading a question
+doesn't restart its clock.
+
+The latest question marked is also the session's current one
+(`current_question`): the single-page player only accepts answers to it and
+to the question after it.
+
+Hosted games don't need marks, every participant sees a round when the host
+opens it (``Round.started_at``).
+"""
+import time
+
+from django.core.cache import cache
+
+
+SHOWN_KEY = 'shown:{session_id}:{question_id}'
+CURRENT_KEY = 'current:{session_id}'
+SHOWN_TIMEOUT = 6 * 60 * 60
+
+
+def mark_shown(session_id, question_id, at=None):
+    cache.add(
+        SHOWN_KEY.format(session_id=session_id, question_id=question_id),
+        time.time() if at is None else at,
+        SHOWN_TIMEOUT,
+    )
+    cache.set(CURRENT_KEY.format(session_id=session_id), question_id, SHOWN_TIMEOUT)
+
+
+def current_question(session_id):
+    """Id of the question last shown in the session, None if the mark expired."""
+    return cache.get(CURRENT_KEY.format(session_id=session_id))
+
+
+def response_time(session_id, question_id, now=None, shown_at=None):
+    """Seconds between showing and answering the question, None if it was never marked.
+
+    Pass `shown_at` when the show time is known otherwise (hosted rounds). The
+    mark is dropped, a question is only answered once.
+    """
+    now = time.time() if now is None else now
+    key = SHOWN_KEY.format(session_id=session_id, question_id=question_id)
+    if shown_at is None:
+        shown_at = cache.get(key)
+        if shown_at is None:
+            return None
+        cache.delete(key)
+    return max(0.0, now - shown_at)
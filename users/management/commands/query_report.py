@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from users import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Print p50/p95/p99 of latency, query count, repeated queries, DB and template time per view, '
+        'as recorded by QueryProfileMiddleware. Needs a cache shared with the web workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only views whose name contains this')
+        parser.add_argument('--clear', action='store_true', help='Forget the recorded samples afterwards')
+
+    def handle(self, *args, **options):
+        samples = profiling.collect()
+        if options['view']:
+            samples = {v: s for v, s in samples.items() if options['view'] in v}
+        rows = profiling.report(samples)
+        if not rows:
+            self.stdout.write('No samples recorded (is QUERY_PROFILING on and the cache shared?)')
+        else:
+            self.stdout.write(
+                f"{'view':<32} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                f"{'sql p50':>7} {'sql p95':>7} {'sql p99':>7} {'dup p95':>7} {'db p95':>8} {'tpl p95':>8}"
+            )
+            for r in rows:
+                self.stdout.write(
+                    f"{r['view'][:32]:<32} {r['count']:>6} {r['total_ms_p50']:>8.1f} {r['total_ms_p95']:>8.1f} {r['total_ms_p99']:>8.1f} "
+                    f"{r['queries_p50']:>7} {r['queries_p95']:>7} {r['queries_p99']:>7} {r['duplicates_p95']:>7} "
+                    f"{r['db_ms_p95']:>8.1f} {r['template_ms_p95']:>8.1f}"
+                )
+        if options['clear']:
+            profiling.clear()
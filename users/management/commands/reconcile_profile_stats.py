@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-player totals behind the global leaderboard from completed sessions. '
+        'Safe to run periodically (e.g. nightly from cron).'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {updated} profiles'))
@@ -1,6 +1,16 @@
+import contextvars
+import time
+from contextlib import ExitStack
+
 from django.shortcuts import redirect
 from django.urls import reverse, NoReverseMatch
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import profiling
 
 class RequireRegistrationMiddleware:
     """Redirect anonymous users to registration page on first access.
@@ -57,3 +67,103 @@ class RequireRegistrationMiddleware:
 
         # Otherwise redirect to register page
         return redirect(self.register_path)
+
+
+_current_profile = contextvars.ContextVar('query_profile', default=None)
+
+
+class _RequestProfile:
+    __slots__ = ('queries', 'duplicates', 'db_seconds', 'template_seconds', 'template_depth', 'seen')
+
+    def __init__(self):
+        self.queries = 0
+        self.duplicates = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        # used as a connection execute_wrapper
+        self.queries += 1
+        if sql in self.seen:
+            # same statement again, usually an N+1 loop
+            self.duplicates += 1
+        else:
+            self.seen.add(sql)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+
+
+class ProfiledTemplate(Template):
+    """A Django template that adds its render time to the current request's profile."""
+
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        # render_to_string() inside a template would otherwise be counted twice
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_seconds += time.perf_counter() - start
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """The Django template backend, with templates timed for `QueryProfileMiddleware`.
+
+    Set as the ``BACKEND`` in TEMPLATES; outside a profiled request it costs a
+    context variable lookup per render.
+    """
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class QueryProfileMiddleware:
+    """Record queries, DB time, template time and latency per URL name.
+
+    Enabled with ``QUERY_PROFILING = True``; otherwise Django drops it from the
+    chain at startup. Keep it first in MIDDLEWARE so the latency covers the
+    whole stack. Template time is only measured with `ProfilingTemplates` as
+    the template backend. See users/profiling.py for where the samples go.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = _RequestProfile()
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current_profile.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        profiling.store.record(match.view_name if match else '<unresolved>', profiling.Sample(
+            queries=profile.queries,
+            duplicates=profile.duplicates,
+            db_ms=profile.db_seconds * 1000,
+            template_ms=profile.template_seconds * 1000,
+            total_ms=total * 1000,
+        ))
+        return response
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    QuizSession = apps.get_model('results', 'QuizSession')
+    totals = (
+        QuizSession.objects.filter(completed_at__isnull=False)
+        .values('user_id').annotate(points=models.Sum('total_score'), sessions=models.Count('id')).order_by()
+    )
+    for row in totals:
+        UserProfile.objects.filter(user_id=row['user_id']).update(
+            points_earned=row['points'],
+            sessions_completed=row['sessions'],
+            average_score=row['points'] / row['sessions'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('results', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='average_score',
+            field=models.FloatField(default=0, verbose_name='Середній бал'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='sessions_completed',
+            field=models.IntegerField(default=0, verbose_name='Пройдено вікторин'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-points_earned', '-average_score'], name='profile_global_rank'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:01
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='response_time_total',
+            field=models.DurationField(default=datetime.timedelta(0)),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='timed_answers',
+            field=models.PositiveIntegerField(default=0, verbose_name='Відповідей з відомим часом'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.db import models
 
 # Create your models here.
@@ -11,9 +13,18 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = "Профіль користувача"
         verbose_name_plural = "Профілі користувачів"
+        indexes = [
+            models.Index(fields=['-points_earned', '-average_score'], name='profile_global_rank'),
+        ]
 
+    # Totals over completed quiz sessions, kept up to date by users.stats
     points_earned = models.IntegerField(default=0)
+    sessions_completed = models.IntegerField(default=0, verbose_name="Пройдено вікторин")
+    average_score = models.FloatField(default=0, verbose_name="Середній бал")
+    # average over every answer with a known response time, from the two totals below
     response_time = models.DurationField(null=True, blank=True)
+    timed_answers = models.PositiveIntegerField(default=0, verbose_name="Відповідей з відомим часом")
+    response_time_total = models.DurationField(default=timedelta(0))
     role = models.CharField(max_length=50, blank=True, verbose_name="Роль користувача")
     class Admin:
         pass
@@ -0,0 +1,109 @@
+"""Per-view request profiles collected by `QueryProfileMiddleware`.
+
+Every profiled request adds one sample (query count, repeated queries, DB
+time, template render time, total time) to a fixed-size ring buffer for its URL
+name. The buffers live in the worker process; every `QUERY_PROFILING_FLUSH_EVERY`
+requests a copy is also written to the default cache, so the staff page and
+``manage.py query_report`` can merge what all workers saw when the cache is
+shared (file/Redis).
+"""
+import os
+import threading
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+Sample = namedtuple('Sample', 'queries duplicates db_ms template_ms total_ms')
+
+PIDS_KEY = 'queryprofile:pids'
+PROCESS_KEY = 'queryprofile:{pid}'
+CACHE_TIMEOUT = 24 * 60 * 60
+METRICS = ('total_ms', 'queries', 'duplicates', 'db_ms', 'template_ms')
+
+
+class ProfileStore:
+    def __init__(self, size=None, flush_every=None):
+        self.size = size or getattr(settings, 'QUERY_PROFILING_BUFFER', 1000)
+        self.flush_every = flush_every or getattr(settings, 'QUERY_PROFILING_FLUSH_EVERY', 100)
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._since_flush = 0
+
+    def record(self, view, sample):
+        with self._lock:
+            buffer = self._buffers.get(view)
+            if buffer is None:
+                buffer = self._buffers[view] = deque(maxlen=self.size)
+            buffer.append(sample)
+            self._since_flush += 1
+            flush = self._since_flush >= self.flush_every
+            if flush:
+                self._since_flush = 0
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {view: list(buffer) for view, buffer in self._buffers.items()}
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def flush(self):
+        """Publish this process's samples to the shared cache."""
+        pid = os.getpid()
+        samples = {view: [tuple(s) for s in buffer] for view, buffer in self.snapshot().items()}
+        cache.set(PROCESS_KEY.format(pid=pid), samples, CACHE_TIMEOUT)
+        pids = set(cache.get(PIDS_KEY) or ())
+        if pid not in pids:
+            pids.add(pid)
+            cache.set(PIDS_KEY, pids, CACHE_TIMEOUT)
+
+
+store = ProfileStore()
+
+
+def collect():
+    """Samples from every worker that flushed to the cache, plus this process's live ones."""
+    merged = {}
+    own = os.getpid()
+    for pid in cache.get(PIDS_KEY) or ():
+        if pid == own:
+            continue
+        for view, samples in (cache.get(PROCESS_KEY.format(pid=pid)) or {}).items():
+            merged.setdefault(view, []).extend(Sample(*s) for s in samples)
+    for view, samples in store.snapshot().items():
+        merged.setdefault(view, []).extend(samples)
+    return merged
+
+
+def clear():
+    """Forget the samples of this process and of every worker in the cache."""
+    store.clear()
+    for pid in cache.get(PIDS_KEY) or ():
+        cache.delete(PROCESS_KEY.format(pid=pid))
+    cache.delete(PIDS_KEY)
+
+
+def _percentile(ordered, pct):
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def report(samples_by_view):
+    """Rows of ``{'view', 'count', '<metric>_p50', '<metric>_p95', '<metric>_p99'}``, slowest first."""
+    rows = []
+    for view, samples in samples_by_view.items():
+        if not samples:
+            continue
+        row = {'view': view, 'count': len(samples)}
+        for metric in METRICS:
+            ordered = sorted(getattr(s, metric) for s in samples)
+            for pct in (50, 95, 99):
+                row[f'{metric}_p{pct}'] = _percentile(ordered, pct)
+        rows.append(row)
+    rows.sort(key=lambda r: r['total_ms_p95'], reverse=True)
+    return rows
@@ -0,0 +1,85 @@
+"""Per-player totals used by the global leaderboard.
+
+`UserProfile.points_earned`, `sessions_completed` and `average_score` are
+bumped in a single UPDATE whenever a session completes, so the leaderboard is a
+plain ordered read over the ``profile_global_rank`` index. The same UPDATE adds
+the session's timed answers to `timed_answers` and `response_time_total` and
+derives the average `response_time` from them, so it never has to look at
+older answers. `reconcile` recomputes them from the sessions and is meant to
+run periodically (``manage.py reconcile_profile_stats``) to repair any drift.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import (
+    Avg, Case, Count, DurationField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+
+from results.models import PlayerAnswer, QuizSession
+from .models import UserProfile
+
+
+def record_session(session, timed=None):
+    """Add a just-completed session to its player's totals.
+
+    `timed` is ``(answers, total response time)`` of the session's timed
+    answers, when the caller already has them.
+    """
+    score = session.total_score
+    # the right-hand sides see the values from before the UPDATE
+    changes = dict(
+        points_earned=F('points_earned') + score,
+        sessions_completed=F('sessions_completed') + 1,
+        average_score=Cast(F('points_earned') + score, FloatField()) / (F('sessions_completed') + 1),
+    )
+    if timed is None:
+        totals = PlayerAnswer.objects.filter(session_id=session.id, response_time__isnull=False).aggregate(
+            answers=Count('id'), total=Sum('response_time'),
+        )
+        timed = (totals['answers'], totals['total'])
+    answers, total = timed
+    if answers:
+        changes.update(
+            timed_answers=F('timed_answers') + answers,
+            response_time_total=F('response_time_total') + total,
+            response_time=ExpressionWrapper(
+                (F('response_time_total') + total) / (F('timed_answers') + answers),
+                output_field=DurationField(),
+            ),
+        )
+    if not UserProfile.objects.filter(user_id=session.user_id).update(**changes):
+        # players created outside the registration form have no profile yet
+        UserProfile.objects.get_or_create(user_id=session.user_id)
+        UserProfile.objects.filter(user_id=session.user_id).update(**changes)
+
+
+def reconcile():
+    """Recompute every profile's totals from completed sessions; returns profiles updated."""
+    players_without_profile = User.objects.filter(
+        userprofile__isnull=True, quizsession__completed_at__isnull=False,
+    ).distinct()
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in players_without_profile])
+
+    completed = QuizSession.objects.filter(user=OuterRef('user'), completed_at__isnull=False).order_by().values('user')
+    points = completed.annotate(total=Sum('total_score')).values('total')
+    sessions = completed.annotate(count=Count('id')).values('count')
+    timed = PlayerAnswer.objects.filter(
+        user=OuterRef('user'), session__completed_at__isnull=False, response_time__isnull=False,
+    ).order_by().values('user')
+    timed_answers = timed.annotate(count=Count('id')).values('count')
+    timed_total = timed.annotate(total=Sum('response_time')).values('total')
+    timed_average = timed.annotate(average=Avg('response_time')).values('average')
+    updated = UserProfile.objects.update(
+        points_earned=Coalesce(Subquery(points), Value(0)),
+        sessions_completed=Coalesce(Subquery(sessions), Value(0)),
+        timed_answers=Coalesce(Subquery(timed_answers), Value(0)),
+        response_time_total=Coalesce(Subquery(timed_total), Value(timedelta(0))),
+        response_time=Subquery(timed_average),
+    )
+    UserProfile.objects.update(average_score=Case(
+        When(sessions_completed=0, then=Value(0.0)),
+        default=Cast('points_earned', FloatField()) / F('sessions_completed'),
+        output_field=FloatField(),
+    ))
+    return updated
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from quiz.models import Quiz, Question
+from results.models import QuizSession
+from . import profiling, stats
+from .models import UserProfile
+
+
+class ProfileStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.quiz = Quiz.objects.create(title='Quiz', code='ABC123')
+        Question.objects.create(quiz=self.quiz, text='Q', order=1)
+
+    def finish(self, user, score):
+        session = QuizSession.objects.create(user=user, quiz=self.quiz, total_score=score)
+        self.client.force_login(user)
+        self.client.get(reverse('quiz_question', args=[session.id, 2]))
+
+    def test_completion_updates_totals_and_leaderboard(self):
+        alice = User.objects.create_user('alice', password='pass12345')
+        UserProfile.objects.create(user=alice)
+        bob = User.objects.create_user('bob', password='pass12345')  # no profile yet
+        self.finish(alice, 3)
+        self.finish(alice, 4)
+        self.finish(bob, 5)
+
+        profile = UserProfile.objects.get(user=alice)
+        self.assertEqual((profile.points_earned, profile.sessions_completed, profile.average_score), (7, 2, 3.5))
+        response = self.client.get(reverse('global_leaderboard'))
+        self.assertEqual([p.user for p in response.context['top_players']], [alice, bob])
+
+    def test_reconcile_repairs_drift(self):
+        alice = User.objects.create_user('alice', password='pass12345')
+        self.finish(alice, 3)
+        UserProfile.objects.filter(user=alice).update(points_earned=100, average_score=100)
+
+        stats.reconcile()
+        profile = UserProfile.objects.get(user=alice)
+        self.assertEqual((profile.points_earned, profile.sessions_completed, profile.average_score), (3, 1, 3.0))
+
+
+class QueryProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.store.clear()
+
+    @override_settings(QUERY_PROFILING=True)
+    def test_requests_are_profiled_per_view(self):
+        admin = User.objects.create_user('admin', password='pass12345', is_staff=True)
+        for name in ('alice', 'bob'):
+            UserProfile.objects.create(user=User.objects.create_user(name))
+        client = Client()  # builds the middleware chain with profiling on
+        client.force_login(admin)
+        client.get(reverse('global_leaderboard'))
+        client.get(reverse('global_leaderboard'))
+
+        [sample, _] = profiling.store.snapshot()['global_leaderboard']
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.template_ms, 0)
+        self.assertGreaterEqual(sample.total_ms, sample.db_ms)
+        # timed by the template backend, Django's own classes are left alone
+        self.assertEqual(DjangoTemplate.render.__module__, 'django.template.backends.django')
+
+        report = client.get(reverse('query_report'), {'format': 'json'}).json()
+        row = next(r for r in report['views'] if r['view'] == 'global_leaderboard')
+        self.assertEqual(row['count'], 2)
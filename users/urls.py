@@ -8,4 +8,5 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='index'), name='logout'),
     path('profile/', views.profile, name='profile'),
     path('leaderboard/', views.leaderboard, name='global_leaderboard'),
+    path('profiling/', views.query_report, name='query_report'),
 ]
\ No newline at end of file
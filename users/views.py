@@ -1,11 +1,13 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from .forms import CustomUserCreationForm
 from .models import UserProfile
+from . import profiling
 from results.models import QuizSession
-from django.db import models
-from django.db.models.functions import Coalesce
 from quiz.models import Quiz
 
 def register(request):
@@ -29,9 +31,9 @@ def profile(request):
         completed_at__isnull=False
     ).order_by('-completed_at')
     
-    # Рахуємо загальну статистику
-    total_quizzes = quiz_sessions.count()
-    total_points = quiz_sessions.aggregate(total=models.Sum('total_score'))['total'] or 0
+    # Загальна статистика вже порахована в профілі
+    total_quizzes = user_profile.sessions_completed
+    total_points = user_profile.points_earned
     
     context = {
         'profile': user_profile,
@@ -46,36 +48,11 @@ def profile(request):
 
 @login_required
 def leaderboard(request):
-    # Отримуємо топ-гравців за загальною кількістю балів
-    # Анотуємо: сумарні бали, кількість завершених сесій та середній бал
+    # Топ-гравців за загальною кількістю балів; підсумки зберігаються в профілі
+    # (users.stats), тож це простий впорядкований запит по індексу
     top_players = (
-        UserProfile.objects.annotate(
-            total_score=Coalesce(
-                models.Sum(
-                    'user__quizsession__total_score',
-                    filter=models.Q(user__quizsession__completed_at__isnull=False)
-                ),
-                0,
-                output_field=models.IntegerField(),
-            ),
-            num_sessions=Coalesce(
-                models.Count(
-                    'user__quizsession',
-                    filter=models.Q(user__quizsession__completed_at__isnull=False)
-                ),
-                0,
-                output_field=models.IntegerField(),
-            ),
-            avg_score=Coalesce(
-                models.Avg(
-                    'user__quizsession__total_score',
-                    filter=models.Q(user__quizsession__completed_at__isnull=False)
-                ),
-                0.0,
-                output_field=models.FloatField(),
-            ),
-        )
-        .order_by('-total_score', '-avg_score')[:20]
+        UserProfile.objects.select_related('user')
+        .order_by('-points_earned', '-average_score')[:20]
     )
 
     context = {
@@ -83,3 +60,12 @@ def leaderboard(request):
         'user': request.user,
     }
     return render(request, 'users/leaderboard.html', context)
+
+
+@staff_member_required
+def query_report(request):
+    # Перцентилі запитів і часу відповіді по кожному view (QueryProfileMiddleware)
+    rows = profiling.report(profiling.collect())
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'enabled': settings.QUERY_PROFILING, 'views': rows})
+    return render(request, 'users/query_report.html', {'rows': rows, 'enabled': settings.QUERY_PROFILING})